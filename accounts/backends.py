@@ -0,0 +1,60 @@
+"""
+Authentication backend that serves the logged-in user from the cache.
+
+The user is cached together with its student or teacher profile, so
+``request.user``, ``user_type_required`` and templates reading
+``user.student_profile`` / ``user.teacher_profile`` cost no queries once the
+identity is warm. Entries are dropped by the signal handlers in
+``accounts.signals`` whenever the user or a profile is saved or deleted.
+
+The password hash is never cached, since the cache is a directory of files.
+A cached user carries its session auth hash instead, which is all that
+Django checks on each request, and its ``password`` is left deferred: it is
+read from the database if something needs it (checking the old password on
+a password change, say), and ``save()`` leaves it alone.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import User
+
+IDENTITY_TIMEOUT = 60 * 60
+
+
+def identity_key(user_id):
+    return f'identity:{user_id}'
+
+
+def get_identity(user_id):
+    """Return the user with its profile loaded, from the cache when possible."""
+    key = identity_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = (
+            User.objects.select_related('student_profile', 'teacher_profile')
+            .filter(pk=user_id)
+            .first()
+        )
+        if user is None:
+            return None
+        user.session_auth_hash = user.get_session_auth_hash()
+        del user.password  # deferred from here on
+        cache.set(key, user, IDENTITY_TIMEOUT)
+    return user
+
+
+def invalidate_identity(user_id):
+    cache.delete(identity_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup goes through get_identity()."""
+
+    def get_user(self, user_id):
+        user = get_identity(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # ModelBackend's own aget_user() would query the user table directly
+        return await sync_to_async(self.get_user)(user_id)
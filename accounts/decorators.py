@@ -1,24 +1,38 @@
 from functools import wraps
-from django.core.exceptions import PermissionDenied
+from asgiref.sync import iscoroutinefunction
 from django.shortcuts import redirect
 from django.contrib import messages
 
 def user_type_required(user_types):
     """
-    Decorator to restrict access based on user type.
+    Decorator to restrict access based on user type; works on sync and async views.
     Usage: @user_type_required(['student']) or @user_type_required(['teacher', 'admin'])
     """
+    def check(request, user):
+        """The redirect for a user who may not see the view, else None."""
+        if not user.is_authenticated:
+            return redirect('login')
+        
+        if user.user_type not in user_types:
+            messages.error(request, 'You do not have permission to access this page.')
+            return redirect('dashboard')
+        return None
+    
     def decorator(view_func):
-        @wraps(view_func)
-        def _wrapped_view(request, *args, **kwargs):
-            if not request.user.is_authenticated:
-                return redirect('login')
-            
-            if request.user.user_type not in user_types:
-                messages.error(request, 'You do not have permission to access this page.')
-                return redirect('dashboard')
-            
-            return view_func(request, *args, **kwargs)
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                denied = check(request, await request.auser())
+                if denied is not None:
+                    return denied
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                denied = check(request, request.user)
+                if denied is not None:
+                    return denied
+                return view_func(request, *args, **kwargs)
         return _wrapped_view
     return decorator
 
@@ -0,0 +1,69 @@
+"""
+Shared, precomputed directory of teachers.
+
+The submission form used to list every teacher in a ``<select>`` and look up
+each one's profile to label it. The directory is built with a single query,
+kept in the shared cache and dropped by ``accounts.signals`` whenever a
+teacher or teacher profile changes; the form searches it through the
+``teacher_search`` endpoint instead of rendering every option.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User
+
+DIRECTORY_KEY = 'teacher-directory'
+
+# Safety net for changes made without signals (queryset.update() and the like)
+DIRECTORY_TIMEOUT = 60 * 60
+
+SEARCH_LIMIT = 20
+
+
+def get_teacher_directory():
+    """Return ``[(id, name, department, search text), ...]`` ordered by name."""
+    directory = cache.get(DIRECTORY_KEY)
+    if directory is None:
+        rows = (
+            User.objects.filter(user_type='teacher', is_active=True)
+            .order_by('first_name', 'last_name', 'pk')
+            .values_list('pk', 'first_name', 'last_name', 'teacher_profile__department')
+        )
+        directory = []
+        for pk, first_name, last_name, department in rows:
+            name = f'{first_name} {last_name}'.strip()
+            department = department or 'N/A'
+            directory.append((pk, name, department, f'{name} {department}'.casefold()))
+        cache.set(DIRECTORY_KEY, directory, DIRECTORY_TIMEOUT)
+    return directory
+
+
+def invalidate_teacher_directory():
+    cache.delete(DIRECTORY_KEY)
+    # Again after commit, in case a request rebuilt it from the old rows
+    transaction.on_commit(lambda: cache.delete(DIRECTORY_KEY))
+
+
+def teacher_label(teacher_id):
+    """Display label for one teacher, or '' if it is not in the directory."""
+    for pk, name, department, _ in get_teacher_directory():
+        if str(pk) == str(teacher_id):
+            return f'{name} - {department}'
+    return ''
+
+
+def search_teachers(query, limit=SEARCH_LIMIT):
+    """
+    Teachers whose name or department contains every word of ``query``.
+
+    Names starting with the query are listed first.
+    """
+    query = ' '.join(query.casefold().split())
+    terms = query.split()
+    prefix, other = [], []
+    for pk, name, department, text in get_teacher_directory():
+        if all(term in text for term in terms):
+            (prefix if text.startswith(query) else other).append((pk, name, department))
+            if len(prefix) >= limit:
+                break
+    return (prefix + other)[:limit]
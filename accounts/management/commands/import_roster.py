@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.roster import import_roster
+
+
+class Command(BaseCommand):
+    help = (
+        'Create student and teacher accounts from a CSV roster. Rows with errors '
+        'are reported and skipped; the rest are imported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row (see accounts.roster.COLUMNS)')
+        parser.add_argument('--user-type', choices=['student', 'teacher'],
+                            help='Import only this type of account (default: use the user_type column)')
+        parser.add_argument('--workers', type=int,
+                            help='Processes used to hash passwords (default: one per CPU)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the roster without creating anything')
+
+    def handle(self, *args, **options):
+        try:
+            result = import_roster(
+                options['path'], user_type=options['user_type'],
+                workers=options['workers'], dry_run=options['dry_run'],
+            )
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        for line, message in result.errors:
+            self.stdout.write(self.style.ERROR(f'Line {line}: {message}'))
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} account(s); {result.failed} row(s) skipped.'
+        ))
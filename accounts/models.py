@@ -11,6 +11,13 @@ class User(AbstractUser):
     
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
+    
+    def get_session_auth_hash(self):
+        # Users from the identity cache (accounts.backends) come without their
+        # password, and with this hash worked out from it beforehand
+        if 'password' not in self.__dict__ and 'session_auth_hash' in self.__dict__:
+            return self.session_auth_hash
+        return super().get_session_auth_hash()
 
 class StudentProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
@@ -0,0 +1,251 @@
+"""
+Bulk import of student and teacher rosters from CSV.
+
+Rows are validated up front (including one query per unique column to find
+clashes with existing accounts), passwords are hashed across a process pool,
+and valid users and profiles are written with bulk inserts. Invalid rows are
+reported and skipped; they never abort the rest of the batch.
+
+The import page checks the whole roster, then imports small rosters itself
+and hands larger ones to the job queue (see queue_roster), so that hashing
+their passwords never runs in a web request.
+"""
+import csv
+import io
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .directory import invalidate_teacher_directory
+from .models import User, StudentProfile, TeacherProfile
+
+COLUMNS = [
+    'username', 'email', 'first_name', 'last_name', 'user_type', 'password', 'phone_number',
+    'student_id', 'course', 'year_of_study', 'employee_id', 'department', 'designation',
+]
+
+# Same requirements as UserRegistrationForm.clean()
+REQUIRED = {
+    'student': ['username', 'email', 'first_name', 'last_name', 'student_id', 'course'],
+    'teacher': ['username', 'email', 'first_name', 'last_name', 'employee_id', 'department'],
+}
+
+# Columns saved to each model, checked against the model field (length,
+# format, the username validator) so a bad value is reported on its row
+# rather than failing the bulk insert
+FIELDS = {
+    User: ['username', 'email', 'first_name', 'last_name', 'phone_number'],
+    StudentProfile: ['student_id', 'course'],
+    TeacherProfile: ['employee_id', 'department', 'designation'],
+}
+
+PROFILES = {'student': StudentProfile, 'teacher': TeacherProfile}
+
+UNIQUE = {
+    'student': ['username', 'student_id'],
+    'teacher': ['username', 'employee_id'],
+}
+
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 50
+
+# Rosters with more valid rows than this are imported by the job queue
+INLINE_LIMIT = 20
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+@dataclass
+class RosterResult:
+    created: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+
+    @property
+    def failed(self):
+        return len({line for line, _ in self.errors})
+
+
+def _init_worker(settings_module):
+    # Spawned workers (macOS, Windows) start without Django configured
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash ``passwords`` in order, in parallel once there are enough of them."""
+    passwords = list(passwords)
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'grading_system.settings'),),
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def read_roster(source):
+    """Yield ``(line number, row dict)`` from a CSV path, text or binary file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from read_roster(f)
+        return
+    if isinstance(source.read(0), bytes):
+        source = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(source)
+    for row in reader:
+        yield reader.line_num, {
+            key.strip().lower(): (value or '').strip() for key, value in row.items() if key
+        }
+
+
+def _existing(model, column, values):
+    """Values of ``column`` already taken, one query per chunk of values."""
+    values = sorted(values)
+    taken = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        taken.update(model.objects.filter(**{f'{column}__in': chunk}).values_list(column, flat=True))
+    return taken
+
+
+def _validate(line, row, user_type, seen, errors):
+    """Check one row on its own and against earlier rows; return the user type or None."""
+    row_type = row.get('user_type') or user_type
+    if row_type not in REQUIRED:
+        errors.append((line, f"Unknown user type '{row_type}'."))
+        return None
+    if user_type and row_type != user_type:
+        errors.append((line, f"Only {user_type} accounts can be imported here."))
+        return None
+
+    ok = True
+    for column in REQUIRED[row_type]:
+        if not row.get(column):
+            errors.append((line, f'{column} is required for {row_type} accounts.'))
+            ok = False
+    for model in (User, PROFILES[row_type]):
+        for column in FIELDS[model]:
+            if not row.get(column):
+                continue
+            try:
+                model._meta.get_field(column).clean(row[column], None)
+            except ValidationError as e:
+                errors.extend((line, f'{column}: {message}') for message in e.messages)
+                ok = False
+    if row_type == 'student' and row.get('year_of_study'):
+        if not row['year_of_study'].isdigit() or not 1 <= int(row['year_of_study']) <= 6:
+            errors.append((line, 'year_of_study must be between 1 and 6.'))
+            ok = False
+
+    for column in UNIQUE[row_type]:
+        value = row.get(column)
+        if value and value in seen[column]:
+            errors.append((line, f"{column} '{value}' is repeated on line {seen[column][value]}."))
+            ok = False
+        elif value:
+            seen[column][value] = line
+    return row_type if ok else None
+
+
+def import_roster(source, user_type=None, workers=None, dry_run=False):
+    """
+    Create users and profiles for every valid row of a roster CSV.
+
+    ``user_type`` restricts the import to 'student' or 'teacher' rows; rows
+    may otherwise say which they are in a ``user_type`` column. Rows with a
+    blank password get an unusable one and must go through password reset.
+    With ``dry_run`` nothing is written and ``created`` counts the valid rows.
+    """
+    result = RosterResult()
+    seen = {'username': {}, 'student_id': {}, 'employee_id': {}}
+    rows = []
+    for line, row in read_roster(source):
+        row_type = _validate(line, row, user_type, seen, result.errors)
+        if row_type:
+            rows.append((line, row_type, row))
+
+    # One pass against the database for each unique column
+    taken = {
+        'username': _existing(User, 'username', seen['username']),
+        'student_id': _existing(StudentProfile, 'student_id', seen['student_id']),
+        'employee_id': _existing(TeacherProfile, 'employee_id', seen['employee_id']),
+    }
+
+    valid = []
+    for line, row_type, row in rows:
+        clashes = [column for column in UNIQUE[row_type] if row[column] in taken[column]]
+        if clashes:
+            for column in clashes:
+                result.errors.append((line, f"{column} '{row[column]}' already exists."))
+            continue
+
+        user = User(
+            username=row['username'], email=row['email'], first_name=row['first_name'],
+            last_name=row['last_name'], phone_number=row.get('phone_number', ''), user_type=row_type,
+        )
+        if row.get('password'):
+            try:
+                validate_password(row['password'], user)
+            except ValidationError as e:
+                result.errors.extend((line, message) for message in e.messages)
+                continue
+        valid.append((row, user))
+
+    if dry_run or not valid:
+        result.created = len(valid)
+        return result
+
+    hashes = hash_passwords([row.get('password') or None for row, _ in valid], workers=workers)
+    for (_, user), password in zip(valid, hashes):
+        user.password = password
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([user for _, user in valid])
+        StudentProfile.objects.bulk_create(
+            StudentProfile(
+                user=user, student_id=row['student_id'], course=row['course'],
+                year_of_study=int(row.get('year_of_study') or 1),
+            )
+            for (row, _), user in zip(valid, users) if user.user_type == 'student'
+        )
+        TeacherProfile.objects.bulk_create(
+            TeacherProfile(
+                user=user, employee_id=row['employee_id'], department=row['department'],
+                designation=row.get('designation') or 'Lecturer',
+            )
+            for (row, _), user in zip(valid, users) if user.user_type == 'teacher'
+        )
+    if any(user.user_type == 'teacher' for user in users):
+        # bulk_create sends no signals
+        invalidate_teacher_directory()
+    result.created = len(users)
+    return result
+
+
+def queue_roster(data, user_type=None):
+    """
+    Save roster CSV ``data`` (bytes) where only the workers read it and
+    queue its import. The file holds passwords, so it is kept out of
+    MEDIA_ROOT and deleted by the job.
+    """
+    from projects.jobs import enqueue
+
+    directory = Path(settings.PROJECT_UPLOAD_TEMP_DIR) / 'rosters'
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{uuid.uuid4().hex}.csv'
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+        f.write(data)
+    return enqueue('accounts.import_roster', {'path': str(path), 'user_type': user_type})
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .backends import invalidate_identity
+from .directory import invalidate_teacher_directory
+from .models import User, StudentProfile, TeacherProfile
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.pk)
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def invalidate_profile_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_directory_for_user(sender, instance, update_fields=None, **kwargs):
+    # Logins only save last_login, which the directory does not hold
+    if instance.user_type != 'teacher' or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_teacher_directory()
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def invalidate_directory_for_profile(sender, **kwargs):
+    invalidate_teacher_directory()
@@ -0,0 +1,17 @@
+"""
+Background tasks of the accounts app, run by ``manage.py run_jobs``.
+"""
+from pathlib import Path
+
+from projects.jobs import task
+
+from .roster import import_roster
+
+
+@task('accounts.import_roster', lease=15 * 60)
+def import_roster_file(path, user_type=None):
+    # A repeated run finds the accounts already created and skips those rows
+    path = Path(path)
+    if path.exists():
+        import_roster(path, user_type=user_type)
+        path.unlink()
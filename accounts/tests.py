@@ -1,3 +1,230 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.hashers import check_password
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from projects.jobs import work
+from projects.models import UserStats
+from .backends import identity_key
+from .directory import get_teacher_directory
+from .models import User, StudentProfile
+from .roster import INLINE_LIMIT, hash_passwords, import_roster
+from projects.tests import QueryBudgetMixin, make_teacher, make_student, make_projects
+
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        make_projects(self.student, self.teacher, 1)
+        # Stats rows are built on first read; build them outside the budget
+        UserStats.objects.for_user(self.student)
+        UserStats.objects.for_user(self.teacher)
+
+    def test_student_dashboard(self):
+        self.client.force_login(self.student)
+        self.assertQueryBudget(
+            reverse('dashboard'), 2,
+            grow=lambda: make_projects(self.student, make_teacher('teacher2'), 6)
+        )
+
+    def test_teacher_dashboard(self):
+        self.client.force_login(self.teacher)
+
+        def grow():
+            for i in range(6):
+                make_projects(make_student(f'student{i}'), self.teacher, 1)
+
+        self.assertQueryBudget(reverse('dashboard'), 2, grow=grow)
+
+
+class CachedIdentityTests(TestCase):
+    AUTH_TABLES = ('django_session', 'accounts_user', 'accounts_studentprofile', 'accounts_teacherprofile')
+
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('profile_update'))  # warm the caches
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in self.AUTH_TABLES)]
+
+    def test_warm_request_does_no_auth_queries(self):
+        self.assertEqual(self.auth_queries(reverse('profile_update')), [])
+
+    def test_profile_update_invalidates_identity(self):
+        self.client.post(reverse('profile_update'), {
+            'first_name': 'Tina', 'last_name': 'Teacher', 'email': 'tina@example.com', 'phone_number': '',
+            'employee_id': self.teacher.teacher_profile.employee_id,
+            'department': 'Physics', 'designation': 'Professor',
+        })
+        response = self.client.get(reverse('profile_update'))
+        self.assertEqual(response.context['user'].teacher_profile.department, 'Physics')
+        self.assertEqual(self.auth_queries(reverse('profile_update')), [])
+
+    def test_password_hash_is_not_cached(self):
+        self.teacher.set_password('a-new-password-42')
+        self.teacher.save()
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('profile_update'))
+        identity = cache.get(identity_key(self.teacher.pk))
+        self.assertNotIn('password', identity.__dict__)
+        # The cache files are only readable by their owner
+        self.assertEqual(Path(settings.CACHES['default']['LOCATION']).stat().st_mode & 0o077, 0)
+
+        # Saving the cached user keeps the password, and the session stays valid
+        self.client.post(reverse('profile_update'), {
+            'first_name': 'Tina', 'last_name': 'Teacher', 'email': 'tina@example.com', 'phone_number': '',
+            'employee_id': self.teacher.teacher_profile.employee_id,
+            'department': 'Physics', 'designation': 'Professor',
+        })
+        self.assertTrue(User.objects.get(pk=self.teacher.pk).check_password('a-new-password-42'))
+        self.assertEqual(self.client.get(reverse('profile_update')).status_code, 200)
+
+    def test_password_change_ends_cached_session(self):
+        self.teacher.set_password('a-new-password-42')
+        self.teacher.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('login') + '?next=' + reverse('dashboard'))
+
+
+class TeacherDirectoryTests(TestCase):
+    def setUp(self):
+        self.teachers = [make_teacher(f'teacher{i}') for i in range(3)]
+        self.student = make_student()
+        self.client.force_login(self.student)
+
+    def test_submission_form_does_not_list_teachers(self):
+        url = reverse('submit_project')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertNotContains(response, '<select')
+
+    def test_failed_post_labels_chosen_teacher_from_directory(self):
+        self.client.get(reverse('submit_project'))  # warm the session and identity
+        get_teacher_directory()
+        teacher = self.teachers[1]
+        # Only the posted id is checked (by the form field and the model)
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('submit_project'), {'teacher': teacher.pk, 'title': 'x'})
+        self.assertContains(response, 'value="Tina Teacher - Computing"')
+
+    def test_search_and_invalidation(self):
+        url = reverse('teacher_search')
+        self.assertEqual(len(self.client.get(url, {'q': 'tina comp'}).json()['results']), 3)
+        self.assertEqual(self.client.get(url, {'q': 'physics'}).json()['results'], [])
+
+        profile = self.teachers[0].teacher_profile
+        profile.department = 'Physics'
+        profile.save()
+        results = self.client.get(url, {'q': 'physics'}).json()['results']
+        self.assertEqual([r['id'] for r in results], [self.teachers[0].pk])
+
+
+ROSTER = (
+    'username,email,first_name,last_name,password,student_id,course,year_of_study\n'
+    'ada,ada@example.com,Ada,Lovelace,Analytical-Engine-1843,S100,Mathematics,2\n'
+    'alan,alan@example.com,Alan,Turing,,S101,Computing,\n'
+    'student,taken@example.com,Taken,Name,,S102,Computing,1\n'
+    'grace,not-an-email,Grace,Hopper,,S103,Computing,1\n'
+    'ada2,ada2@example.com,Ada,Again,,S100,Mathematics,1\n'
+)
+
+
+# Keep hashing cheap; workers started without fork fall back to PBKDF2
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+])
+class RosterImportTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        make_student()  # holds the 'student' username
+
+    def upload(self, content=ROSTER):
+        return SimpleUploadedFile('roster.csv', content.encode(), content_type='text/csv')
+
+    def test_valid_rows_are_imported_and_invalid_rows_reported(self):
+        result = import_roster(self.upload(), user_type='student')
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(sorted(line for line, _ in result.errors), [4, 5, 6])
+        ada = User.objects.get(username='ada')
+        self.assertTrue(ada.check_password('Analytical-Engine-1843'))
+        self.assertEqual(ada.student_profile.year_of_study, 2)
+        self.assertFalse(User.objects.get(username='alan').has_usable_password())
+
+    def test_dry_run_writes_nothing(self):
+        users = User.objects.count()
+        result = import_roster(self.upload(), user_type='student', dry_run=True)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(User.objects.count(), users)
+
+    def test_query_count_does_not_grow_with_roster(self):
+        rows = ''.join(
+            f'user{i},user{i}@example.com,First,Last,,ID{i},Course,1\n' for i in range(100)
+        )
+        header = ROSTER.splitlines()[0] + '\n'
+        # 3 uniqueness lookups + 2 bulk inserts, plus the savepoint pair
+        with self.assertNumQueries(7):
+            result = import_roster(self.upload(header + rows), user_type='student', workers=1)
+        self.assertEqual(result.created, 100)
+        self.assertEqual(StudentProfile.objects.filter(student_id__startswith='ID').count(), 100)
+
+    def test_values_are_checked_against_the_model_fields(self):
+        roster = (
+            'username,email,first_name,last_name,phone_number,student_id,course\n'
+            'bad user!/x,bad@example.com,Bad,User,,S200,Computing\n'
+            f'longid,long@example.com,Long,Id,,{"S" * 42},Computing\n'
+            f'phone,phone@example.com,Long,Phone,{"1" * 42},S201,Computing\n'
+        )
+        result = import_roster(self.upload(roster), user_type='student')
+        self.assertEqual(result.created, 0)
+        self.assertEqual(
+            [(line, message.split(':')[0]) for line, message in result.errors],
+            [(2, 'username'), (3, 'student_id'), (4, 'phone_number')],
+        )
+
+    def test_large_roster_is_imported_by_the_job_queue(self):
+        rows = ''.join(
+            f'user{i},user{i}@example.com,First,Last,Pass-word-{i},ID{i},Course,1\n'
+            for i in range(INLINE_LIMIT + 1)
+        )
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        self.client.force_login(self.teacher)
+        with self.settings(PROJECT_UPLOAD_TEMP_DIR=temp_dir):
+            self.client.post(reverse('roster_import'), {'roster': self.upload(ROSTER.splitlines()[0] + '\n' + rows)})
+        self.assertFalse(User.objects.filter(username='user0').exists())
+
+        self.assertEqual(work(burst=True), 1)
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), INLINE_LIMIT + 1)
+        self.assertTrue(User.objects.get(username='user3').check_password('Pass-word-3'))
+        self.assertEqual(list(Path(temp_dir, 'rosters').iterdir()), [])
+
+    def test_pool_hashes_match_inline_hashes(self):
+        hashes = hash_passwords(['secret'] * 60, workers=2)
+        self.assertEqual(len(hashes), 60)
+        self.assertEqual(len(set(hashes)), 60)  # salted individually
+        self.assertTrue(all(check_password('secret', h) for h in hashes))
+
+    def test_teacher_upload_imports_students_only(self):
+        self.client.force_login(self.teacher)
+        roster = 'user_type,username,email,first_name,last_name,employee_id,department\n' \
+                 'teacher,prof,prof@example.com,Pro,Fessor,E1,Physics\n'
+        response = self.client.post(reverse('roster_import'), {'roster': self.upload(roster)})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(username='prof').exists())
+        self.assertEqual(response.context['result'].failed, 1)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
@@ -6,6 +7,8 @@ urlpatterns = [
     path('login/', views.user_login, name='login'),
     path('register/', views.UserRegistrationView.as_view(), name='register'),
     path('logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', views.adashboard if settings.PROJECT_ASYNC_VIEWS else views.dashboard, name='dashboard'),
     path('profile/', views.profile_update, name='profile_update'),
+    path('roster/import/', views.roster_import, name='roster_import'),
+    path('teachers/search/', views.teacher_search, name='teacher_search'),
 ]
@@ -1,13 +1,19 @@
+import io
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
 from django.urls import reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import CreateView
-from django.db import models
 from .forms import UserRegistrationForm, ProfileUpdateForm, StudentProfileUpdateForm, TeacherProfileUpdateForm
 from .models import StudentProfile, TeacherProfile
+from .directory import search_teachers
+from .roster import COLUMNS, INLINE_LIMIT, import_roster, queue_roster
+from projects.fragments import FRAGMENT_TIMEOUT, afragment_version, fragment_version, load_fragment_data
 
 def user_login(request):
     if request.method == 'POST':
@@ -44,47 +50,77 @@ def dashboard(request):
     context = {'user': user}
     
     if user.user_type == 'student':
-        from projects.models import Project, Grade
+        from projects.models import Project, UserStats
         
-        # Get student's projects and statistics
+        # Counters come from the denormalized stats row. Both it and the
+        # project list are lazy, so a cached fragment skips the queries.
+        stats = SimpleLazyObject(lambda: UserStats.objects.for_user(user))
         projects = Project.objects.filter(student=user).order_by('-submitted_at')
-        graded_projects = projects.filter(grade__isnull=False)
-        pending_projects = projects.filter(grade__isnull=True)
-        
-        # Calculate average grade
-        grades = Grade.objects.filter(project__student=user)
-        avg_score = grades.aggregate(avg=models.Avg('score'))['avg']
-        avg_score = round(avg_score, 1) if avg_score else None
         
         context.update({
-            'projects': projects[:5],  # Recent 5 projects
-            'total_projects': projects.count(),
-            'graded_projects': graded_projects.count(),
-            'pending_projects': pending_projects.count(),
-            'average_score': avg_score,
+            'projects': projects.select_related('teacher', 'grade')[:5],  # Recent 5 projects
+            'stats': stats,
+            'fragment_version': fragment_version(user.pk),
+            'fragment_timeout': FRAGMENT_TIMEOUT,
         })
         return render(request, 'accounts/student_dashboard.html', context)
         
     elif user.user_type == 'teacher':
-        from projects.models import Project, Grade
+        from projects.models import Project, UserStats
         
-        # Get teacher's assigned projects and statistics
+        # Counters come from the denormalized stats row (lazy, as above)
+        stats = SimpleLazyObject(lambda: UserStats.objects.for_user(user))
         assigned_projects = Project.objects.filter(teacher=user).order_by('-submitted_at')
-        pending_reviews = assigned_projects.filter(grade__isnull=True, is_submitted=True)
-        graded_projects = assigned_projects.filter(grade__isnull=False)
-        total_students = assigned_projects.values('student').distinct().count()
         
         context.update({
-            'recent_submissions': assigned_projects.filter(is_submitted=True)[:5],
-            'total_students': total_students,
-            'pending_reviews': pending_reviews.count(),
-            'graded_projects': graded_projects.count(),
-            'total_projects': assigned_projects.count(),
+            'recent_submissions': assigned_projects.filter(is_submitted=True).select_related('student', 'grade')[:5],
+            'stats': stats,
+            'fragment_version': fragment_version(user.pk),
+            'fragment_timeout': FRAGMENT_TIMEOUT,
         })
         return render(request, 'accounts/teacher_dashboard.html', context)
     else:
         return render(request, 'accounts/dashboard.html', context)
 
+@login_required
+async def adashboard(request):
+    """dashboard() as an async view, served when PROJECT_ASYNC_VIEWS is set."""
+    user = await request.auser()
+    context = {'user': user}
+    
+    if user.user_type == 'student':
+        from projects.models import Project, UserStats
+        
+        # Only the data of fragments that are not cached is read
+        version = await afragment_version(user.pk)
+        projects = Project.objects.filter(student=user).order_by('-submitted_at')
+        
+        context.update(await load_fragment_data({
+            'stats': ('student-dashboard-stats', [user.pk, version], lambda: UserStats.objects.for_user(user)),
+            # Recent 5 projects
+            'projects': ('student-dashboard-recent', [user.pk, version],
+                         lambda: list(projects.select_related('teacher', 'grade')[:5])),
+        }))
+        context.update({'fragment_version': version, 'fragment_timeout': FRAGMENT_TIMEOUT})
+        return await sync_to_async(render)(request, 'accounts/student_dashboard.html', context)
+        
+    elif user.user_type == 'teacher':
+        from projects.models import Project, UserStats
+        
+        version = await afragment_version(user.pk)
+        assigned_projects = Project.objects.filter(teacher=user).order_by('-submitted_at')
+        
+        context.update(await load_fragment_data({
+            'stats': ('teacher-dashboard-stats', [user.pk, version], lambda: UserStats.objects.for_user(user)),
+            'recent_submissions': ('teacher-dashboard-recent', [user.pk, version], lambda: list(
+                assigned_projects.filter(is_submitted=True).select_related('student', 'grade')[:5]
+            )),
+        }))
+        context.update({'fragment_version': version, 'fragment_timeout': FRAGMENT_TIMEOUT})
+        return await sync_to_async(render)(request, 'accounts/teacher_dashboard.html', context)
+    else:
+        return await sync_to_async(render)(request, 'accounts/dashboard.html', context)
+
 @login_required
 def profile_update(request):
     user = request.user
@@ -123,3 +159,47 @@ def profile_update(request):
     }
     
     return render(request, 'accounts/profile_update.html', context)
+
+@login_required
+def roster_import(request):
+    user = request.user
+    # Teachers enrol students; staff can also create teacher accounts
+    if not (user.is_staff or user.user_type == 'teacher'):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('dashboard')
+    
+    result = None
+    if request.method == 'POST':
+        roster = request.FILES.get('roster')
+        user_type = request.POST.get('user_type') if user.is_staff else 'student'
+        if not roster:
+            messages.error(request, 'Please choose a CSV file to import.')
+        else:
+            data = roster.read()
+            # Check every row first; the valid ones are imported here, or by
+            # the job queue when there are many passwords to hash
+            result = import_roster(io.BytesIO(data), user_type=user_type or None, dry_run=True)
+            if result.created > INLINE_LIMIT:
+                queue_roster(data, user_type=user_type or None)
+                messages.success(request, f'{result.created} account(s) will be created in the background.')
+            elif result.created:
+                result = import_roster(io.BytesIO(data), user_type=user_type or None, workers=1)
+                messages.success(request, f'Imported {result.created} account(s).')
+            if result.errors:
+                messages.warning(request, f'{result.failed} row(s) were skipped; see the errors below.')
+    
+    context = {
+        'result': result,
+        'columns': COLUMNS,
+    }
+    
+    return render(request, 'accounts/roster_import.html', context)
+
+@login_required
+def teacher_search(request):
+    """Autocomplete for the submission form, answered from the cached teacher directory."""
+    results = [
+        {'id': pk, 'name': name, 'department': department}
+        for pk, name, department in search_teachers(request.GET.get('q', ''))
+    ]
+    return JsonResponse({'results': results})
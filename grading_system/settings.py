@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -75,10 +76,54 @@ WSGI_APPLICATION = 'grading_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLITE_PROFILE picks how SQLite connections are set up. 'production' is
+# made for many concurrent writers, such as students submitting and teachers
+# grading at a deadline:
+# - the WAL journal lets readers carry on while one connection writes;
+# - transactions start with BEGIN IMMEDIATE, so a transaction that reads and
+#   then writes waits up to `timeout` seconds for the write lock up front.
+#   Without it, the transaction fails with "database is locked" when it tries
+#   to upgrade its read lock while another connection writes;
+# - connections are kept for CONN_MAX_AGE seconds instead of being opened
+#   and set up again for every request.
+# 'stock' is Django's default behaviour and the default here: 'production'
+# switches the database file to WAL for good, so it is opted into with the
+# SQLITE_PROFILE environment variable on the servers that want it, not on
+# every checkout. Compare the two with ``manage.py bench_sqlite_writes``.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # With WAL, commits are durable once checkpointed; a power cut may lose
+    # the last transactions but does not corrupt the database
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,  # KiB, per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_PROFILES = {
+    'stock': {
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {},
+    },
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    },
+}
+
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'stock')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[SQLITE_PROFILE],
     }
 }
 
@@ -123,6 +168,80 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Submission files are stored once per distinct content and reference
+# counted; see projects.storage
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'submissions': {
+        'BACKEND': 'projects.storage.ContentAddressedStorage',
+    },
+}
+
+# Submission downloads are streamed in chunks by default. Set to 'x-sendfile'
+# (Apache/lighttpd) or 'x-accel-redirect' (nginx) to let the front proxy send
+# the bytes once the permission check has passed. For nginx, map the prefix
+# below to MEDIA_ROOT in an `internal` location.
+PROJECT_DOWNLOAD_OFFLOAD = None
+PROJECT_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Files sent with the submission form itself are capped at
+# PROJECT_UPLOAD_MAX_SIZE. Larger ones go through the chunked, resumable
+# upload endpoints (see projects.uploads), which stream each chunk of at most
+# PROJECT_UPLOAD_CHUNK_SIZE to a part file in PROJECT_UPLOAD_TEMP_DIR. Keep
+# that directory on the same filesystem as MEDIA_ROOT so finished uploads are
+# moved into place rather than copied.
+PROJECT_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+PROJECT_CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+PROJECT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PROJECT_UPLOAD_TEMP_DIR = BASE_DIR / 'upload_parts'
+
+# Bulk grading more projects than this is handed to the background job queue
+# (see projects.jobs; run the workers with ``manage.py run_jobs``)
+PROJECT_BULK_GRADE_INLINE_LIMIT = 200
+
+# Serve the dashboard and the project lists from async views. Django's ORM,
+# cache and templates are still synchronous, so the async views hop to the
+# one thread that runs sync code for each of them, and their queries run one
+# after another as in the sync views: they free the event loop, but they do
+# not make a page's reads concurrent. Measure with ``manage.py bench_asgi``
+# before turning this on for an ASGI deployment. Read when the URLconf is
+# loaded.
+PROJECT_ASYNC_VIEWS = False
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The cache carries the invalidations (fragment and analytics versions,
+# grading scales, user identities) between the web processes and the job
+# workers of ``manage.py run_jobs``, so it must be shared by all of them. The
+# file-based cache is, on one host; across hosts use Redis or Memcached.
+# run_jobs refuses to start with the per-process local-memory cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        # Sessions and identities live here too; culling scans the directory.
+        # Django creates it readable by its owner only (0700, files 0600), and
+        # it is kept out of version control by .gitignore
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+
+# Tests get a fresh, temporary cache directory, as they get a fresh database
+TEST_RUNNER = 'grading_system.test_runner.TestRunner'
+
+# Sessions are read from the cache and only written through to the database
+# when they change, so an ordinary page view does not touch django_session.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Serves request.user (with its profile) from the cache; see accounts.backends
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
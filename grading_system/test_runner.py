@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against a temporary copy of the cache configuration, so
+    versions and fragments left by the development server or an earlier run
+    never leak into them.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='test-cache-')
+        self.cache_override = override_settings(CACHES={
+            alias: {**config, 'LOCATION': os.path.join(self.cache_dir, alias)} if 'FileBasedCache' in config['BACKEND'] else config
+            for alias, config in settings.CACHES.items()
+        })
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
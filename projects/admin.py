@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Project, Grade
+from .models import Project, Grade, UserStats, GradingScale, GradeBoundary, Job
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
@@ -14,3 +14,57 @@ class GradeAdmin(admin.ModelAdmin):
     list_filter = ('letter_grade', 'teacher', 'graded_at')
     search_fields = ('project__title', 'project__student__username')
     readonly_fields = ('letter_grade', 'graded_at')
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_projects', 'graded_projects', 'pending_reviews', 'total_students')
+    search_fields = ('user__username',)
+    readonly_fields = UserStats.COUNTER_FIELDS
+
+class GradeBoundaryInline(admin.TabularInline):
+    model = GradeBoundary
+    extra = 0
+
+@admin.register(GradingScale)
+class GradingScaleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'teacher', 'course', 'updated_at')
+    list_filter = ('course',)
+    search_fields = ('name', 'teacher__username', 'course')
+    inlines = [GradeBoundaryInline]
+    
+    def save_model(self, request, obj, form, change):
+        # A scale moved to another teacher or course stops applying to the
+        # grades of its old scope, which need their letters recomputed too
+        obj.previous_scope = None
+        if change:
+            obj.previous_scope = GradingScale.objects.filter(pk=obj.pk).values('teacher_id', 'course').first()
+        super().save_model(request, obj, form, change)
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Boundaries are saved with the inline, so recompute only now
+        grades = form.instance.affected_grades()
+        previous = getattr(form.instance, 'previous_scope', None)
+        if previous:
+            grades |= GradingScale(**previous).affected_grades()
+        updated = Grade.objects.recompute_letter_grades(grades)
+        self.message_user(request, f'Recomputed {updated} letter grade(s).')
+    
+    def delete_model(self, request, obj):
+        grades = list(obj.affected_grades().values_list('pk', flat=True))
+        super().delete_model(request, obj)
+        Grade.objects.recompute_letter_grades(Grade.objects.filter(pk__in=grades))
+    
+    def delete_queryset(self, request, queryset):
+        # The changelist's bulk delete action
+        grades = set()
+        for scale in queryset:
+            grades.update(scale.affected_grades().values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        Grade.objects.recompute_letter_grades(Grade.objects.filter(pk__in=grades))
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_by', 'lease_expires_at', 'last_error', 'created_at')
@@ -0,0 +1,266 @@
+"""
+Grade analytics: score distributions, percentiles, letter grades and
+per-teacher and per-course comparisons.
+
+Scores are read in one query selecting only the columns needed, and every
+statistic, including the per-group percentiles, is computed from them in
+plain Python. That is the implementation the project depends on: numpy is
+not a declared requirement. Where numpy happens to be installed, the same
+numbers are computed with whole-array operations instead (one sort,
+bincounts and index arithmetic), which is faster for large gradebooks; the
+tests check that both give the same results.
+
+Rubric criteria are summarised by the database instead: one grouped
+aggregate query gives every criterion's mean and score distribution per
+course, and the overall figures are combined from those groups.
+
+Results are cached per scope and keyed on ``analytics:version``, which moves
+whenever grades or projects are written (see UserStatsManager.refresh and
+GradeManager.recompute_letter_grades).
+"""
+import math
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Value
+from django.db.models.functions import Coalesce
+
+from .grading import DEFAULT_BOUNDARIES
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional and not a declared requirement
+    np = None
+
+VERSION_KEY = 'analytics:version'
+ANALYTICS_TIMEOUT = 60 * 60
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Histogram bins of 10 points; the last one includes 100
+BIN_WIDTH = 10
+BIN_COUNT = 10
+
+LETTER_ORDER = [letter for _, letter in DEFAULT_BOUNDARIES]
+
+# Rubric histogram bins of 5 points; the last one includes the maximum of 25
+RUBRIC_BIN_WIDTH = 5
+RUBRIC_BIN_COUNT = 5
+
+
+def analytics_changed():
+    """Invalidate every cached analytics result."""
+    def bump():
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    bump()
+    # Again after commit, in case a request cached the old grades meanwhile
+    transaction.on_commit(bump)
+
+
+def _grades(teacher_id=None):
+    from .models import Grade
+
+    grades = Grade.objects.all()
+    if teacher_id is not None:
+        grades = grades.filter(project__teacher_id=teacher_id)
+    return grades
+
+
+def load_columns(teacher_id=None):
+    """Scores, letters, teacher ids and courses of every grade, as parallel sequences."""
+    rows = _grades(teacher_id).values_list(
+        'score', 'letter_grade', 'project__teacher_id',
+        Coalesce('project__student__student_profile__course', Value('')),
+    )
+    columns = list(zip(*rows))
+    return columns if columns else [(), (), (), ()]
+
+
+def _percentile(ordered, q):
+    """Linearly interpolated percentile ``q`` (0-100) of an ascending list, as numpy does."""
+    position = (len(ordered) - 1) * q / 100
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(scores):
+    """Count, mean, spread, percentiles and histogram of a sequence of scores."""
+    if not len(scores):
+        return {'count': 0}
+    if np is not None:
+        values = np.asarray(scores)
+        percentiles = np.percentile(values, PERCENTILES).tolist()
+        histogram = np.bincount(
+            np.minimum(values // BIN_WIDTH, BIN_COUNT - 1).astype(int), minlength=BIN_COUNT
+        ).tolist()
+        mean, std, low, high = values.mean(), values.std(), values.min(), values.max()
+    else:
+        ordered = sorted(scores)
+        percentiles = [_percentile(ordered, q) for q in PERCENTILES]
+        histogram = [0] * BIN_COUNT
+        for score in ordered:
+            histogram[min(score // BIN_WIDTH, BIN_COUNT - 1)] += 1
+        mean = sum(ordered) / len(ordered)
+        std = math.sqrt(sum((score - mean) ** 2 for score in ordered) / len(ordered))
+        low, high = ordered[0], ordered[-1]
+
+    count = len(scores)
+    return {
+        'count': count,
+        'mean': round(float(mean), 1),
+        'std': round(float(std), 1),
+        'min': int(low),
+        'max': int(high),
+        'percentiles': [(q, round(value, 1)) for q, value in zip(PERCENTILES, percentiles)],
+        'histogram': [
+            {
+                'label': f'{start}-{start + BIN_WIDTH - 1 if start + BIN_WIDTH < 100 else 100}',
+                'count': n,
+                'percent': round(100 * n / count, 1),
+            }
+            for start, n in zip(range(0, 100, BIN_WIDTH), histogram)
+        ],
+    }
+
+
+def _factorize(keys):
+    """The distinct keys, in order of appearance, and each key's position among them."""
+    index = {}
+    codes = [index.setdefault(key, len(index)) for key in keys]
+    return list(index), codes
+
+
+def group_stats(keys, scores):
+    """``{key: (count, mean, p25, median, p75)}`` of ``scores`` grouped by ``keys``."""
+    if not len(scores):
+        return {}
+    if np is not None:
+        groups, codes = _factorize(keys)
+        codes = np.asarray(codes)
+        values = np.asarray(scores)
+        counts = np.bincount(codes)
+        starts = np.cumsum(counts) - counts
+        means = np.bincount(codes, weights=values) / counts
+        # One sort by group, then score, puts every group's scores in order.
+        # Scores fit in 7 bits, so a single integer sort of group and score
+        # packed together does it without a lexsort.
+        if values.dtype.kind in 'iu' and values.min() >= 0 and values.max() < 128:
+            ordered = (np.sort((codes << 7) | values) & 127).astype(float)
+        else:
+            ordered = values[np.lexsort((values, codes))].astype(float)
+        quartiles = []
+        for q in (0.25, 0.5, 0.75):
+            position = starts + q * (counts - 1)
+            low, high = np.floor(position).astype(int), np.ceil(position).astype(int)
+            quartiles.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+        return {
+            key: (int(n), round(float(mean), 1), *(round(float(v), 1) for v in qs))
+            for key, n, mean, *qs in zip(groups, counts.tolist(), means.tolist(), *(q.tolist() for q in quartiles))
+        }
+
+    by_key = {}
+    for key, score in zip(keys, scores):
+        by_key.setdefault(key, []).append(score)
+    stats = {}
+    for key, values in by_key.items():
+        values.sort()
+        stats[key] = (
+            len(values), round(sum(values) / len(values), 1),
+            *(round(_percentile(values, q), 1) for q in (25, 50, 75)),
+        )
+    return stats
+
+
+def letter_distribution(letters):
+    """``[(letter, count, percent)]`` in grade order, then any letters of custom scales."""
+    if not len(letters):
+        return []
+    # Counter is implemented in C and beats sorting strings with np.unique
+    counts = Counter(letters)
+    order = LETTER_ORDER + sorted(set(counts) - set(LETTER_ORDER))
+    total = len(letters)
+    return [(letter, counts[letter], round(100 * counts[letter] / total, 1)) for letter in order if letter in counts]
+
+
+def rubric_summary(teacher_id=None):
+    """
+    Per-criterion means and distributions of the grades with rubric scores,
+    overall and per course, from one grouped aggregate query.
+    """
+    from .models import Grade
+
+    criteria = Grade.RUBRIC_CRITERIA
+    bins = [
+        (start, start + RUBRIC_BIN_WIDTH - 1 if index < RUBRIC_BIN_COUNT - 1 else Grade.RUBRIC_MAX_SCORE)
+        for index, start in enumerate(range(0, RUBRIC_BIN_COUNT * RUBRIC_BIN_WIDTH, RUBRIC_BIN_WIDTH))
+    ]
+    aggregates = {'count': Count('pk')}
+    for name, _ in criteria:
+        field = f'{name}_score'
+        aggregates[f'{name}_mean'] = Avg(field)
+        for index, bounds in enumerate(bins):
+            aggregates[f'{name}_{index}'] = Count('pk', filter=Q(**{f'{field}__range': bounds}))
+    # The scores are saved together, so one of them tells whether a grade has a rubric
+    groups = list(
+        _grades(teacher_id).filter(content_score__isnull=False)
+        .values(course=Coalesce('project__student__student_profile__course', Value('')))
+        .annotate(**aggregates)
+        .order_by()
+    )
+    total = sum(group['count'] for group in groups)
+    if not total:
+        return {'count': 0}
+
+    overall = []
+    for name, label in criteria:
+        mean = sum(group[f'{name}_mean'] * group['count'] for group in groups) / total
+        counts = [sum(group[f'{name}_{index}'] for group in groups) for index in range(RUBRIC_BIN_COUNT)]
+        overall.append({
+            'name': name,
+            'label': label,
+            'mean': round(mean, 1),
+            'percent': round(100 * mean / Grade.RUBRIC_MAX_SCORE, 1),
+            'histogram': [round(100 * n / total, 1) for n in counts],
+        })
+    weakest = min(overall, key=lambda criterion: criterion['mean'])['name']
+    return {
+        'count': total,
+        'criteria': overall,
+        'weakest': weakest,
+        'bins': [f'{low}-{high}' for low, high in bins],
+        'by_course': {
+            group['course']: (group['count'], *(round(group[f'{name}_mean'], 1) for name, _ in criteria))
+            for group in groups
+        },
+    }
+
+
+def compute_analytics(teacher_id=None):
+    scores, letters, teachers, courses = load_columns(teacher_id)
+    if np is not None:
+        # Converted once and shared by every statistic
+        scores = np.fromiter(scores, dtype=np.int64, count=len(scores))
+    return {
+        'overall': summarize(scores),
+        'letters': letter_distribution(letters),
+        'by_teacher': group_stats(teachers, scores) if teacher_id is None else {},
+        'by_course': group_stats(courses, scores),
+        'rubric': rubric_summary(teacher_id),
+    }
+
+
+def grade_analytics(teacher_id=None):
+    """
+    Analytics for one teacher's grades, or for all grades when ``teacher_id``
+    is None, from the cache while no grade has changed.
+    """
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+    key = f"analytics:{teacher_id or 'all'}:{version}"
+    result = cache.get(key)
+    if result is None:
+        result = compute_analytics(teacher_id)
+        cache.set(key, result, ANALYTICS_TIMEOUT)
+    return result
@@ -0,0 +1,264 @@
+"""
+JSON API for projects, grades and dashboard stats.
+
+Reads take a ``fields`` parameter (``?fields=id,title,score``) and select
+only those columns, through ``.values()``, so a client polling for scores
+does not pay for descriptions and joins it never reads. Project lists use
+the same keyset pagination as the HTML pages.
+
+Every read carries an ETag built from the user's fragment version (see
+projects.fragments), which moves whenever one of their projects or grades
+is written. A client sending it back in If-None-Match gets a 304 before
+the view runs, for the price of a cache lookup.
+
+Writes go through the same forms as the HTML pages, with a JSON body, and
+answer with the saved object or ``{"errors": ...}`` and status 400.
+Students submit projects with a POST to the list and change their own
+ungraded projects with PUT (every field) or PATCH (the fields given). A
+JSON body cannot carry a file, so a file is sent with the chunked upload
+endpoints first and named by its ``upload`` id. The ``file`` field is the
+project's download URL, not the name it is stored under.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET, require_http_methods
+
+from .forms import GradeForm, ProjectSubmissionForm
+from .fragments import fragment_version
+from .models import Grade, Project, UserStats
+from .pagination import CursorPaginator
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Field name in the API -> lookup selected for it
+PROJECT_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'student': 'student_id',
+    'teacher': 'teacher_id',
+    'submitted_at': 'submitted_at',
+    'due_date': 'due_date',
+    'is_submitted': 'is_submitted',
+    'file': 'file_upload',
+    'score': 'grade__score',
+    'letter_grade': 'grade__letter_grade',
+}
+
+GRADE_FIELDS = {
+    'project': 'project_id',
+    'teacher': 'teacher_id',
+    'score': 'score',
+    'letter_grade': 'letter_grade',
+    'feedback': 'feedback',
+    'graded_at': 'graded_at',
+    **{f'{name}_score': f'{name}_score' for name, _ in Grade.RUBRIC_CRITERIA},
+}
+
+STATS_FIELDS = {name: name for name in UserStats.COUNTER_FIELDS + ['average_score']}
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(request, available):
+    """The API field names asked for with ``?fields=``, or all of ``available``."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+    fields = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise InvalidFields(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return fields
+
+
+def project_values(projects, fields, extra=()):
+    """``projects`` as dicts holding ``fields`` (and the lookups in ``extra``), in one query."""
+    if 'file' in fields:
+        extra = [*extra, 'id']  # for the download URL
+    return projects.values(*dict.fromkeys([PROJECT_FIELDS[name] for name in fields] + list(extra)))
+
+
+def _rename(row, fields, available):
+    return {name: row[available[name]] for name in fields}
+
+
+def _project(row, fields):
+    """A project row from project_values() in API form."""
+    project = _rename(row, fields, PROJECT_FIELDS)
+    if project.get('file'):
+        project['file'] = reverse('project_download', args=[row['id']])
+    return project
+
+
+def _json_body(request):
+    """The request body as a dict, or None if it is not a JSON object."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def api_view(view):
+    """
+    JSON errors instead of redirects and HTML pages: 401 for anonymous
+    requests, 404 for missing objects and 400 for unknown fields.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'error': 'Not found.'}, status=404)
+        except InvalidFields as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return wrapped
+
+
+def user_etag(request, *args, **kwargs):
+    """ETag of a read: the user's data version and the exact URL asked for."""
+    if not request.user.is_authenticated:
+        return None
+    key = f'{fragment_version(request.user.pk)}:{request.get_full_path()}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _owner(user):
+    """The Project field linking ``user`` to their projects."""
+    return 'teacher' if user.user_type == 'teacher' else 'student'
+
+
+def _projects_for(user):
+    return Project.objects.filter(**{_owner(user): user})
+
+
+def _save_project(request, data, project=None):
+    """Validate ``data`` with the submission form and save it as ``request.user``'s project."""
+    if data is None:
+        return JsonResponse({'error': 'The body must be a JSON object.'}, status=400)
+    form = ProjectSubmissionForm(data, instance=project, student=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    saved = form.save_submission()
+    row = project_values(Project.objects.filter(pk=saved.pk), PROJECT_FIELDS).get()
+    return JsonResponse(_project(row, PROJECT_FIELDS), status=200 if project else 201)
+
+
+@require_http_methods(['GET', 'POST'])
+@api_view
+@condition(etag_func=user_etag)
+def project_list(request):
+    """GET lists the user's projects; POST (students only) submits a new one."""
+    if request.method == 'POST':
+        if request.user.user_type != 'student':
+            return JsonResponse({'error': 'Only students can submit projects.'}, status=403)
+        return _save_project(request, _json_body(request))
+
+    fields = parse_fields(request, PROJECT_FIELDS)
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+
+    projects = _projects_for(request.user)
+    if request.GET.get('status') == 'pending':
+        projects = projects.filter(grade__isnull=True, is_submitted=True)
+    elif request.GET.get('status') == 'graded':
+        projects = projects.filter(grade__isnull=False)
+
+    # The sort keys are selected too, for the cursors
+    rows = project_values(projects, fields, extra=['submitted_at', 'id']).order_by('-submitted_at', '-id')
+    page = CursorPaginator(rows, limit).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [_project(row, fields) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@require_http_methods(['GET', 'PUT', 'PATCH'])
+@api_view
+@condition(etag_func=user_etag)
+def project_detail(request, project_id):
+    """
+    GET returns the project; PUT and PATCH (its student only, until it is
+    graded) change it, PATCH keeping the fields the body leaves out.
+    """
+    if request.method in ('PUT', 'PATCH'):
+        if request.user.user_type != 'student':
+            return JsonResponse({'error': 'Only students can change projects.'}, status=403)
+        project = Project.objects.filter(pk=project_id, student=request.user).select_related('grade').first()
+        if project is None:
+            raise Http404
+        if hasattr(project, 'grade'):
+            return JsonResponse({'error': 'A graded project can no longer be changed.'}, status=403)
+        data = _json_body(request)
+        if request.method == 'PATCH' and data is not None:
+            data = {
+                'title': project.title, 'description': project.description,
+                'teacher': project.teacher_id, 'due_date': project.due_date, **data,
+            }
+        return _save_project(request, data, project)
+
+    fields = parse_fields(request, PROJECT_FIELDS)
+    row = project_values(_projects_for(request.user).filter(pk=project_id), fields).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(_project(row, fields))
+
+
+@require_http_methods(['GET', 'PUT'])
+@api_view
+@condition(etag_func=user_etag)
+def project_grade(request, project_id):
+    """GET returns the project's grade; PUT (teachers only) grades it with the rubric."""
+    if request.method == 'GET':
+        fields = parse_fields(request, GRADE_FIELDS)
+        grades = Grade.objects.filter(project_id=project_id, **{f'project__{_owner(request.user)}': request.user})
+        row = grades.values(*(GRADE_FIELDS[name] for name in fields)).first()
+        if row is None:
+            raise Http404
+        return JsonResponse(_rename(row, fields, GRADE_FIELDS))
+
+    if request.user.user_type != 'teacher':
+        return JsonResponse({'error': 'Only teachers can grade projects.'}, status=403)
+    project = Project.objects.filter(pk=project_id, teacher=request.user).first()
+    if project is None:
+        raise Http404
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'The body must be a JSON object.'}, status=400)
+
+    grade = Grade.objects.filter(project=project).first()
+    created = grade is None
+    form = GradeForm(data, instance=grade)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    grade = form.save(commit=False)
+    grade.teacher = request.user
+    grade.project = project
+    grade.save()
+    return JsonResponse(
+        {name: getattr(grade, lookup) for name, lookup in GRADE_FIELDS.items()},
+        status=201 if created else 200,
+    )
+
+
+@require_GET
+@api_view
+@condition(etag_func=user_etag)
+def stats(request):
+    """The dashboard counters of the current user."""
+    fields = parse_fields(request, STATS_FIELDS)
+    stats = UserStats.objects.for_user(request.user)
+    return JsonResponse({name: getattr(stats, name) for name in fields})
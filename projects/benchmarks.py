@@ -0,0 +1,108 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: they run against a scratch
+copy created the same way the test runner creates its test database.
+"""
+import importlib
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+from django.utils import timezone
+
+
+@contextmanager
+def scratch_database(alias=DEFAULT_DB_ALIAS, name=None):
+    """
+    Create an empty, migrated database for the duration of the block, named
+    ``name`` if given (for SQLite, a file rather than the in-memory default).
+    """
+    connection = connections[alias]
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+URLCONFS = ['accounts.urls', 'projects.urls', 'grading_system.urls']
+
+
+def _reload_urlconfs():
+    for name in URLCONFS:
+        importlib.reload(importlib.import_module(name))
+    clear_url_caches()
+
+
+@contextmanager
+def async_views(enabled=True):
+    """Route the views PROJECT_ASYNC_VIEWS switches to their sync or async variants for the block."""
+    try:
+        with override_settings(PROJECT_ASYNC_VIEWS=enabled):
+            _reload_urlconfs()
+            yield
+    finally:
+        _reload_urlconfs()
+
+
+@contextmanager
+def measure(alias=DEFAULT_DB_ALIAS):
+    """Record wall time and query count of the block into the yielded dict."""
+    result = {'queries': 0}
+
+    def count(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    with connections[alias].execute_wrapper(count):
+        yield result
+    result['seconds'] = time.perf_counter() - start
+
+
+def seed_users(students=1, teachers=1):
+    """Create ``students`` and ``teachers`` users with profiles, without password hashing."""
+    from accounts.models import User, StudentProfile, TeacherProfile
+
+    users = User.objects.bulk_create(
+        [User(username=f'bench-student-{i}', user_type='student', first_name='Student', last_name=str(i))
+         for i in range(students)] +
+        [User(username=f'bench-teacher-{i}', user_type='teacher', first_name='Teacher', last_name=str(i))
+         for i in range(teachers)]
+    )
+    student_users, teacher_users = users[:students], users[students:]
+    StudentProfile.objects.bulk_create(
+        StudentProfile(user=user, student_id=f'BS{user.pk}', course='Benchmarking') for user in student_users
+    )
+    TeacherProfile.objects.bulk_create(
+        TeacherProfile(user=user, employee_id=f'BT{user.pk}', department='Benchmarking', designation='Lecturer')
+        for user in teacher_users
+    )
+    return student_users, teacher_users
+
+
+def seed_projects(count, students, teachers):
+    """Create ``count`` submitted projects spread round-robin over the given users."""
+    from projects.models import Project
+
+    due = timezone.now() + timedelta(days=7)
+    return Project.objects.bulk_create(
+        Project(
+            title=f'Benchmark project {i}',
+            description='Seeded for benchmarking.',
+            student=students[i % len(students)],
+            teacher=teachers[i % len(teachers)],
+            due_date=due,
+            is_submitted=True,
+        )
+        for i in range(count)
+    )
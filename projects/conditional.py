@@ -0,0 +1,115 @@
+"""
+Conditional GET for the project pages and file downloads.
+
+Validators come from one small query per request (the project's and its
+grade's change times and the stored file name) instead of the full page or
+file. For content-addressed files the ETag is the content hash itself, so
+a re-check of an unchanged download never opens the file. Page ETags also
+carry the user's fragment version, which covers the counters and similar
+submissions shown beside the project, and the CSRF secret the page embeds.
+Pages have no Last-Modified: those parts have no change time, so a date
+alone would answer If-Modified-Since with 304 after they changed.
+
+Responses are ``Cache-Control: private, no-cache``: browsers may keep a
+copy but must revalidate it, and shared caches must not store it.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .fragments import fragment_version
+from .models import Project
+from .storage import blob_hash, submission_storage
+
+
+def _owner_filter(user, owner):
+    """
+    The filter limiting projects to those ``user`` may see: ``owner`` is
+    'student', 'teacher' or None for the student or teacher side by user type.
+    """
+    if owner is None:
+        owner = {'student': 'student', 'teacher': 'teacher'}.get(user.user_type)
+    return {owner: user} if owner else {}
+
+
+def project_state(request, project_id, owner=None):
+    """
+    ``(updated_at, grade updated_at, file name)`` of the project if the user
+    may see it, else None. Read once per request.
+    """
+    cached = getattr(request, '_project_state', None)
+    if cached is None or cached[0] != project_id:
+        state = Project.objects.filter(pk=project_id, **_owner_filter(request.user, owner)).values_list(
+            'updated_at', 'grade__updated_at', 'file_upload'
+        ).first()
+        request._project_state = cached = (project_id, state)
+    return cached[1]
+
+
+def file_etag(name, storage):
+    """Strong validator of a stored file: its content hash, or its name, size and mtime."""
+    sha256 = blob_hash(name)
+    if sha256:
+        return f'"{sha256}"'
+    try:
+        stat = os.stat(storage.path(name))
+    except (OSError, NotImplementedError):
+        return None
+    return '"%s"' % hashlib.sha1(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+
+
+def _private(view):
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapped
+
+
+def conditional_page(owner=None):
+    """Conditional GET for a page about project ``project_id``."""
+    def page_state(request, project_id):
+        # Flash messages are shown once, so a page with some is always rendered
+        if len(get_messages(request)):
+            return None
+        return project_state(request, project_id, owner)
+
+    def etag(request, project_id):
+        state = page_state(request, project_id)
+        if state is None:
+            return None
+        key = ':'.join([
+            fragment_version(request.user.pk), request.META.get('CSRF_COOKIE', ''),
+            *(str(value) for value in state),
+        ])
+        return 'W/"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+    def decorator(view):
+        return _private(condition(etag_func=etag)(view))
+    return decorator
+
+
+def download_validators(request, project_id):
+    """``(etag, last_modified)`` of the file of project ``project_id``, or Nones without one."""
+    state = project_state(request, project_id)
+    if not (state and state[2]):
+        return None, None
+    return file_etag(state[2], submission_storage()), state[0]
+
+
+def conditional_download():
+    """Conditional GET for the file of project ``project_id``, validated without reading it."""
+    def etag(request, project_id):
+        return download_validators(request, project_id)[0]
+
+    def last_modified(request, project_id):
+        return download_validators(request, project_id)[1]
+
+    def decorator(view):
+        return _private(condition(etag_func=etag, last_modified_func=last_modified)(view))
+    return decorator
@@ -0,0 +1,162 @@
+import calendar
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeFileWrapper:
+    """Iterate over ``length`` bytes of a file starting at ``offset``, in chunks."""
+
+    def __init__(self, filelike, offset=0, length=None, chunk_size=CHUNK_SIZE):
+        self.filelike = filelike
+        self.offset = offset
+        self.remaining = length
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        self.filelike.seek(self.offset)
+        while self.remaining is None or self.remaining > 0:
+            size = self.chunk_size if self.remaining is None else min(self.chunk_size, self.remaining)
+            data = self.filelike.read(size)
+            if not data:
+                break
+            if self.remaining is not None:
+                self.remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.filelike.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=`` range against a file of ``size`` bytes.
+
+    Returns ``(start, end)`` inclusive, ``None`` when the header should be
+    ignored (absent, malformed or multiple ranges) and ``False`` when the
+    range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_matches(header, etag=None, last_modified=None):
+    """
+    Whether a Range request may be answered with part of the file: always
+    without ``If-Range``, otherwise only if it names the file as it is now,
+    by its strong ``etag`` or exactly its ``last_modified`` date (RFC 9110,
+    section 13.1.5). A client resuming a download of an older version gets
+    the whole new file rather than its tail spliced onto the old one.
+    """
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith(('"', 'W/')):
+        return etag is not None and not etag.startswith('W/') and header == etag
+    date = parse_http_date_safe(header)
+    return date is not None and last_modified is not None and date == calendar.timegm(last_modified.utctimetuple())
+
+
+def offload_response(field_file, filename, content_type):
+    """
+    Hand the file off to the front proxy when PROJECT_DOWNLOAD_OFFLOAD is set.
+
+    'x-sendfile' (Apache, lighttpd) sends the absolute path, 'x-accel-redirect'
+    (nginx) sends PROJECT_DOWNLOAD_ACCEL_PREFIX joined with the path relative
+    to the storage root.
+    Returns None when offloading is disabled or the storage has no local path.
+    """
+    mode = getattr(settings, 'PROJECT_DOWNLOAD_OFFLOAD', None)
+    if not mode:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-sendfile':
+        try:
+            response['X-Sendfile'] = field_file.path
+        except NotImplementedError:
+            return None
+    elif mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'PROJECT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        try:
+            # The name need not be the path on disk (see projects.storage)
+            name = os.path.relpath(field_file.path, field_file.storage.location).replace(os.sep, '/')
+        except (NotImplementedError, AttributeError):
+            name = field_file.name
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + name)
+    else:
+        return None
+
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def serve_file(request, field_file, filename=None, content_type='application/octet-stream',
+               etag=None, last_modified=None):
+    """
+    Serve a stored file as an attachment without reading it into memory.
+
+    Supports a single HTTP byte range for resumed downloads; anything the
+    server cannot honour falls back to the full body, as RFC 9110 allows.
+    ``etag`` and ``last_modified`` are the file's validators, which an
+    ``If-Range`` header on the range request must match.
+    """
+    filename = filename or os.path.basename(field_file.name)
+
+    response = offload_response(field_file, filename, content_type)
+    if response is not None:
+        return response
+
+    size = field_file.size
+    byte_range = None
+    if if_range_matches(request.headers.get('If-Range'), etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    field_file.open('rb')
+    if byte_range is None:
+        response = FileResponse(field_file.file, as_attachment=True, filename=filename, content_type=content_type)
+        response.block_size = CHUNK_SIZE
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            RangeFileWrapper(field_file.file, offset=start, length=length),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
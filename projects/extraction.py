@@ -0,0 +1,376 @@
+"""
+Plain-text extraction from submission files.
+
+PDF, DOCX and ZIP archives are read with the standard library alone:
+DOCX paragraphs come from ``word/document.xml``, archives are walked member
+by member (text files and nested documents), and PDF text is pulled from the
+show-text operators of each content stream. pypdf is used for PDFs instead
+when it is installed. Legacy .doc and .rar files yield no text.
+
+cached_text() keeps the result in a file so that previews and similarity
+indexing share one extraction, and the outline helpers at the end give the
+structure shown in previews. Nothing here touches Django, so the functions
+can run in worker processes.
+"""
+import io
+import os
+import re
+import tempfile
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import PyPdfError
+except ImportError:  # pragma: no cover - pypdf is optional
+    PdfReader = PyPdfError = None
+
+# Extraction stops once this much text has been collected
+MAX_TEXT_LENGTH = 2 * 1024 * 1024
+
+# Archive members larger than this (uncompressed) are skipped
+MAX_MEMBER_SIZE = 20 * 1024 * 1024
+MAX_MEMBERS = 500
+MAX_DEPTH = 2
+
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.rst', '.tex', '.csv', '.json', '.xml', '.html', '.htm', '.css', '.sql',
+    '.py', '.java', '.c', '.h', '.cpp', '.hpp', '.cs', '.js', '.ts', '.php', '.rb', '.go', '.kt',
+    '.swift', '.m', '.r', '.sh', '.ipynb',
+}
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class ExtractionError(ValueError):
+    pass
+
+
+# What reading a damaged or truncated file can raise
+READ_ERRORS = (zipfile.BadZipFile, zlib.error, ElementTree.ParseError, EOFError, KeyError) + (
+    (PyPdfError,) if PyPdfError is not None else ()
+)
+
+
+def extension(filename):
+    return os.path.splitext(filename)[1].lower()
+
+
+def extract_text(path, filename=None):
+    """
+    Text of the file at ``path``, at most MAX_TEXT_LENGTH characters.
+
+    ``filename`` decides the format (stored blobs have no extension of
+    their own). Unsupported formats give ''; damaged files raise
+    ExtractionError.
+    """
+    with open(path, 'rb') as f:
+        try:
+            return _extract(f, extension(filename or str(path)), depth=0)[:MAX_TEXT_LENGTH]
+        except READ_ERRORS as e:
+            raise ExtractionError(str(e)) from e
+
+
+def cached_text(path, filename, cache_path):
+    """extract_text(), kept at ``cache_path`` so each file is only read once."""
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    text = extract_text(path, filename)
+    directory = os.path.dirname(cache_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+        tmp.write(text)
+    os.replace(tmp_path, cache_path)
+    return text
+
+
+def _extract(f, ext, depth):
+    if ext == '.pdf':
+        return _pdf_text(f)
+    if ext == '.docx':
+        return _docx_text(f)
+    if ext == '.zip':
+        return _zip_text(f, depth)
+    if ext in TEXT_EXTENSIONS:
+        return f.read(MAX_TEXT_LENGTH).decode('utf-8', errors='replace')
+    return ''
+
+
+def _docx_text(f):
+    parts = []
+    with zipfile.ZipFile(f) as archive, archive.open('word/document.xml') as document:
+        for _, element in ElementTree.iterparse(document, events=('end',)):
+            if element.tag == WORD_NS + 't':
+                parts.append(element.text or '')
+            elif element.tag == WORD_NS + 'tab':
+                parts.append('\t')
+            elif element.tag == WORD_NS + 'p':
+                parts.append('\n')
+                element.clear()
+    return ''.join(parts)
+
+
+def _zip_text(f, depth):
+    parts = []
+    length = 0
+    with zipfile.ZipFile(f) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()][:MAX_MEMBERS]
+        for info in members:
+            ext = extension(info.filename)
+            nested = ext in ('.pdf', '.docx', '.zip')
+            if info.file_size > MAX_MEMBER_SIZE or not (ext in TEXT_EXTENSIONS or nested):
+                continue
+            if ext == '.zip' and depth >= MAX_DEPTH:
+                continue
+            with archive.open(info) as member:
+                if nested:
+                    # zipfile and the PDF reader need a seekable file
+                    member = io.BytesIO(member.read())
+                try:
+                    text = _extract(member, ext, depth + 1)
+                except READ_ERRORS:
+                    continue
+            parts.append(text)
+            length += len(text)
+            if length >= MAX_TEXT_LENGTH:
+                break
+    return '\n'.join(parts)
+
+
+# PDF content streams: show-text operators and the strings they take
+PDF_STREAM_RE = re.compile(rb'(?<!end)stream\r?\n')
+PDF_TEXT_RE = re.compile(
+    rb'\((?P<string>(?:\\.|[^\\)])*)\)\s*(?:Tj|\'|")'
+    rb'|\[(?P<array>(?:\\.|[^\]\\])*)\]\s*TJ'
+    rb'|(?P<newline>T\*|Td|TD|ET)\b',
+    re.S,
+)
+PDF_ARRAY_ITEM_RE = re.compile(rb'\((?P<string>(?:\\.|[^\\)])*)\)|(?P<number>-?\d+(?:\.\d+)?)')
+PDF_ESCAPE_RE = re.compile(rb'\\([0-7]{1,3}|\r\n|.)', re.S)
+PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+# Without pypdf, PDFs are scanned PDF_READ_SIZE bytes at a time and only
+# their first MAX_PDF_READ bytes are looked at
+PDF_READ_SIZE = 1024 * 1024
+MAX_PDF_READ = 64 * 1024 * 1024
+# How far before ``stream`` its dictionary is looked for
+PDF_HEADER_SIZE = 512
+
+# A TJ adjustment this far left (in thousandths of an em) is taken as a space
+PDF_WORD_GAP = 200
+
+
+def _pdf_text(f):
+    if PdfReader is not None:
+        reader = PdfReader(f)
+        return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+    parts = []
+    length = 0
+    for raw in _pdf_streams(f):
+        text = _pdf_stream_text(raw)
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_TEXT_LENGTH:
+            break
+    return ''.join(parts)
+
+
+def _pdf_blocks(f):
+    """The file in PDF_READ_SIZE blocks, stopping after MAX_PDF_READ bytes."""
+    remaining = MAX_PDF_READ
+    while remaining > 0:
+        block = f.read(min(PDF_READ_SIZE, remaining))
+        if not block:
+            return
+        remaining -= len(block)
+        yield block
+
+
+def _pdf_streams(f):
+    """
+    The content of each unfiltered or FlateDecode stream, at most
+    MAX_MEMBER_SIZE bytes of it, read block by block rather than all at once.
+    """
+    blocks = _pdf_blocks(f)
+    buffer = b''
+    position = 0  # where to look for the next stream in ``buffer``
+
+    def more():
+        nonlocal buffer
+        block = next(blocks, b'')
+        buffer += block
+        return bool(block)
+
+    while True:
+        match = PDF_STREAM_RE.search(buffer, position)
+        if match is None:
+            # Keep enough for the dictionary of a stream starting in the next
+            # block; only the last few bytes can begin the keyword
+            buffer = buffer[-PDF_HEADER_SIZE:]
+            position = max(0, len(buffer) - len(b'stream\r\n'))
+            if not more():
+                return
+            continue
+        header = buffer[max(0, match.start() - PDF_HEADER_SIZE):match.start()]
+        header = header[header.rfind(b'<<'):]
+        buffer, position = buffer[match.end():], 0
+        keep = b'/FlateDecode' in header or b'/Filter' not in header  # other filters carry no text
+        decoder = zlib.decompressobj() if b'/FlateDecode' in header else None
+
+        output = []
+        size = 0
+        while True:
+            end = buffer.find(b'endstream')
+            if end == -1:
+                # The keyword may straddle the next block
+                piece, buffer = buffer[:-8], buffer[-8:]
+            else:
+                piece, buffer = buffer[:end], buffer[end + len(b'endstream'):]
+            if keep and size < MAX_MEMBER_SIZE:
+                try:
+                    if decoder:
+                        piece = decoder.decompress(piece, MAX_MEMBER_SIZE - size)
+                    else:
+                        piece = piece[:MAX_MEMBER_SIZE - size]
+                except zlib.error:
+                    keep = False
+                else:
+                    output.append(piece)
+                    size += len(piece)
+            if end != -1:
+                break
+            if not more():
+                return
+        if keep:
+            yield b''.join(output)
+
+
+def _pdf_unescape(string):
+    def replace(match):
+        value = match.group(1)
+        if value[:1].isdigit():
+            return bytes([int(value, 8) & 0xFF])
+        if value in (b'\n', b'\r', b'\r\n'):
+            return b''  # line continuation
+        return PDF_ESCAPES.get(value, value)
+    return PDF_ESCAPE_RE.sub(replace, string).decode('latin-1')
+
+
+def _pdf_stream_text(stream):
+    parts = []
+    for match in PDF_TEXT_RE.finditer(stream):
+        if match.group('string') is not None:
+            parts.append(_pdf_unescape(match.group('string')))
+        elif match.group('array') is not None:
+            for item in PDF_ARRAY_ITEM_RE.finditer(match.group('array')):
+                if item.group('string') is not None:
+                    parts.append(_pdf_unescape(item.group('string')))
+                elif float(item.group('number')) <= -PDF_WORD_GAP:
+                    parts.append(' ')
+        else:
+            parts.append('\n' if match.group('newline') == b'ET' else ' ')
+    return ''.join(parts)
+
+
+# Document structure, for previews
+
+HEADING_RE = re.compile(r'^(?:Title|Heading\s*(\d))$', re.I)
+MAX_OUTLINE = 100
+MAX_LISTED_MEMBERS = 200
+PDF_PAGE_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+PDF_COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+PDF_TITLE_RE = re.compile(rb'/Title\s*\((?P<string>(?:\\.|[^\\)])*)\)')
+
+
+def docx_outline(path):
+    """``(level, heading)`` for the Title and Heading paragraphs of a DOCX file."""
+    outline = []
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as document:
+        for _, element in ElementTree.iterparse(document, events=('end',)):
+            if element.tag != WORD_NS + 'p':
+                continue
+            style = element.find(f'{WORD_NS}pPr/{WORD_NS}pStyle')
+            match = HEADING_RE.match(style.get(WORD_NS + 'val', '')) if style is not None else None
+            if match:
+                text = ''.join(t.text or '' for t in element.iter(WORD_NS + 't')).strip()
+                if text:
+                    outline.append((int(match.group(1) or 0), text))
+                    if len(outline) == MAX_OUTLINE:
+                        break
+            element.clear()
+    return outline
+
+
+def pdf_outline(path):
+    """``(page count or None, bookmark titles)`` of a PDF file, as far as can be told."""
+    if PdfReader is not None:
+        reader = PdfReader(path)
+
+        def titles(items):
+            for item in items:
+                if isinstance(item, list):
+                    yield from titles(item)
+                else:
+                    yield item.title
+        return len(reader.pages), [(1, title) for title in titles(reader.outline)][:MAX_OUTLINE]
+
+    # Objects packed into compressed object streams are not seen here
+    pages, count, outline = 0, 0, []
+    with open(path, 'rb') as f:
+        for pattern, match, window in _pdf_scan(f, (PDF_PAGE_RE, PDF_COUNT_RE, PDF_TITLE_RE)):
+            if pattern is PDF_PAGE_RE:
+                pages += 1
+            elif pattern is PDF_COUNT_RE:
+                count = max(count, int(match.group(1)))
+            # Bookmarks have a parent; the document information dictionary does not
+            elif len(outline) < MAX_OUTLINE and b'/Parent' in window[max(0, match.start() - 256):match.end() + 256]:
+                title = _pdf_string(match.group('string')).strip()
+                if title:
+                    outline.append((1, title))
+    return pages or count or None, outline
+
+
+def _pdf_scan(f, patterns, context=1024):
+    """
+    ``(pattern, match, window)`` for the matches of ``patterns`` in a PDF read
+    block by block. ``window`` holds at least ``context`` bytes either side
+    of the match, file permitting; matches longer than that may be missed.
+    """
+    window = b''
+    done = 0  # matches starting before this have been reported
+    blocks = _pdf_blocks(f)
+    while True:
+        block = next(blocks, b'')
+        window += block
+        limit = len(window) - context if block else len(window)
+        if limit > done:
+            for pattern in patterns:
+                for match in pattern.finditer(window, done, limit + context):
+                    if match.start() >= limit:
+                        break
+                    yield pattern, match, window
+            done = limit
+        if not block:
+            return
+        cut = max(0, done - context)
+        window, done = window[cut:], done - cut
+
+
+def _pdf_string(string):
+    text = _pdf_unescape(string)
+    if text.startswith('\xfe\xff'):
+        return text[2:].encode('latin-1').decode('utf-16-be', errors='replace')
+    return text
+
+
+def zip_listing(path):
+    """``(members, total)``: the first MAX_LISTED_MEMBERS ``(name, size)`` pairs and how many files there are."""
+    with zipfile.ZipFile(path) as archive:
+        files = [info for info in archive.infolist() if not info.is_dir()]
+    return [(info.filename, info.file_size) for info in files[:MAX_LISTED_MEMBERS]], len(files)
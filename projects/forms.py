@@ -1,16 +1,26 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Project, Grade
+from accounts.directory import teacher_label
+from .jobs import enqueue
+from .models import Project, Grade, ChunkedUpload
+from .uploads import ALLOWED_EXTENSIONS, attach_upload
 
 User = get_user_model()
 
 class ProjectSubmissionForm(forms.ModelForm):
+    # Picked through the teacher search box; only the chosen id is posted,
+    # so rendering the form never lists (or queries) every teacher
     teacher = forms.ModelChoiceField(
         queryset=User.objects.filter(user_type='teacher'),
-        empty_label="Select a teacher",
-        help_text="Choose the teacher who will grade this project"
+        widget=forms.HiddenInput,
+        help_text="Start typing a teacher's name or department"
     )
     
+    # Set instead of file_upload when the file was sent with the chunked
+    # upload endpoints (projects.uploads)
+    upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+    
     class Meta:
         model = Project
         fields = ['title', 'description', 'teacher', 'due_date', 'file_upload']
@@ -21,7 +31,6 @@ class ProjectSubmissionForm(forms.ModelForm):
                 'rows': 4, 
                 'placeholder': 'Describe your project...'
             }),
-            'teacher': forms.Select(attrs={'class': 'form-select'}),
             'due_date': forms.DateTimeInput(attrs={
                 'class': 'form-control', 
                 'type': 'datetime-local'
@@ -32,35 +41,51 @@ class ProjectSubmissionForm(forms.ModelForm):
             }),
         }
         
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, student=None, **kwargs):
         super().__init__(*args, **kwargs)
-        # Make teacher field display names nicely
-        self.fields['teacher'].queryset = User.objects.filter(user_type='teacher').order_by('first_name', 'last_name')
-        self.fields['teacher'].label_from_instance = lambda obj: f"{obj.first_name} {obj.last_name} - {obj.teacher_profile.department if hasattr(obj, 'teacher_profile') else 'N/A'}"
+        self.student = student
+        # Label for the search box when the form is shown again
+        teacher_id = self['teacher'].value()
+        self.teacher_label = teacher_label(teacher_id) if teacher_id else ''
         
         # Add help text
-        self.fields['file_upload'].help_text = "Accepted formats: PDF, DOC, DOCX, ZIP, RAR (Max size: 10MB)"
+        self.fields['file_upload'].help_text = (
+            f"Accepted formats: PDF, DOC, DOCX, ZIP, RAR "
+            f"(Max size: {settings.PROJECT_CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)}MB)"
+        )
         self.fields['due_date'].help_text = "Select when this project should be submitted by"
         
     def clean_file_upload(self):
         file = self.cleaned_data.get('file_upload')
         if file:
-            # Check file size (10MB limit)
-            if file.size > 10 * 1024 * 1024:
-                raise forms.ValidationError('File size cannot exceed 10MB.')
+            # Check file size; larger files use the chunked upload
+            if file.size > settings.PROJECT_UPLOAD_MAX_SIZE:
+                limit = settings.PROJECT_UPLOAD_MAX_SIZE // (1024 * 1024)
+                raise forms.ValidationError(f'File size cannot exceed {limit}MB.')
             
             # Check file extension
-            allowed_extensions = ['.pdf', '.doc', '.docx', '.zip', '.rar']
             file_extension = '.' + file.name.split('.')[-1].lower()
-            if file_extension not in allowed_extensions:
+            if file_extension not in ALLOWED_EXTENSIONS:
                 raise forms.ValidationError(
                     'File type not supported. Please upload PDF, DOC, DOCX, ZIP, or RAR files only.'
                 )
         return file
     
+    def clean_upload(self):
+        upload_id = self.cleaned_data.get('upload')
+        if not upload_id:
+            return None
+        upload = ChunkedUpload.objects.filter(
+            pk=upload_id, student=self.student, completed_at__isnull=False
+        ).first()
+        if upload is None:
+            raise forms.ValidationError('The uploaded file could not be found. Please upload it again.')
+        return upload
+    
     def clean_due_date(self):
         due_date = self.cleaned_data.get('due_date')
-        if due_date:
+        # A project being edited keeps the due date it was submitted with
+        if due_date and 'due_date' in self.changed_data:
             from django.utils import timezone
             if due_date <= timezone.now():
                 raise forms.ValidationError('Due date must be in the future.')
@@ -82,15 +107,25 @@ class ProjectSubmissionForm(forms.ModelForm):
             if len(description) < 10:
                 raise forms.ValidationError('Project description must be at least 10 characters long.')
         return description
+    
+    def save_submission(self):
+        """
+        Save the project as submitted by ``student``, with the chunked upload
+        if one was given, and queue the preview and indexing of a new file.
+        """
+        project = self.save(commit=False)
+        project.student = self.student
+        project.is_submitted = True
+        upload = self.cleaned_data.get('upload')
+        if upload:
+            attach_upload(upload, project.file_upload)
+        project.save()
+        if project.file_upload and (upload or 'file_upload' in self.changed_data):
+            enqueue('projects.build_previews', {'project_ids': [project.pk]})
+            enqueue('projects.index_submissions', {'project_ids': [project.pk]})
+        return project
 
 class GradeForm(forms.ModelForm):
-    RUBRIC_CRITERIA = [
-        ('content', 'Content Quality (0-25 points)'),
-        ('presentation', 'Presentation/Structure (0-25 points)'),
-        ('creativity', 'Creativity/Innovation (0-25 points)'),
-        ('technical', 'Technical Implementation (0-25 points)'),
-    ]
-    
     # Rubric scoring fields
     content_score = forms.IntegerField(
         min_value=0, max_value=25,
@@ -128,16 +163,10 @@ class GradeForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['feedback'].required = False
         
-        # If editing existing grade, populate rubric scores
-        if self.instance and self.instance.pk and self.instance.score:
-            # Distribute existing score evenly across rubric for editing
-            avg_score = self.instance.score // 4
-            remainder = self.instance.score % 4
-            
-            self.fields['content_score'].initial = avg_score + (1 if remainder > 0 else 0)
-            self.fields['presentation_score'].initial = avg_score + (1 if remainder > 1 else 0)
-            self.fields['creativity_score'].initial = avg_score + (1 if remainder > 2 else 0)
-            self.fields['technical_score'].initial = avg_score
+        # If editing existing grade, populate the stored rubric scores
+        if self.instance and self.instance.pk:
+            for name, _ in Grade.RUBRIC_CRITERIA:
+                self.fields[f'{name}_score'].initial = getattr(self.instance, f'{name}_score')
     
     def clean(self):
         cleaned_data = super().clean()
@@ -159,7 +188,9 @@ class GradeForm(forms.ModelForm):
     def save(self, commit=True):
         grade = super().save(commit=False)
         
-        # Calculate total score from rubric
+        # Keep the rubric scores along with their total
+        for name, _ in Grade.RUBRIC_CRITERIA:
+            setattr(grade, f'{name}_score', self.cleaned_data[f'{name}_score'])
         grade.score = self.cleaned_data['calculated_score']
         
         if commit:
@@ -0,0 +1,105 @@
+"""
+Version keys for per-user template fragment caching.
+
+Dashboards and the teacher project table wrap their data-driven parts in
+``{% cache FRAGMENT_TIMEOUT name user.pk fragment_version %}``. The version
+combines a per-user counter, moved whenever one of the user's projects or
+grades is written (see ``UserStatsManager.refresh``), with a global counter
+moved by changes that touch everyone, such as a new grading scale or a
+renamed user. A moved version makes the old fragments unreachable; they
+simply expire.
+
+The async views use afragment_version() and load_fragment_data(), which
+reads the data behind the fragments that are not cached before the template
+is rendered. Django runs sync code called from async views one call at a
+time on a single thread (sync_to_async's thread_sensitive default, which
+keeps each request on one database connection), so those reads are made one
+after another, in a single hop to that thread.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+# Upper bound on staleness for anything the versions do not track
+FRAGMENT_TIMEOUT = 60 * 10
+
+GLOBAL_KEY = 'fragments:version'
+
+
+def _user_key(user_id):
+    return f'fragments:version:{user_id}'
+
+
+def _new_version():
+    # Time-based rather than a counter, so a version lost to eviction is
+    # never reissued to fragments cached under it earlier
+    return time.time_ns()
+
+
+def fragment_version(user_id):
+    """Return the version string to vary ``user_id``'s fragments on."""
+    keys = [GLOBAL_KEY, _user_key(user_id)]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return f'{versions[GLOBAL_KEY]}.{versions[keys[1]]}'
+
+
+# One hop to the sync thread rather than one per cache key, as the default
+# async cache methods would take
+afragment_version = sync_to_async(fragment_version)
+
+
+async def load_fragment_data(fragments):
+    """
+    Context for a template whose data sits in cached fragments.
+
+    ``fragments`` maps a context name to ``(fragment name, vary_on, loader)``,
+    matching the template's ``{% cache %}`` tag, where ``loader`` is a
+    callable reading the data. Loaders of fragments that are not cached run
+    one after another, together with the cache lookup, in one call to the
+    sync thread; the others are passed lazily and only run if the fragment
+    expires before the template gets to it.
+    """
+    # The tag takes the fragment name as written, quotes included
+    keys = {
+        name: make_template_fragment_key(f"'{fragment}'", vary_on)
+        for name, (fragment, vary_on, _) in fragments.items()
+    }
+
+    def load_missing():
+        cached = cache.get_many(list(keys.values()))
+        return {name: fragments[name][2]() for name, key in keys.items() if key not in cached}
+
+    context = {name: SimpleLazyObject(loader) for name, (_, _, loader) in fragments.items()}
+    context.update(await sync_to_async(load_missing)())
+    return context
+
+
+def _bump(keys):
+    if not keys:
+        return
+
+    def bump():
+        version = _new_version()
+        cache.set_many({key: version for key in keys}, timeout=None)
+
+    bump()
+    # Again once the data is visible to other requests, in case one of them
+    # cached the old data under the version set above
+    transaction.on_commit(bump)
+
+
+def bump_fragment_versions(user_ids):
+    """Invalidate the cached fragments of every user in ``user_ids``."""
+    _bump([_user_key(user_id) for user_id in set(user_ids)])
+
+
+def bump_all_fragment_versions():
+    _bump([GLOBAL_KEY])
@@ -0,0 +1,147 @@
+"""
+Score to letter-grade conversion driven by GradingScale rows.
+
+Every scale is compiled once into a sorted boundary table and looked up by
+bisection. Compiled scales are kept per process and reloaded when the
+shared ``grading-scales:version`` cache key moves, which happens whenever a
+scale or boundary is saved or deleted.
+"""
+import time
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+VERSION_KEY = 'grading-scales:version'
+
+# Used when no GradingScale applies
+DEFAULT_BOUNDARIES = [
+    (90, 'A+'),
+    (80, 'A'),
+    (70, 'B+'),
+    (60, 'B'),
+    (50, 'C+'),
+    (40, 'C'),
+    (30, 'D'),
+    (0, 'F'),
+]
+
+
+class CompiledScale:
+    """A grading scale as parallel, ascending arrays of minimum scores and letters."""
+
+    def __init__(self, boundaries):
+        boundaries = sorted(boundaries)
+        if not boundaries:
+            raise ValueError('A grading scale needs at least one boundary.')
+        self.minimums = [min_score for min_score, _ in boundaries]
+        self.letters = [letter for _, letter in boundaries]
+        if np is not None:
+            self._np_minimums = np.asarray(self.minimums)
+            self._np_letters = np.asarray(self.letters, dtype=object)
+
+    def letter(self, score):
+        """Letter for one score; scores below the lowest boundary get the lowest letter."""
+        return self.letters[max(bisect_right(self.minimums, score) - 1, 0)]
+
+    def letters_for(self, scores):
+        """Letters for a sequence of scores, in one vectorized pass when numpy is available."""
+        if np is not None:
+            index = np.searchsorted(self._np_minimums, np.asarray(scores), side='right') - 1
+            return self._np_letters[np.maximum(index, 0)].tolist()
+        minimums, letters = self.minimums, self.letters
+        return [letters[max(bisect_right(minimums, score) - 1, 0)] for score in scores]
+
+
+DEFAULT_SCALE = CompiledScale(DEFAULT_BOUNDARIES)
+
+
+class ScaleRegistry:
+    """
+    All scales, keyed by ``(teacher_id, course)``.
+
+    The most specific scale wins: teacher and course, then teacher only,
+    then course only, then the institution-wide scale, then DEFAULT_SCALE.
+    """
+
+    def __init__(self, scales=None):
+        self.scales = scales or {}
+        self.uses_courses = any(course for _, course in self.scales)
+
+    @classmethod
+    def load(cls):
+        from .models import GradingScale
+
+        scales = {}
+        for scale in GradingScale.objects.prefetch_related('boundaries'):
+            boundaries = [(b.min_score, b.letter) for b in scale.boundaries.all()]
+            if boundaries:
+                scales[(scale.teacher_id, scale.course)] = CompiledScale(boundaries)
+        return cls(scales)
+
+    def resolve(self, teacher_id=None, course=''):
+        course = course or ''
+        for key in ((teacher_id, course), (teacher_id, ''), (None, course), (None, '')):
+            if key in self.scales:
+                return self.scales[key]
+        return DEFAULT_SCALE
+
+
+_registry = None
+_registry_version = None
+
+
+def get_registry():
+    """Return the compiled scales, reloading them if any scale changed."""
+    global _registry, _registry_version
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+    if _registry is None or version != _registry_version:
+        _registry = ScaleRegistry.load()
+        _registry_version = version
+    return _registry
+
+
+def scales_changed():
+    """Invalidate compiled scales in every process sharing the cache."""
+    def bump():
+        global _registry
+        _registry = None
+        # Time-based rather than incr(), which is not atomic on every shared
+        # cache and restarts from 1 after an eviction
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    bump()
+    # Again after commit, in case a request loaded the old scales meanwhile
+    transaction.on_commit(bump)
+
+
+def letter_grade_for(score, teacher_id=None, course=''):
+    """Map a score out of 100 to its letter grade under the applicable scale."""
+    return get_registry().resolve(teacher_id, course).letter(score)
+
+
+def letter_grades_for(rows):
+    """
+    Letter grades for many ``(score, teacher_id, course)`` rows at once.
+
+    Rows are grouped by scale and each group is converted in one batch, so
+    imports and recomputations avoid a per-row lookup.
+    """
+    registry = get_registry()
+    groups = {}
+    for index, (score, teacher_id, course) in enumerate(rows):
+        scale = registry.resolve(teacher_id, course)
+        groups.setdefault(id(scale), (scale, [], []))
+        groups[id(scale)][1].append(index)
+        groups[id(scale)][2].append(score)
+
+    letters = [None] * len(rows)
+    for scale, indexes, scores in groups.values():
+        for index, letter in zip(indexes, scale.letters_for(scores)):
+            letters[index] = letter
+    return letters
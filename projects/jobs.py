@@ -0,0 +1,237 @@
+"""
+Background jobs stored in the database, run by ``manage.py run_jobs``.
+
+A job is a row naming a registered task and its keyword arguments. Workers
+claim the highest-priority job that is due with a conditional UPDATE (or
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database has it), so two
+workers never start the same job. A claimed job carries a lease, renewed
+while it runs; if the worker dies, the lease runs out and the job is queued
+again. A job that raises is retried with exponential backoff until it runs
+out of attempts and is left as failed, with its traceback, for inspection.
+Finished jobs are deleted.
+
+Because jobs live in the same database, a job enqueued inside a
+transaction only becomes visible to workers if that transaction commits.
+
+Tasks are plain functions registered with ``@task``; see projects.tasks.
+"""
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Delay before the first retry; doubled for every further attempt
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 60 * 60
+
+DEFAULT_LEASE = 5 * 60
+
+# Jobs looked at per claim attempt when claims race on databases without SKIP LOCKED
+CLAIM_CANDIDATES = 5
+
+# How often a worker looks for jobs whose lease ran out
+REQUEUE_INTERVAL = 30
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    function: object
+    priority: int = 0
+    max_attempts: int = 3
+    lease: int = DEFAULT_LEASE
+
+
+_tasks = {}
+
+
+def task(name, priority=0, max_attempts=3, lease=DEFAULT_LEASE):
+    """
+    Register the decorated function as the task ``name``.
+
+    ``lease`` is how many seconds a worker may go without renewing its claim
+    before the job is handed to another worker. Higher ``priority`` runs first.
+    """
+    def register(function):
+        _tasks[name] = Task(name, function, priority, max_attempts, lease)
+        return function
+    return register
+
+
+def get_task(name):
+    return _tasks[name]
+
+
+def enqueue(name, kwargs=None, priority=None, delay=0):
+    """Queue task ``name`` to run with ``kwargs`` after ``delay`` seconds."""
+    from .models import Job
+
+    spec = get_task(name)
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs or {},
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_once(key, name, kwargs=None, timeout=DEFAULT_LEASE):
+    """
+    Queue task ``name`` unless a job for ``key`` was queued in the last
+    ``timeout`` seconds, for work a page asks for on every reload until it
+    is done. Returns the job, or None if one was already queued.
+    """
+    if not cache.add(f'jobs:queued:{key}', True, timeout):
+        return None
+    return enqueue(name, kwargs)
+
+
+def retry_delay(attempt):
+    """Seconds to wait before retrying after failed attempt number ``attempt``."""
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+    # Jitter keeps jobs that failed together from retrying in lockstep
+    return delay * random.uniform(0.5, 1.0)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_expired():
+    """Put back jobs whose worker stopped renewing its lease."""
+    from .models import Job
+
+    return Job.objects.filter(status=Job.RUNNING, lease_expires_at__lt=timezone.now()).update(
+        status=Job.QUEUED, locked_by='', lease_expires_at=None, run_at=timezone.now()
+    )
+
+
+def claim(worker):
+    """Claim the next due job for ``worker`` and return it, or None if there is none."""
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'pk')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            return _take(job, worker, now)
+
+    for job in due[:CLAIM_CANDIDATES]:
+        # Only one worker's UPDATE can still find the job queued
+        claimed = _take(job, worker, now, only_if=Job.objects.filter(pk=job.pk, status=Job.QUEUED))
+        if claimed is not None:
+            return claimed
+    return None
+
+
+def _take(job, worker, now, only_if=None):
+    from .models import Job
+
+    lease = _lease(job.name)
+    rows = only_if if only_if is not None else Job.objects.filter(pk=job.pk)
+    if not rows.update(
+        status=Job.RUNNING, locked_by=worker, attempts=F('attempts') + 1,
+        lease_expires_at=now + timedelta(seconds=lease),
+    ):
+        return None
+    job.status, job.locked_by, job.attempts = Job.RUNNING, worker, job.attempts + 1
+    return job
+
+
+def _lease(name):
+    return _tasks[name].lease if name in _tasks else DEFAULT_LEASE
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a running job's lease until stopped."""
+
+    def __init__(self, job, worker):
+        super().__init__(daemon=True)
+        self.job, self.worker = job, worker
+        self.lease = _lease(job.name)
+        self.stopped = threading.Event()
+
+    def run(self):
+        from .models import Job
+
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                Job.objects.filter(pk=self.job.pk, locked_by=self.worker).update(
+                    lease_expires_at=timezone.now() + timedelta(seconds=self.lease)
+                )
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job, worker):
+    """Run a claimed job, then delete it, schedule a retry or mark it failed."""
+    from .models import Job
+
+    mine = Job.objects.filter(pk=job.pk, locked_by=worker)
+    if job.attempts > job.max_attempts:
+        # Its last attempt was lost with a worker
+        mine.update(status=Job.FAILED, lease_expires_at=None, last_error='Lease expired on the final attempt.')
+        return False
+
+    heartbeat = _Heartbeat(job, worker)
+    heartbeat.start()
+    try:
+        get_task(job.name).function(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            mine.update(
+                status=Job.QUEUED, locked_by='', lease_expires_at=None, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+            )
+        else:
+            mine.update(status=Job.FAILED, lease_expires_at=None, last_error=error)
+        return False
+    finally:
+        heartbeat.stop()
+    mine.delete()
+    return True
+
+
+def work(stop=None, burst=False, poll_interval=1.0, worker=None):
+    """
+    Claim and run jobs until ``stop`` (a threading or multiprocessing Event)
+    is set or, with ``burst``, until no job is due. Returns the number run.
+    """
+    worker = worker or worker_name()
+    count = 0
+    last_requeue = None
+    while stop is None or not stop.is_set():
+        if last_requeue is None or time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+            requeue_expired()
+            last_requeue = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run(job, worker)
+        count += 1
+    return count
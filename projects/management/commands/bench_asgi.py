@@ -0,0 +1,186 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from projects.benchmarks import async_views, scratch_database, seed_users, seed_projects
+from projects.models import UserStats
+
+PATHS = {
+    'dashboard': 'dashboard',
+    'my-projects': 'my_projects',
+}
+
+
+def login_cookies(users):
+    """A session cookie header for each user, made the way login() makes them."""
+    engine = import_module(settings.SESSION_ENGINE)
+    cookies = []
+    for user in users:
+        session = engine.SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+    return cookies
+
+
+def wsgi_request(application, path, cookie):
+    """One GET through the WSGI handler; returns the status code."""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie, 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'SERVER_PROTOCOL': 'HTTP/1.1',
+    }
+    status = []
+    response = application(environ, lambda code, headers: status.append(code))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_request(application, path, cookie):
+    """One GET through the ASGI handler; returns the status code."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    status = []
+    requested, finished = False, asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The handler listens for the client going away until it has answered
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare dashboard and listing throughput under the WSGI handler and under '
+        'the ASGI handler with the sync and the async views, with many concurrent '
+        'clients, on a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500,
+                            help='Concurrent clients, each with its own session (default: 500)')
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Requests per handler (default: 5000)')
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Worker threads of the simulated WSGI server (default: 16)')
+        parser.add_argument('--paths', nargs='+', choices=sorted(PATHS), default=sorted(PATHS),
+                            help='Pages the clients request, in turn (default: all)')
+        parser.add_argument('--query-latency', type=float, default=0,
+                            help='Milliseconds added to every query, to stand in for a networked database')
+
+    def handle(self, *args, **options):
+        clients = options['clients']
+        with scratch_database(), override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            students, teachers = seed_users(students=clients, teachers=10)
+            seed_projects(clients * 10, students, teachers)
+            # Stats rows are otherwise created by the first request, and
+            # SQLite would serialise those writes
+            UserStats.objects.refresh(students=[user.pk for user in students], create=True)
+            cookies = login_cookies(students)
+            paths = [reverse(PATHS[name]) for name in options['paths']]
+
+            if options['query_latency']:
+                self.add_query_latency(options['query_latency'] / 1000)
+
+            self.stdout.write(
+                f"{'handler':>8} {'views':>6} {'clients':>8} {'requests':>9} {'req/s':>8} "
+                f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+            )
+            runs = (('wsgi', 'sync', self.run_wsgi), ('asgi', 'sync', self.run_asgi), ('asgi', 'async', self.run_asgi))
+            for handler, views, run in runs:
+                with async_views(views == 'async'):
+                    seconds, latencies, errors = asyncio.run(run(paths, cookies, options))
+                self.report(handler, views, clients, latencies, seconds, errors)
+                connections.close_all()
+
+    def add_query_latency(self, delay):
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        connection_created.connect(install, weak=False)
+        for connection in connections.all():
+            connection.execute_wrappers.append(slow)
+
+    async def drive(self, send, paths, cookies, total):
+        """Run ``total`` requests from ``len(cookies)`` clients, each waiting for its last answer."""
+        latencies, errors = [], 0
+        remaining = total
+
+        async def client(index):
+            nonlocal remaining, errors
+            cookie = cookies[index]
+            while remaining > 0:
+                remaining -= 1
+                path = paths[remaining % len(paths)]
+                start = time.perf_counter()
+                status = await send(path, cookie)
+                latencies.append(time.perf_counter() - start)
+                errors += status != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(len(cookies))))
+        return time.perf_counter() - start, latencies, errors
+
+    async def run_wsgi(self, paths, cookies, options):
+        # A threaded WSGI server: requests queue for a fixed set of worker threads
+        application = get_wsgi_application()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            async def send(path, cookie):
+                return await loop.run_in_executor(pool, wsgi_request, application, path, cookie)
+            return await self.drive(send, paths, cookies, options['requests'])
+
+    async def run_asgi(self, paths, cookies, options):
+        application = get_asgi_application()
+
+        async def send(path, cookie):
+            return await asgi_request(application, path, cookie)
+        return await self.drive(send, paths, cookies, options['requests'])
+
+    def report(self, handler, views, clients, latencies, seconds, errors):
+        latencies = sorted(latencies)
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f"{handler:>8} {views:>6} {clients:>8} {len(latencies):>9} {len(latencies) / seconds:>8.0f} "
+            f"{cuts[49] * 1000:>8.1f} {cuts[94] * 1000:>8.1f} {cuts[98] * 1000:>8.1f} {errors:>7}"
+        )
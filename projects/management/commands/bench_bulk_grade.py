@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from projects.benchmarks import scratch_database, measure, seed_users, seed_projects
+from projects.models import Project, Grade
+
+
+def legacy_bulk_grade(projects, teacher, score, feedback):
+    """The per-project loop bulk_grade used before Grade.objects.bulk_grade."""
+    for project in projects:
+        grade, created = Grade.objects.get_or_create(
+            project=project,
+            defaults={'teacher': teacher, 'score': score, 'feedback': feedback}
+        )
+        if not created:
+            grade.score = score
+            grade.feedback = feedback
+            grade.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Grade.objects.bulk_grade against the per-project loop on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                            help='Numbers of projects to grade (default: 1000 10000)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'projects':>9} {'pass':>7} {'engine':>7} {'seconds':>9} {'queries':>8}")
+        with scratch_database():
+            students, teachers = seed_users(students=50, teachers=1)
+            teacher = teachers[0]
+            for size in options['sizes']:
+                Project.objects.all().delete()
+                seed_projects(size, students, teachers)
+                projects = Project.objects.filter(teacher=teacher)
+
+                # Create pass: no grades exist yet
+                with measure() as loop_create:
+                    legacy_bulk_grade(list(projects), teacher, 72, 'Benchmark')
+                Grade.objects.all().delete()
+                with measure() as bulk_create:
+                    Grade.objects.bulk_grade(projects, teacher, 72, 'Benchmark')
+
+                # Update pass: every project already has a grade
+                with measure() as loop_update:
+                    legacy_bulk_grade(list(projects), teacher, 88, 'Benchmark')
+                with measure() as bulk_update:
+                    Grade.objects.bulk_grade(projects, teacher, 88, 'Benchmark')
+
+                for label, engine, result in (
+                    ('create', 'loop', loop_create), ('create', 'bulk', bulk_create),
+                    ('update', 'loop', loop_update), ('update', 'bulk', bulk_update),
+                ):
+                    self.stdout.write(
+                        f"{size:>9} {label:>7} {engine:>7} {result['seconds']:>9.3f} {result['queries']:>8}"
+                    )
@@ -0,0 +1,100 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+from projects.benchmarks import scratch_database, measure, seed_users, seed_projects
+from projects.models import Project
+from projects.similarity import (
+    SIMILARITY_THRESHOLD, estimate_similarity, signature_for_text, similar_projects, store_signatures,
+)
+
+WORDS_PER_DOCUMENT = 400
+VOCABULARY_SIZE = 20000
+# One document in this many is a lightly edited copy of an earlier one
+COPY_EVERY = 50
+# Share of words changed in a copy
+EDIT_RATE = 0.05
+
+
+def synthetic_documents(count, seed=0):
+    """``count`` random documents and the ``(original, copy)`` index pairs planted among them."""
+    rng = random.Random(seed)
+    vocabulary = [f'w{rng.getrandbits(40):x}' for _ in range(VOCABULARY_SIZE)]
+    documents, pairs = [], []
+    for i in range(count):
+        if i and i % COPY_EVERY == 0:
+            original = rng.randrange(i)
+            words = documents[original].split()
+            for position in rng.sample(range(len(words)), int(len(words) * EDIT_RATE)):
+                words[position] = rng.choice(vocabulary)
+            pairs.append((original, i))
+        else:
+            words = rng.choices(vocabulary, k=WORDS_PER_DOCUMENT)
+        documents.append(' '.join(words))
+    return documents, pairs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark MinHash/LSH near-duplicate lookup against pairwise comparison on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 30000],
+                            help='Numbers of submissions to index (default: 1000 10000 30000)')
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Lookups timed per size (default: 100)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes computing signatures (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'projects':>9} {'sign s':>8} {'store s':>8} {'lsh ms':>8} {'queries':>8} "
+            f"{'pairwise ms':>12} {'recall':>7}"
+        )
+        workers = options['workers'] or os.cpu_count() or 1
+        with scratch_database(), ProcessPoolExecutor(max_workers=workers) as pool:
+            students, teachers = seed_users(students=200, teachers=1)
+            for size in options['sizes']:
+                Project.objects.all().delete()
+                documents, pairs = synthetic_documents(size)
+
+                start = time.perf_counter()
+                signatures = list(pool.map(signature_for_text, documents, chunksize=64))
+                sign_seconds = time.perf_counter() - start
+
+                projects = seed_projects(size, students, teachers)
+                Project.objects.update(file_upload=Concat(Value('bench/'), Cast('pk', CharField()), Value('.txt')))
+                with measure() as store:
+                    store_signatures([
+                        (project.pk, f'bench/{project.pk}.txt', signature, shingles)
+                        for project, (signature, shingles) in zip(projects, signatures)
+                    ])
+
+                # Look up the planted copies: each should find its original
+                sample = pairs[:options['queries']]
+                found = 0
+                with measure() as lookups:
+                    for original, copy in sample:
+                        project = Project.objects.get(pk=projects[copy].pk)
+                        matches = {other.pk for other, _ in similar_projects(project, limit=None)}
+                        found += projects[original].pk in matches
+
+                # The same question answered by comparing against every signature
+                pairwise_sample = sample[:10]
+                start = time.perf_counter()
+                for _, copy in pairwise_sample:
+                    [
+                        i for i, (signature, _) in enumerate(signatures)
+                        if i != copy and estimate_similarity(signatures[copy][0], signature) >= SIMILARITY_THRESHOLD
+                    ]
+                pairwise_seconds = time.perf_counter() - start
+
+                self.stdout.write(
+                    f"{size:>9} {sign_seconds:>8.2f} {store['seconds']:>8.2f} "
+                    f"{lookups['seconds'] * 1000 / len(sample):>8.2f} {lookups['queries'] / len(sample):>8.1f} "
+                    f"{pairwise_seconds * 1000 / len(pairwise_sample):>12.1f} {found / len(sample):>7.0%}"
+                )
@@ -0,0 +1,142 @@
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.utils import timezone
+
+from projects.benchmarks import scratch_database, seed_users, seed_projects
+from projects.models import Grade, Project, UserStats
+
+
+def submit(student, teacher, number):
+    """What submit_project does with a valid form."""
+    Project(
+        title=f'Deadline submission {number}', description='Submitted during the benchmark.',
+        student=student, teacher=teacher, due_date=timezone.now(), is_submitted=True,
+    ).save()
+
+
+def grade(teacher, rng):
+    """What grade_project does, or bulk_grade for a few projects at once, as teachers mix both."""
+    pending = Project.objects.filter(teacher=teacher, grade__isnull=True, is_submitted=True)
+    if rng.random() < 0.25:
+        Grade.objects.bulk_grade(pending.order_by('pk')[:5], teacher, rng.randint(40, 100), 'Bulk graded')
+        return
+    project = pending.order_by('?').first()
+    if project is None:
+        return
+    grade, created = Grade.objects.get_or_create(
+        project=project, defaults={'teacher': teacher, 'score': rng.randint(40, 100), 'feedback': 'Graded'}
+    )
+    if not created:
+        grade.score = rng.randint(40, 100)
+        grade.save()
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate students submitting and teachers grading at the same time against a '
+        'scratch SQLite file, under each SQLITE_PROFILES entry, and report lock errors '
+        'and latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submitters', type=int, default=40,
+                            help='Concurrent submitting students (default: 40)')
+        parser.add_argument('--graders', type=int, default=10,
+                            help='Concurrent grading teachers (default: 10)')
+        parser.add_argument('--operations', type=int, default=50,
+                            help='Submissions or grades per client (default: 50)')
+        parser.add_argument('--profiles', nargs='+', choices=sorted(settings.SQLITE_PROFILES),
+                            default=sorted(settings.SQLITE_PROFILES),
+                            help='Profiles to compare (default: all)')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('This benchmark needs the default database to be SQLite.')
+
+        self.stdout.write(
+            f"{'profile':>11} {'role':>10} {'clients':>8} {'ops':>6} {'ops/s':>7} {'p50 ms':>8} "
+            f"{'p99 ms':>8} {'locked':>7} {'errors':>7}"
+        )
+        for profile in options['profiles']:
+            seconds, results = self.run(settings.SQLITE_PROFILES[profile], options)
+            for role, (clients, latencies, outcomes) in results.items():
+                self.report(profile, role, clients, latencies, seconds, outcomes)
+
+    def run(self, profile, options):
+        settings_dict = connections['default'].settings_dict
+        saved = {key: settings_dict.get(key) for key in profile}
+        # Connections made from here on, in every thread, use the profile
+        connections.close_all()
+        settings_dict.update(profile)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                with scratch_database(name=str(Path(directory) / 'bench.sqlite3')):
+                    return self.simulate(options)
+        finally:
+            settings_dict.update(saved)
+
+    def simulate(self, options):
+        students, teachers = seed_users(students=options['submitters'], teachers=options['graders'])
+        seed_projects(options['graders'] * options['operations'], students, teachers)
+        UserStats.objects.refresh(students=[u.pk for u in students], teachers=[u.pk for u in teachers], create=True)
+        connections.close_all()
+
+        results = {
+            role: (clients, [], {'locked': 0, 'errors': 0})
+            for role, clients in (('submitters', len(students)), ('graders', len(teachers)))
+        }
+        lock = threading.Lock()
+        start_line = threading.Barrier(len(students) + len(teachers))
+
+        def client(role, operation):
+            _, latencies, outcomes = results[role]
+            start_line.wait()
+            try:
+                for number in range(options['operations']):
+                    # Each operation stands for one request: Django closes
+                    # connections older than CONN_MAX_AGE at both ends
+                    close_old_connections()
+                    start = time.perf_counter()
+                    try:
+                        operation(number)
+                        outcome = None
+                    except OperationalError as e:
+                        outcome = 'locked' if 'locked' in str(e) else 'errors'
+                    elapsed = time.perf_counter() - start
+                    close_old_connections()
+                    with lock:
+                        latencies.append(elapsed)
+                        if outcome:
+                            outcomes[outcome] += 1
+            finally:
+                connections.close_all()
+
+        clients = [
+            threading.Thread(target=client, args=('submitters', lambda n, s=student: submit(s, random.choice(teachers), n),))
+            for student in students
+        ] + [
+            threading.Thread(target=client, args=('graders', lambda n, t=teacher, rng=random.Random(teacher.pk): grade(t, rng),))
+            for teacher in teachers
+        ]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return time.perf_counter() - started, results
+
+    def report(self, profile, role, clients, latencies, seconds, outcomes):
+        latencies = sorted(latencies)
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f"{profile:>11} {role:>10} {clients:>8} {len(latencies):>6} {len(latencies) / seconds:>7.0f} "
+            f"{cuts[49] * 1000:>8.1f} {cuts[98] * 1000:>8.1f} {outcomes['locked']:>7} {outcomes['errors']:>7}"
+        )
@@ -0,0 +1,111 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from projects.benchmarks import scratch_database, seed_users, seed_projects
+from projects.models import Project, Grade
+from projects.search import get_search_backend
+
+# "SCAN <table>" without an index is a full table scan; virtual tables (FTS)
+# and index scans ("SCAN t USING INDEX ...") are fine.
+FULL_SCAN_RE = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?$')
+TEMP_SORT_RE = re.compile(r'^USE TEMP B-TREE FOR (RIGHT PART OF |LAST TERM OF )?ORDER BY')
+
+
+def view_urls(student, teacher, project):
+    """The pages whose queries are checked, and who requests them."""
+    return [
+        (student, reverse('dashboard')),
+        (student, reverse('my_projects')),
+        (student, reverse('project_detail', args=[project.pk])),
+        (teacher, reverse('dashboard')),
+        (teacher, reverse('teacher_projects')),
+        (teacher, reverse('teacher_projects') + '?status=pending'),
+        (teacher, reverse('teacher_projects') + '?status=graded'),
+        (teacher, reverse('teacher_projects') + '?status=overdue'),
+        (teacher, reverse('teacher_projects') + '?search=benchmark'),
+        (teacher, reverse('teacher_project_detail', args=[project.pk])),
+        (teacher, reverse('bulk_grade')),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Request each listing and detail view on a scratch SQLite database, run '
+        'EXPLAIN QUERY PLAN on every SELECT it issues and fail on full table scans.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=2000,
+                            help='Projects to seed so the planner sees realistic tables (default: 2000)')
+        parser.add_argument('--strict', action='store_true',
+                            help='Also fail when a query sorts with a temporary B-tree')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN output is only understood for SQLite.')
+
+        setup_test_environment()
+        try:
+            with scratch_database():
+                problems = self.check_views(options['projects'], options['verbosity'])
+        finally:
+            teardown_test_environment()
+
+        full_scans = [p for p in problems if p[0] == 'scan']
+        sorts = [p for p in problems if p[0] == 'sort']
+        for kind, url, sql, detail in problems:
+            style = self.style.ERROR if kind == 'scan' else self.style.WARNING
+            self.stdout.write(style(f'{url}: {detail}'))
+            self.stdout.write(f'    {sql}')
+
+        if full_scans or (options['strict'] and sorts):
+            raise CommandError(f'{len(full_scans)} full table scan(s), {len(sorts)} temporary sort(s).')
+        self.stdout.write(self.style.SUCCESS(f'No full table scans ({len(sorts)} temporary sort(s)).'))
+
+    def check_views(self, project_count, verbosity):
+        students, teachers = seed_users(students=50, teachers=5)
+        projects = seed_projects(project_count, students, teachers)
+        for project in projects[::3]:
+            Grade.objects.create(project=project, teacher=project.teacher, score=70)
+        # bulk_create skips the signal handlers that maintain the search index
+        get_search_backend().rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        project = Project.objects.filter(student=students[0], teacher=teachers[0]).first()
+        client = Client()
+        problems = []
+        for user, url in view_urls(students[0], teachers[0], project):
+            client.force_login(user)
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            for query in ctx.captured_queries:
+                problems.extend(self.explain(url, query['sql'], verbosity))
+        return problems
+
+    def explain(self, url, sql, verbosity):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        with connection.cursor() as cursor:
+            # captured_queries holds SQL with parameters already interpolated
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        if verbosity > 1:
+            self.stdout.write(f'{url}: {sql}')
+            for detail in details:
+                self.stdout.write(f'    {detail}')
+
+        problems = []
+        for detail in details:
+            if FULL_SCAN_RE.match(detail):
+                problems.append(('scan', url, sql, detail))
+            elif TEMP_SORT_RE.match(detail):
+                problems.append(('sort', url, sql, detail))
+        return problems
@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from projects.models import Project, StoredBlob
+from projects.storage import PREFIX, submission_storage
+
+READ_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Move submission files saved under plain names into the content-addressed '
+        'store, keeping one copy of each distinct file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be moved and reclaimed without changing anything')
+
+    def handle(self, *args, **options):
+        storage = submission_storage()
+        dry_run = options['dry_run']
+        legacy = (
+            Project.objects.exclude(file_upload='').exclude(file_upload__isnull=True)
+            .exclude(file_upload__startswith=f'{PREFIX}/')
+            .values_list('pk', 'file_upload')
+        )
+
+        moved = duplicates = reclaimed = missing = 0
+        seen = set()
+        # Several projects may share one legacy file; it is moved once
+        paths = {}
+        for pk, name in legacy.iterator():
+            paths.setdefault(name, []).append(pk)
+
+        for name, project_ids in paths.items():
+            path = storage.path(name)
+            if not os.path.exists(path):
+                self.stdout.write(self.style.WARNING(f'Missing file for project(s) {project_ids}: {name}'))
+                missing += 1
+                continue
+            sha256 = file_hash(path)
+            size = os.path.getsize(path)
+            # A blob file without its row is left from an interrupted run
+            duplicate = sha256 in seen or StoredBlob.objects.filter(pk=sha256).exists()
+            seen.add(sha256)
+            if duplicate:
+                duplicates += 1
+                reclaimed += size
+            else:
+                moved += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{'duplicate' if duplicate else 'moved'}: {name} -> {sha256}")
+            if dry_run:
+                continue
+
+            # The blob is written before the rows point at it, and the legacy
+            # file only removed once they do: if the transaction rolls back,
+            # the rows still find their file where they left it
+            blob = storage.blob_path(sha256)
+            if not os.path.exists(blob):
+                with open(path, 'rb') as f:
+                    storage._write_blob(blob, File(f))
+            new_name = f'{PREFIX}/{sha256}/{os.path.basename(name)}'
+            with transaction.atomic():
+                StoredBlob.objects.bulk_create([StoredBlob(sha256=sha256, size=size)], ignore_conflicts=True)
+                StoredBlob.objects.filter(pk=sha256).update(references=F('references') + len(project_ids))
+                Project.objects.filter(pk__in=project_ids).update(file_upload=new_name)
+                transaction.on_commit(lambda path=path: os.unlink(path))
+
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} file(s) into the content-addressed store and merged {duplicates} '
+            f'duplicate(s), reclaiming {reclaimed / (1024 * 1024):.1f}MB ({missing} missing).'
+        ))
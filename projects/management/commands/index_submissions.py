@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from projects.models import Project
+from projects.similarity import index_projects, stale_projects
+
+
+class Command(BaseCommand):
+    help = 'Fingerprint submission files for near-duplicate detection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-index every file, not only new and replaced ones')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes reading and hashing files (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['all']:
+            projects = projects.exclude(file_upload='').exclude(file_upload__isnull=True)
+        else:
+            projects = stale_projects(projects)
+        count = index_projects(projects.order_by('pk'), workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} submission file(s).'))
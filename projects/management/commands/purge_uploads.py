@@ -0,0 +1,36 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that have not been touched for a while, and their part files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48,
+                            help='Age after which an unfinished or unsubmitted upload is deleted (default: 48)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            upload.delete()  # also removes the part file
+            count += 1
+
+        # Part files whose row is already gone
+        orphans = 0
+        known = {f'{pk}.part' for pk in ChunkedUpload.objects.values_list('pk', flat=True)}
+        temp_dir = Path(settings.PROJECT_UPLOAD_TEMP_DIR)
+        if temp_dir.exists():
+            for path in temp_dir.glob('*.part'):
+                if path.name not in known and path.stat().st_mtime < cutoff.timestamp():
+                    path.unlink()
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} stale upload(s) and {orphans} orphaned part file(s).'))
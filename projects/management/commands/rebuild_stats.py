@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from projects.analytics import analytics_changed
+from projects.fragments import bump_all_fragment_versions
+from projects.models import UserStats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recompute every UserStats row from the Project and Grade tables.'
+
+    def handle(self, *args, **options):
+        students = list(User.objects.filter(user_type='student').values_list('pk', flat=True))
+        teachers = list(User.objects.filter(user_type='teacher').values_list('pk', flat=True))
+
+        with transaction.atomic():
+            UserStats.objects.all().delete()
+            UserStats.objects.refresh(students=students, teachers=teachers, create=True)
+        bump_all_fragment_versions()
+        analytics_changed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {len(students)} student(s) and {len(teachers)} teacher(s).'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from projects.models import Grade, GradingScale
+
+
+class Command(BaseCommand):
+    help = 'Re-derive every letter grade from the current grading scales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int,
+                            help='Only recompute grades the GradingScale with this id can apply to')
+
+    def handle(self, *args, **options):
+        grades = None
+        if options['scale']:
+            grades = GradingScale.objects.get(pk=options['scale']).affected_grades()
+        updated = Grade.objects.recompute_letter_grades(grades)
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} letter grade(s).'))
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from projects.jobs import work, worker_name
+
+# Cache backends whose entries other processes cannot see
+PROCESS_LOCAL_CACHES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+def _stop_on_signals(stop):
+    # Finish the job in hand, then exit
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+
+
+def _worker_process(settings_module, stop, burst, poll_interval):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    _stop_on_signals(stop)
+    work(stop=stop, burst=burst, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue in one or more worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes to run (default: 1, in this process)')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due instead of waiting for more')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between checks of an empty queue (default: 1)')
+
+    def handle(self, *args, **options):
+        if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+            # Jobs invalidate cached pages, ETags and grading scales through
+            # the cache; with a local one the web processes never see it
+            raise CommandError(
+                'The default cache is local to each process, so the web processes would not see the '
+                'invalidations made by jobs. Configure a shared cache (file-based, Redis or Memcached).'
+            )
+        burst, poll_interval = options['burst'], options['poll_interval']
+        if options['processes'] <= 1:
+            stop = threading.Event()
+            _stop_on_signals(stop)
+            count = work(stop=stop, burst=burst, poll_interval=poll_interval)
+            self.stdout.write(self.style.SUCCESS(f'{worker_name()} ran {count} job(s).'))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        stop = multiprocessing.Event()
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'grading_system.settings')
+
+        def start():
+            process = multiprocessing.Process(
+                target=_worker_process, args=(settings_module, stop, burst, poll_interval), daemon=True
+            )
+            process.start()
+            return process
+
+        processes = [start() for _ in range(options['processes'])]
+        _stop_on_signals(stop)
+        self.stdout.write(f"Started {len(processes)} worker process(es): {', '.join(str(p.pid) for p in processes)}")
+        while processes:
+            stop.wait(1)
+            for process in list(processes):
+                if process.is_alive():
+                    continue
+                processes.remove(process)
+                if process.exitcode != 0 and not stop.is_set():
+                    self.stderr.write(f'Worker {process.pid} exited with {process.exitcode}; restarting it.')
+                    processes.append(start())
+            if stop.is_set():
+                for process in processes:
+                    process.join()
+                break
+        self.stdout.write(self.style.SUCCESS('All workers stopped.'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='project_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_projects', models.PositiveIntegerField(default=0)),
+                ('graded_projects', models.PositiveIntegerField(default=0)),
+                ('pending_projects', models.PositiveIntegerField(default=0)),
+                ('pending_reviews', models.PositiveIntegerField(default=0)),
+                ('total_students', models.PositiveIntegerField(default=0)),
+                ('score_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS projects_project_fts USING fts5("
+        "title, description, student, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO projects_project_fts (rowid, title, description, student) "
+        "SELECT p.id, p.title, p.description, "
+        "u.first_name || ' ' || u.last_name || ' ' || u.username "
+        "FROM projects_project p INNER JOIN accounts_user u ON u.id = p.student_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS projects_project_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('projects', '0002_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
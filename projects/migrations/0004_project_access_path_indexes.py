@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_project_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['student', '-submitted_at'], name='project_student_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['teacher', '-submitted_at'], name='project_teacher_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_submitted', True)), fields=['teacher', '-submitted_at'], name='project_teacher_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_submitted', True)), fields=['teacher', 'due_date'], name='project_teacher_due_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_project_access_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_student_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_teacher_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_teacher_submitted_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['student', '-submitted_at', '-id'], name='project_student_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['teacher', '-submitted_at', '-id'], name='project_teacher_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('is_submitted', True)), fields=['teacher', '-submitted_at', '-id'], name='project_teacher_sub_list_idx'),
+        ),
+    ]
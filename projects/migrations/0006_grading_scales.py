@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:45
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_keyset_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='grade',
+            name='letter_grade',
+            field=models.CharField(blank=True, max_length=4),
+        ),
+        migrations.CreateModel(
+            name='GradingScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('course', models.CharField(blank=True, help_text='Blank applies to every course', max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.ForeignKey(blank=True, limit_choices_to={'user_type': 'teacher'}, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grading_scales', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GradeBoundary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('letter', models.CharField(max_length=4)),
+                ('min_score', models.PositiveSmallIntegerField(help_text='Lowest score that earns this letter', validators=[django.core.validators.MaxValueValidator(100)])),
+                ('scale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boundaries', to='projects.gradingscale')),
+            ],
+            options={
+                'ordering': ['-min_score'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscale',
+            constraint=models.UniqueConstraint(fields=('teacher', 'course'), name='unique_scale_per_teacher_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscale',
+            constraint=models.UniqueConstraint(condition=models.Q(('teacher__isnull', True)), fields=('course',), name='unique_scale_per_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='gradeboundary',
+            constraint=models.UniqueConstraint(fields=('scale', 'min_score'), name='unique_boundary_per_scale'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:58
+
+import projects.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='file_upload',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=projects.storage.submission_storage, upload_to='projects/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionFingerprint',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='projects.project')),
+                ('file_name', models.CharField(max_length=255)),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('signature', models.BinaryField(blank=True)),
+                ('shingles', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'project'], name='similarity_bucket_key_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='content_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(25)]),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='creativity_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(25)]),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='presentation_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(25)]),
+        ),
+        migrations.AddField(
+            model_name='grade',
+            name='technical_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MaxValueValidator(25)]),
+        ),
+    ]
@@ -1,6 +1,16 @@
-from django.db import models
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from accounts.models import StudentProfile
+from .analytics import analytics_changed
+from .fragments import bump_fragment_versions, bump_all_fragment_versions
+from .storage import submission_storage
+from .grading import CompiledScale, get_registry, letter_grade_for, letter_grades_for
 
 User = get_user_model()
 
@@ -9,25 +19,307 @@ class Project(models.Model):
     description = models.TextField()
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assigned_projects')
-    file_upload = models.FileField(upload_to='projects/', null=True, blank=True)
+    file_upload = models.FileField(
+        upload_to='projects/', storage=submission_storage, max_length=255, null=True, blank=True
+    )
     submitted_at = models.DateTimeField(auto_now_add=True)
     due_date = models.DateTimeField()
     is_submitted = models.BooleanField(default=False)
+    # Last change, for the Last-Modified and ETag headers (see projects.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Student and teacher project lists, newest first; id breaks
+            # ties for keyset pagination
+            models.Index(fields=['student', '-submitted_at', '-id'], name='project_student_list_idx'),
+            models.Index(fields=['teacher', '-submitted_at', '-id'], name='project_teacher_list_idx'),
+            # Teacher dashboard "recent submissions" and the pending filter
+            models.Index(
+                fields=['teacher', '-submitted_at', '-id'],
+                condition=models.Q(is_submitted=True),
+                name='project_teacher_sub_list_idx',
+            ),
+            # Overdue work per teacher: submitted and past its due date
+            models.Index(
+                fields=['teacher', 'due_date'],
+                condition=models.Q(is_submitted=True),
+                name='project_teacher_due_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.student.username}"
 
+class ChunkedUpload(models.Model):
+    """
+    A submission file being uploaded in chunks; see projects.uploads.
+
+    Bytes are appended to ``part_path`` as they arrive and the row tracks how
+    many have been received, so an interrupted upload resumes where it
+    stopped. Completed uploads are attached to a Project and deleted.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+    
+    @property
+    def part_path(self):
+        return Path(settings.PROJECT_UPLOAD_TEMP_DIR) / f'{self.pk}.part'
+    
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+    
+    def delete(self, *args, **kwargs):
+        self.part_path.unlink(missing_ok=True)
+        return super().delete(*args, **kwargs)
+
+class StoredBlob(models.Model):
+    """
+    One distinct submission file in ContentAddressedStorage, with the number
+    of FileField values that point at it.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.references} reference{'s' if self.references != 1 else ''})"
+
+class SubmissionFingerprint(models.Model):
+    """
+    MinHash signature of a project's file, for near-duplicate detection; see
+    projects.similarity. ``file_name`` is the file that was indexed, so a
+    replaced file is noticed and indexed again.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    file_name = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    signature = models.BinaryField(blank=True)
+    shingles = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Fingerprint of {self.project_id} ({self.shingles} shingles)"
+
+class SimilarityBucket(models.Model):
+    """One LSH band of a SubmissionFingerprint; projects sharing a key are candidate matches."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='similarity_buckets')
+    key = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            # Candidate lookup by key, answered from the index alone
+            models.Index(fields=['key', 'project'], name='similarity_bucket_key_idx'),
+        ]
+
+class Job(models.Model):
+    """A background task waiting to run, running, or failed; see projects.jobs."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # The claim query: due jobs, highest priority and oldest first
+            models.Index(
+                fields=['-priority', 'run_at', 'id'],
+                condition=models.Q(status='queued'),
+                name='job_queue_idx',
+            ),
+            models.Index(
+                fields=['lease_expires_at'],
+                condition=models.Q(status='running'),
+                name='job_lease_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+class GradingScale(models.Model):
+    """
+    A mapping from score to letter grade, stored as GradeBoundary rows.
+
+    A scale applies to the projects of ``teacher`` whose students are on
+    ``course``; leave either blank to match any. The scale with neither set
+    is the institution-wide default. See projects.grading for resolution.
+    """
+    name = models.CharField(max_length=100)
+    teacher = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='grading_scales', limit_choices_to={'user_type': 'teacher'}
+    )
+    course = models.CharField(max_length=100, blank=True, help_text="Blank applies to every course")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['teacher', 'course'], name='unique_scale_per_teacher_course'),
+            models.UniqueConstraint(
+                fields=['course'], condition=models.Q(teacher__isnull=True), name='unique_scale_per_course'
+            ),
+        ]
+    
+    def __str__(self):
+        return self.name
+    
+    def compile(self):
+        return CompiledScale([(b.min_score, b.letter) for b in self.boundaries.all()])
+    
+    def affected_grades(self):
+        """Grades this scale could apply to, for recomputation after a change."""
+        grades = Grade.objects.all()
+        if self.teacher_id:
+            grades = grades.filter(project__teacher_id=self.teacher_id)
+        if self.course:
+            grades = grades.filter(project__student__student_profile__course=self.course)
+        return grades
+
+class GradeBoundary(models.Model):
+    scale = models.ForeignKey(GradingScale, on_delete=models.CASCADE, related_name='boundaries')
+    letter = models.CharField(max_length=4)
+    min_score = models.PositiveSmallIntegerField(
+        validators=[MaxValueValidator(100)],
+        help_text="Lowest score that earns this letter"
+    )
+    
+    class Meta:
+        ordering = ['-min_score']
+        constraints = [
+            models.UniqueConstraint(fields=['scale', 'min_score'], name='unique_boundary_per_scale'),
+        ]
+    
+    def __str__(self):
+        return f"{self.letter} (from {self.min_score})"
+
+class GradeManager(models.Manager):
+    # Rows per UPDATE when writing per-letter groups, for SQLite's parameter limit
+    CHUNK_SIZE = 500
+    
+    def _update_letters(self, by_letter, **values):
+        """Write grades grouped by letter: one UPDATE per letter and chunk."""
+        updated = 0
+        for letter, project_ids in by_letter.items():
+            for start in range(0, len(project_ids), self.CHUNK_SIZE):
+                chunk = project_ids[start:start + self.CHUNK_SIZE]
+                updated += self.filter(project_id__in=chunk).update(letter_grade=letter, **values)
+        return updated
+    
+    def bulk_grade(self, projects, teacher, score, feedback=''):
+        """
+        Give every project in ``projects`` the same score and feedback.
+
+        Existing grades are updated with one UPDATE per distinct letter grade
+        (usually one) and the rest are inserted with bulk_create, all in one
+        transaction, instead of a get_or_create and save per project.
+        Returns ``(created, updated)``.
+        """
+        if not isinstance(projects, models.QuerySet):
+            projects = Project.objects.filter(pk__in=[project.pk for project in projects])
+        
+        # update() skips auto_now, so the change time is set here. The new
+        # score replaces any rubric breakdown, which would no longer add up to it
+        values = {
+            'teacher': teacher, 'score': score, 'feedback': feedback, 'updated_at': timezone.now(),
+            'content_score': None, 'presentation_score': None, 'creativity_score': None, 'technical_score': None,
+        }
+        course = 'student__student_profile__course' if get_registry().uses_courses else models.Value('')
+        with transaction.atomic():
+            rows = list(projects.values_list('pk', 'student_id', 'teacher_id', 'grade', course))
+            letters = letter_grades_for([(score, row[2], row[4]) for row in rows])
+            
+            graded_by_letter = {}
+            new_grades = []
+            for (project_id, _, _, grade_id, _), letter in zip(rows, letters):
+                if grade_id is None:
+                    new_grades.append(self.model(project_id=project_id, letter_grade=letter, **values))
+                else:
+                    graded_by_letter.setdefault(letter, []).append(project_id)
+            
+            if len(set(letters)) == 1:
+                updated = self.filter(project__in=projects.values('pk')).update(letter_grade=letters[0], **values)
+            else:
+                updated = self._update_letters(graded_by_letter, **values)
+            self.bulk_create(new_grades)
+            
+            # update() and bulk_create() bypass the signal handlers
+            UserStats.objects.refresh(
+                students=[row[1] for row in rows],
+                teachers=[row[2] for row in rows],
+            )
+        return len(new_grades), updated
+    
+    def recompute_letter_grades(self, grades=None):
+        """
+        Re-derive ``letter_grade`` for ``grades`` (default: all) after a scale
+        change. Letters are computed in batches and only changed rows are
+        written. Returns the number of grades updated.
+        """
+        grades = self.all() if grades is None else grades
+        rows = grades.values_list(
+            'project_id', 'score', 'letter_grade',
+            'project__teacher_id', 'project__student__student_profile__course',
+        )
+        by_letter = {}
+        with transaction.atomic():
+            batch = []
+            for row in rows.iterator(chunk_size=2000):
+                batch.append(row)
+                if len(batch) == 2000:
+                    self._collect_changes(batch, by_letter)
+                    batch = []
+            self._collect_changes(batch, by_letter)
+            updated = self._update_letters(by_letter, updated_at=timezone.now())
+        if updated:
+            bump_all_fragment_versions()
+            analytics_changed()
+        return updated
+    
+    @staticmethod
+    def _collect_changes(rows, by_letter):
+        letters = letter_grades_for([(score, teacher_id, course) for _, score, _, teacher_id, course in rows])
+        for (project_id, _, current, _, _), letter in zip(rows, letters):
+            if letter != current:
+                by_letter.setdefault(letter, []).append(project_id)
+
 class Grade(models.Model):
-    GRADE_CHOICES = [
-        ('A+', 'A+ (90-100)'),
-        ('A', 'A (80-89)'),
-        ('B+', 'B+ (70-79)'),
-        ('B', 'B (60-69)'),
-        ('C+', 'C+ (50-59)'),
-        ('C', 'C (40-49)'),
-        ('D', 'D (30-39)'),
-        ('F', 'F (0-29)'),
+    # Rubric criteria, each scored out of RUBRIC_MAX_SCORE in ``<name>_score``
+    RUBRIC_CRITERIA = [
+        ('content', 'Content Quality'),
+        ('presentation', 'Presentation/Structure'),
+        ('creativity', 'Creativity/Innovation'),
+        ('technical', 'Technical Implementation'),
     ]
+    RUBRIC_MAX_SCORE = 25
     
     project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='grade')
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grades_given')
@@ -35,29 +327,150 @@ class Grade(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)],
         help_text="Score out of 100"
     )
-    letter_grade = models.CharField(max_length=2, choices=GRADE_CHOICES, blank=True)
+    letter_grade = models.CharField(max_length=4, blank=True)
     feedback = models.TextField(blank=True)
     graded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Rubric breakdown of ``score``; empty for grades given without the
+    # rubric (bulk grading, grades from before it was stored)
+    content_score = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MaxValueValidator(25)])
+    presentation_score = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MaxValueValidator(25)])
+    creativity_score = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MaxValueValidator(25)])
+    technical_score = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MaxValueValidator(25)])
+    
+    objects = GradeManager()
+    
+    @property
+    def rubric(self):
+        """``[(label, score)]`` per criterion, or [] when the grade has no rubric scores."""
+        scores = [getattr(self, f'{name}_score') for name, _ in self.RUBRIC_CRITERIA]
+        if None in scores:
+            return []
+        return [(label, score) for (_, label), score in zip(self.RUBRIC_CRITERIA, scores)]
     
     def save(self, *args, **kwargs):
-        # Auto-assign letter grade based on score
-        if self.score >= 90:
-            self.letter_grade = 'A+'
-        elif self.score >= 80:
-            self.letter_grade = 'A'
-        elif self.score >= 70:
-            self.letter_grade = 'B+'
-        elif self.score >= 60:
-            self.letter_grade = 'B'
-        elif self.score >= 50:
-            self.letter_grade = 'C+'
-        elif self.score >= 40:
-            self.letter_grade = 'C'
-        elif self.score >= 30:
-            self.letter_grade = 'D'
-        else:
-            self.letter_grade = 'F'
+        # Auto-assign letter grade from the scale that applies to this project
+        self.letter_grade = letter_grade_for(self.score, *self.scale_key())
         super().save(*args, **kwargs)
     
+    def scale_key(self):
+        """The ``(teacher_id, course)`` used to pick this grade's scale."""
+        course = ''
+        if get_registry().uses_courses:
+            course = StudentProfile.objects.filter(
+                user_id=self.project.student_id
+            ).values_list('course', flat=True).first() or ''
+        return self.project.teacher_id, course
+    
     def __str__(self):
         return f"{self.project.title} - {self.letter_grade} ({self.score}%)"
+
+class UserStatsManager(models.Manager):
+    SIDES = ('student', 'teacher')
+    # Users per grouped query, to stay under SQLite's parameter limit
+    CHUNK_SIZE = 500
+    
+    def compute(self, side, user_ids):
+        """
+        Build (unsaved) stats rows for ``user_ids`` from the projects where
+        they are the ``side`` ('student' or 'teacher'), in one grouped query.
+        """
+        rows = (
+            Project.objects.filter(**{f'{side}__in': user_ids})
+            .values(side)
+            .annotate(
+                total=models.Count('id'),
+                graded=models.Count('grade'),
+                pending=models.Count('id', filter=models.Q(grade__isnull=True)),
+                reviews=models.Count('id', filter=models.Q(grade__isnull=True, is_submitted=True)),
+                students=models.Count('student', distinct=True),
+                score_total=models.Sum('grade__score'),
+            )
+        )
+        by_user = {row[side]: row for row in rows}
+        stats = []
+        for user_id in user_ids:
+            row = by_user.get(user_id, {})
+            stats.append(self.model(
+                user_id=user_id,
+                total_projects=row.get('total', 0),
+                graded_projects=row.get('graded', 0),
+                pending_projects=row.get('pending', 0),
+                pending_reviews=row.get('reviews', 0),
+                total_students=row.get('students', 0) if side == 'teacher' else 0,
+                score_total=row.get('score_total') or 0,
+            ))
+        return stats
+    
+    def refresh(self, students=(), teachers=(), create=False):
+        """
+        Recompute the rows of the given students and teachers.
+
+        Only existing rows are updated unless ``create`` is set; rows are
+        otherwise created on first read by for_user(), which keeps writes
+        from recreating stats for a user that is being deleted.
+        """
+        for side, user_ids in zip(self.SIDES, (students, teachers)):
+            user_ids = sorted(set(user_ids))
+            for start in range(0, len(user_ids), self.CHUNK_SIZE):
+                self._save(self.compute(side, user_ids[start:start + self.CHUNK_SIZE]), create)
+            if not create:
+                # Whatever changed the counters also changed the cached fragments
+                bump_fragment_versions(user_ids)
+        if not create:
+            analytics_changed()
+    
+    def _save(self, stats, create):
+        if create:
+            self.bulk_create(
+                stats,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=UserStats.COUNTER_FIELDS,
+            )
+        else:
+            self.bulk_update(stats, UserStats.COUNTER_FIELDS)
+    
+    def for_user(self, user):
+        """Return the stats row for ``user``, building it on first use."""
+        stats = self.filter(user=user).first()
+        if stats is None:
+            side = 'teacher' if user.user_type == 'teacher' else 'student'
+            self.refresh(**{f'{side}s': [user.pk]}, create=True)
+            stats = self.get(user=user)
+        return stats
+
+class UserStats(models.Model):
+    """
+    Per-user project and grade counters read by the dashboards.
+
+    Kept current by the signal handlers in projects.signals; run
+    ``manage.py rebuild_stats`` to recompute every row from scratch.
+    """
+    COUNTER_FIELDS = [
+        'total_projects', 'graded_projects', 'pending_projects',
+        'pending_reviews', 'total_students', 'score_total',
+    ]
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='project_stats')
+    total_projects = models.PositiveIntegerField(default=0)
+    graded_projects = models.PositiveIntegerField(default=0)
+    pending_projects = models.PositiveIntegerField(default=0)
+    pending_reviews = models.PositiveIntegerField(default=0)
+    total_students = models.PositiveIntegerField(default=0)
+    score_total = models.PositiveIntegerField(default=0)
+    
+    objects = UserStatsManager()
+    
+    class Meta:
+        verbose_name_plural = 'user stats'
+    
+    @property
+    def average_score(self):
+        if not self.graded_projects:
+            return None
+        return round(self.score_total / self.graded_projects, 1)
+    
+    def __str__(self):
+        return f"Stats for {self.user.username}"
@@ -0,0 +1,149 @@
+"""
+Keyset (cursor) pagination for the project lists.
+
+Instead of ``COUNT(*)`` plus ``OFFSET``, each page seeks past the sort key of
+the last row it showed, so page 500 costs the same index range scan as page 1.
+Cursors are opaque tokens carrying that sort key and a direction.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    """One page of results, with tokens for the pages on either side."""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} item(s)>'
+
+    @property
+    def count(self):
+        """Total rows across all pages, or None when the view did not supply one."""
+        return self.paginator.count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by its ``order_by()`` keys.
+
+    The ordering must end in a unique key (the views order by
+    ``('-submitted_at', '-id')``). ``count`` is shown as-is: pass a
+    precomputed or approximate total, or leave it None to skip counting.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+        self.ordering = [key.lstrip('-') for key in queryset.query.order_by]
+        self.descending = [key.startswith('-') for key in queryset.query.order_by]
+        if not self.ordering:
+            raise ValueError('CursorPaginator needs an ordered queryset.')
+
+    def get_page(self, cursor=None):
+        """Return the page for ``cursor``; missing or invalid cursors give the first page."""
+        try:
+            direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+        except InvalidCursor:
+            direction, values = 'next', None
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward=direction == 'next'))
+        if direction == 'previous':
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'previous':
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self)
+
+        # Going forward there is more after the last row; going back, more
+        # before the first one. The side we came from always has rows.
+        if direction == 'next':
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor('next', rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor('previous', rows[0]) if has_previous else None,
+        )
+
+    def _seek(self, values, forward):
+        """
+        Build the WHERE clause selecting rows after (or before) ``values``.
+
+        For keys (a, b) this is ``a < x OR (a = x AND b < y)`` for descending
+        keys, with the comparisons flipped when paging backwards.
+        """
+        condition = Q()
+        equal = Q()
+        for key, descending, value in zip(self.ordering, self.descending, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{key}__{lookup}': value})
+            equal &= Q(**{key: value})
+        # Leading-key bound so the database can seek the index range
+        lookup = 'lte' if self.descending[0] == forward else 'gte'
+        return Q(**{f'{self.ordering[0]}__{lookup}': values[0]}) & condition
+
+    def encode_cursor(self, direction, row):
+        # isoformat() keeps microseconds, which DjangoJSONEncoder would drop
+        # Rows are model instances, or dicts for values() querysets
+        values = [row[key] if isinstance(row, dict) else getattr(row, key) for key in self.ordering]
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+        payload = json.dumps([direction[0], values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload)
+            if direction not in ('n', 'p') or len(values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            values = [self._to_python(key, value) for key, value in zip(self.ordering, values)]
+        except (ValueError, TypeError, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return ('next' if direction == 'n' else 'previous'), values
+
+    def _to_python(self, key, value):
+        try:
+            field = self.queryset.model._meta.get_field(key)
+        except FieldDoesNotExist:
+            # Annotations such as the search rank are plain JSON numbers
+            return value
+        return field.to_python(value)
@@ -0,0 +1,98 @@
+"""
+Inline previews of submission files for the teacher's review page.
+
+A file's extracted text and a summary of its structure (headings, page
+count, archive listing) are cached on disk beside the stored files, under
+``previews/<key>/`` in the submissions storage. The key is the content hash
+for content-addressed files, so copies share one preview and it never goes
+stale; the cache is removed with the blob. Previews are built by the
+``projects.build_previews`` task after a submission; a page that finds no
+preview queues that task and shows the preview as pending rather than
+extracting the file itself.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from .extraction import READ_ERRORS, ExtractionError, cached_text, docx_outline, extension, pdf_outline, zip_listing
+from .jobs import enqueue_once
+from .storage import blob_hash, submission_storage
+
+PREVIEW_DIR = 'previews'
+
+# Characters of text shown on the page; the rest is one click away
+INLINE_TEXT_LENGTH = 20000
+
+
+def cache_directory(name, storage=None):
+    storage = storage or submission_storage()
+    key = blob_hash(name) or 'file-' + hashlib.sha256(name.encode()).hexdigest()
+    return os.path.join(storage.location, PREVIEW_DIR, key)
+
+
+def text_cache_path(name, storage=None):
+    return os.path.join(cache_directory(name, storage), 'text.txt')
+
+
+def _summary_path(name, storage=None):
+    return os.path.join(cache_directory(name, storage), 'preview.json')
+
+
+def build_preview(name, storage=None):
+    """Extract and cache the text and structure of the stored file ``name``; return the summary."""
+    storage = storage or submission_storage()
+    path = storage.path(name)
+    filename = os.path.basename(name)
+    ext = extension(filename)
+    summary = {'format': ext.lstrip('.').upper(), 'pages': None, 'words': 0,
+               'outline': [], 'files': [], 'file_count': 0, 'error': ''}
+    try:
+        text = cached_text(path, filename, text_cache_path(name, storage))
+        summary['words'] = len(text.split())
+        if ext == '.docx':
+            summary['outline'] = docx_outline(path)
+        elif ext == '.pdf':
+            summary['pages'], summary['outline'] = pdf_outline(path)
+        elif ext == '.zip':
+            summary['files'], summary['file_count'] = zip_listing(path)
+    except (ExtractionError, OSError, *READ_ERRORS):
+        summary['error'] = 'The file could not be read for a preview; download it instead.'
+
+    directory = cache_directory(name, storage)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+        json.dump(summary, tmp)
+    os.replace(tmp_path, _summary_path(name, storage))
+    return summary
+
+
+def get_preview(project):
+    """
+    The cached preview of ``project``'s file: its summary plus the first
+    INLINE_TEXT_LENGTH characters as ``text``. Returns None for a project
+    without a file, and ``{'pending': True}`` while the preview is not
+    built yet, after queueing the job that builds it.
+    """
+    if not project.file_upload:
+        return None
+    name = project.file_upload.name
+    try:
+        with open(_summary_path(name), encoding='utf-8') as f:
+            preview = json.load(f)
+    except FileNotFoundError:
+        enqueue_once(f'preview:{name}', 'projects.build_previews', {'project_ids': [project.pk]})
+        return {'pending': True, 'format': extension(name).lstrip('.').upper()}
+
+    preview['pending'] = False
+    preview['text'] = ''
+    try:
+        with open(text_cache_path(name), encoding='utf-8') as f:
+            preview['text'] = f.read(INLINE_TEXT_LENGTH + 1)
+    except FileNotFoundError:
+        pass
+    preview['truncated'] = len(preview['text']) > INLINE_TEXT_LENGTH
+    preview['more_files'] = preview['file_count'] - len(preview['files'])
+    preview['text'] = preview['text'][:INLINE_TEXT_LENGTH]
+    return preview
@@ -0,0 +1,134 @@
+"""
+Full-text search over projects for the teacher project list.
+
+The backend is chosen by the PROJECT_SEARCH_BACKEND setting (a dotted path);
+when unset, SQLite databases use the FTS5 index and anything else falls back
+to the old ``icontains`` filters. Other databases can plug in their own index
+by subclassing SearchBackend.
+"""
+import functools
+import re
+
+from django.conf import settings
+from django.test.signals import setting_changed
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchBackend:
+    """Plain ``icontains`` filtering; keeps no index."""
+
+    def search(self, queryset, query):
+        """Filter ``queryset`` down to projects matching ``query``, best match first."""
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(student__first_name__icontains=query) |
+            Q(student__last_name__icontains=query) |
+            Q(student__username__icontains=query)
+        )
+
+    def index_projects(self, project_ids):
+        """(Re)index the given projects."""
+
+    def index_student(self, student_id):
+        """Reindex every project of a student whose name changed."""
+
+    def remove_projects(self, project_ids):
+        """Drop the given projects from the index."""
+
+    def rebuild(self):
+        """Recreate the whole index from the project table."""
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Ranked, prefix-matching search backed by an FTS5 table.
+
+    ``projects_project_fts`` holds one row per project (rowid = project id)
+    with its title, description and student names; it is created by
+    migration 0003 and kept in sync by the handlers in projects.signals.
+    """
+    table = 'projects_project_fts'
+    # bm25() column weights: title, description, student
+    weights = (10.0, 1.0, 5.0)
+
+    INDEX_SQL = (
+        "INSERT OR REPLACE INTO {table} (rowid, title, description, student) "
+        "SELECT p.id, p.title, p.description, "
+        "u.first_name || ' ' || u.last_name || ' ' || u.username "
+        "FROM projects_project p INNER JOIN accounts_user u ON u.id = p.student_id "
+        "WHERE {where}"
+    )
+
+    @staticmethod
+    def match_expression(query):
+        """Turn free text into an FTS5 query: every word must match as a prefix."""
+        return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        weights = ', '.join(str(w) for w in self.weights)
+        rank = RawSQL(
+            f"SELECT bm25({self.table}, {weights}) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = projects_project.id",
+            [match],
+            output_field=FloatField(),
+        )
+        matching = RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match])
+        # bm25() is lower for better matches
+        return (
+            queryset.filter(id__in=matching)
+            .annotate(search_rank=rank)
+            .order_by('search_rank', *queryset.query.order_by)
+        )
+
+    def _index(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(self.INDEX_SQL.format(table=self.table, where=where), params)
+
+    def index_projects(self, project_ids):
+        project_ids = list(project_ids)
+        if project_ids:
+            placeholders = ', '.join(['%s'] * len(project_ids))
+            self._index(f'p.id IN ({placeholders})', project_ids)
+
+    def index_student(self, student_id):
+        self._index('p.student_id = %s', [student_id])
+
+    def remove_projects(self, project_ids):
+        project_ids = list(project_ids)
+        if project_ids:
+            placeholders = ', '.join(['%s'] * len(project_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', project_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        self._index('1', [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+
+@functools.cache
+def get_search_backend():
+    """Return the configured search backend instance."""
+    path = getattr(settings, 'PROJECT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return SearchBackend()
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    if setting == 'PROJECT_SEARCH_BACKEND':
+        get_search_backend.cache_clear()
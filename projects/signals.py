@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .fragments import bump_all_fragment_versions
+from .grading import scales_changed
+from .models import Project, Grade, UserStats, GradingScale, GradeBoundary, SimilarityBucket, SubmissionFingerprint
+from .search import get_search_backend
+from .storage import blob_hash
+
+User = get_user_model()
+
+# User fields copied into the search index
+SEARCHABLE_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+def _owners(project_id):
+    """Return (student_id, teacher_id) of a project, or None if it is gone."""
+    return Project.objects.filter(pk=project_id).values_list('student_id', 'teacher_id').first()
+
+
+@receiver(pre_save, sender=Project)
+def remember_project_owners(sender, instance, **kwargs):
+    # A reassigned project changes the stats of its previous owners too, and
+    # a replaced file releases its reference to the old blob
+    previous = None
+    if instance.pk:
+        previous = Project.objects.filter(pk=instance.pk).values_list(
+            'student_id', 'teacher_id', 'file_upload'
+        ).first()
+    instance._previous_owners = previous[:2] if previous else None
+    instance._previous_file = previous[2] if previous else None
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def refresh_project_stats(sender, instance, **kwargs):
+    students, teachers = {instance.student_id}, {instance.teacher_id}
+    previous = getattr(instance, '_previous_owners', None)
+    if previous:
+        students.add(previous[0])
+        teachers.add(previous[1])
+    UserStats.objects.refresh(students=students, teachers=teachers)
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+def refresh_grade_stats(sender, instance, **kwargs):
+    if Grade.project.is_cached(instance):
+        owners = (instance.project.student_id, instance.project.teacher_id)
+    else:
+        owners = _owners(instance.project_id)
+    if owners:
+        UserStats.objects.refresh(students=[owners[0]], teachers=[owners[1]])
+
+
+@receiver(post_save, sender=Project)
+def index_project(sender, instance, **kwargs):
+    get_search_backend().index_projects([instance.pk])
+
+
+@receiver(post_delete, sender=Project)
+def unindex_project(sender, instance, **kwargs):
+    get_search_backend().remove_projects([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_student_projects(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login only; skip anything that leaves names untouched
+    if created or (update_fields is not None and not SEARCHABLE_USER_FIELDS & set(update_fields)):
+        return
+    get_search_backend().index_student(instance.pk)
+    # Names appear in other users' dashboards and project tables
+    bump_all_fragment_versions()
+
+
+@receiver(post_save, sender=GradingScale)
+@receiver(post_delete, sender=GradingScale)
+@receiver(post_save, sender=GradeBoundary)
+@receiver(post_delete, sender=GradeBoundary)
+def invalidate_grading_scales(sender, **kwargs):
+    scales_changed()
+
+
+@receiver(post_save, sender=Project)
+def release_replaced_file(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_file', None)
+    if previous and previous != instance.file_upload.name and blob_hash(previous):
+        instance.file_upload.storage.delete(previous)
+
+
+@receiver(post_save, sender=Project)
+def drop_replaced_fingerprint(sender, instance, created, **kwargs):
+    # Other projects must not keep matching the old file; the new one is
+    # fingerprinted by index_submissions or when its page is next viewed
+    if not created and getattr(instance, '_previous_file', None) != instance.file_upload.name:
+        SimilarityBucket.objects.filter(project=instance).delete()
+        SubmissionFingerprint.objects.filter(project=instance).delete()
+
+
+@receiver(post_delete, sender=Project)
+def release_deleted_file(sender, instance, **kwargs):
+    # Only content-addressed files are shared and counted; older files are
+    # left where they are, as before
+    if instance.file_upload and blob_hash(instance.file_upload.name):
+        instance.file_upload.storage.delete(instance.file_upload.name)
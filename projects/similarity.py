@@ -0,0 +1,260 @@
+"""
+Near-duplicate detection over submission files.
+
+Each file's text is cut into overlapping word shingles and summarised by a
+MinHash signature of NUM_BINS values, so the share of equal positions in two
+signatures estimates the Jaccard similarity of their shingle sets. The
+signature is built with one-permutation hashing: every shingle is hashed
+once, the hash picks a bin and the smallest value per bin is kept, with
+empty bins filled from their neighbours. That costs one hash per shingle
+rather than one per shingle and permutation, and banding still works.
+
+Signatures are split into BANDS bands of ROWS values; each band is hashed
+to a bucket key stored in SimilarityBucket. Projects sharing any bucket are
+candidates, found through the key index without comparing every pair, and
+only candidates have their signatures compared. With 32 bands of 4 rows a
+pair at 50% similarity is a candidate 87% of the time and one at 70% almost
+always; pairs under 20% rarely are.
+"""
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+
+from django.db import transaction
+
+from .extraction import ExtractionError, cached_text
+from .fragments import bump_fragment_versions
+from .jobs import enqueue_once
+from .previews import text_cache_path
+from .storage import blob_hash, submission_storage
+
+SHINGLE_SIZE = 5
+NUM_BINS = 128
+BANDS = 32
+ROWS = NUM_BINS // BANDS
+
+SIGNATURE_FORMAT = f'<{NUM_BINS}I'
+BIN_BITS = (NUM_BINS - 1).bit_length()
+EMPTY = 1 << 64
+# Keeps values borrowed by neighbouring empty bins distinct per distance
+DENSIFY_OFFSET = 0x9E3779B9
+
+# Estimated Jaccard similarity at which a pair is reported
+SIMILARITY_THRESHOLD = 0.5
+
+# Below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 20
+BATCH_SIZE = 500
+
+WORD_RE = re.compile(r'\w+')
+
+
+def shingle_hashes(text):
+    """64-bit hashes of the distinct SHINGLE_SIZE-word shingles of ``text``."""
+    words = WORD_RE.findall(text.casefold())
+    if not words:
+        return set()
+    windows = range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    return {
+        int.from_bytes(blake2b(' '.join(words[i:i + SHINGLE_SIZE]).encode(), digest_size=8).digest(), 'little')
+        for i in windows
+    }
+
+
+def minhash(hashes):
+    """Signature of a set of shingle hashes as bytes, or b'' for an empty set."""
+    if not hashes:
+        return b''
+    bins = [EMPTY] * NUM_BINS
+    mask = NUM_BINS - 1
+    for value in hashes:
+        index = value & mask
+        value >>= BIN_BITS
+        if value < bins[index]:
+            bins[index] = value
+    # Densify: an empty bin borrows from the next filled one to its right
+    filled = bins[:]
+    for index in range(NUM_BINS):
+        distance = 1
+        while bins[index] == EMPTY:
+            borrowed = filled[(index + distance) % NUM_BINS]
+            if borrowed != EMPTY:
+                bins[index] = borrowed + distance * DENSIFY_OFFSET
+            distance += 1
+    return struct.pack(SIGNATURE_FORMAT, *(value & 0xFFFFFFFF for value in bins))
+
+
+def signature_for_text(text):
+    """``(signature, shingle count)`` of a document's text."""
+    hashes = shingle_hashes(text)
+    return minhash(hashes), len(hashes)
+
+
+def signature_for_file(path, filename, text_path):
+    """
+    ``(signature, shingle count)`` of a file; unreadable files give ``(b'', 0)``.
+    The extracted text is shared with previews through ``text_path``.
+    """
+    try:
+        return signature_for_text(cached_text(path, filename, text_path))
+    except (ExtractionError, OSError):
+        return b'', 0
+
+
+def band_keys(signature):
+    """One bucket key per band; keys of different bands never collide."""
+    values = struct.unpack(SIGNATURE_FORMAT, signature)
+    return [
+        (band << 32) | zlib.crc32(struct.pack(f'<{ROWS}I', *values[band * ROWS:(band + 1) * ROWS]))
+        for band in range(BANDS)
+    ]
+
+
+def estimate_similarity(first, second):
+    """Estimated Jaccard similarity of the documents behind two signatures."""
+    if not first or not second:
+        return 0.0
+    a = struct.unpack(SIGNATURE_FORMAT, first)
+    b = struct.unpack(SIGNATURE_FORMAT, second)
+    return sum(x == y for x, y in zip(a, b)) / NUM_BINS
+
+
+def _map(function, *iterables, pool=None):
+    if pool is None:
+        return list(map(function, *iterables))
+    return list(pool.map(function, *iterables, chunksize=8))
+
+
+def store_signatures(rows):
+    """
+    Save ``(project_id, file_name, signature, shingles)`` rows, replacing
+    the fingerprints and buckets those projects had.
+    """
+    from .models import Project, SimilarityBucket, SubmissionFingerprint
+
+    project_ids = [row[0] for row in rows]
+    # Project pages list similar submissions, so their teachers' cached pages are stale
+    bump_fragment_versions(Project.objects.filter(pk__in=project_ids).values_list('teacher_id', flat=True))
+    with transaction.atomic():
+        SimilarityBucket.objects.filter(project_id__in=project_ids).delete()
+        SubmissionFingerprint.objects.bulk_create(
+            [
+                SubmissionFingerprint(
+                    project_id=project_id, file_name=file_name, sha256=blob_hash(file_name) or '',
+                    signature=signature, shingles=shingles,
+                )
+                for project_id, file_name, signature, shingles in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['project'],
+            update_fields=['file_name', 'sha256', 'signature', 'shingles', 'indexed_at'],
+        )
+        SimilarityBucket.objects.bulk_create(
+            SimilarityBucket(project_id=project_id, key=key)
+            for project_id, _, signature, _ in rows if signature
+            for key in band_keys(signature)
+        )
+
+
+def stale_projects(projects=None):
+    """Projects in ``projects`` (default: all) with a file that is not indexed as it is now."""
+    from django.db.models import F, Q
+    from .models import Project
+
+    projects = Project.objects.all() if projects is None else projects
+    return projects.exclude(file_upload='').exclude(file_upload__isnull=True).filter(
+        Q(fingerprint__isnull=True) | ~Q(fingerprint__file_name=F('file_upload'))
+    )
+
+
+def index_projects(projects, workers=None):
+    """
+    Fingerprint the files of ``projects`` and store them, BATCH_SIZE at a time.
+
+    Files are read and hashed across a process pool once there are enough
+    of them; copies of one stored file are only read once. Returns the
+    number of projects indexed.
+    """
+    from .models import SubmissionFingerprint
+
+    rows = list(projects.values_list('pk', 'file_upload'))
+    if not rows:
+        return 0
+    storage = submission_storage()
+
+    pool = None
+    if workers != 1 and len(rows) >= POOL_THRESHOLD:
+        pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    try:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            # Identical files share a content hash; reuse what is already known
+            by_hash = {}
+            hashes = {blob_hash(name) for _, name in batch} - {None}
+            if hashes:
+                known = SubmissionFingerprint.objects.filter(sha256__in=hashes).values_list(
+                    'sha256', 'signature', 'shingles'
+                )
+                by_hash = {sha256: (bytes(signature), shingles) for sha256, signature, shingles in known}
+
+            todo = {}
+            for _, name in batch:
+                key = blob_hash(name) or name
+                if key not in by_hash:
+                    todo[key] = name
+            results = _map(
+                signature_for_file,
+                [storage.path(name) for name in todo.values()],
+                [os.path.basename(name) for name in todo.values()],
+                [text_cache_path(name, storage) for name in todo.values()],
+                pool=pool,
+            )
+            by_hash.update(zip(todo, results))
+            store_signatures([
+                (project_id, name, *by_hash[blob_hash(name) or name]) for project_id, name in batch
+            ])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return len(rows)
+
+
+def similar_projects(project, threshold=SIMILARITY_THRESHOLD, limit=10):
+    """
+    ``(project, similarity)`` pairs for the other projects of the same
+    teacher whose files look like ``project``'s, most similar first.
+
+    Returns None while the file is not indexed yet, after queueing the
+    indexing job if it is not already queued, so a page never extracts a
+    file while it renders.
+    """
+    from .models import Project, SimilarityBucket, SubmissionFingerprint
+
+    if not project.file_upload:
+        return []
+    fingerprint = SubmissionFingerprint.objects.filter(project=project).first()
+    if fingerprint is None or fingerprint.file_name != project.file_upload.name:
+        enqueue_once(
+            f'index:{project.pk}:{project.file_upload.name}', 'projects.index_submissions', {'project_ids': [project.pk]}
+        )
+        return None
+    if not fingerprint.signature:
+        return []
+
+    signature = bytes(fingerprint.signature)
+    candidates = (
+        SimilarityBucket.objects.filter(key__in=band_keys(signature), project__teacher_id=project.teacher_id)
+        .exclude(project_id=project.pk)
+        .values('project_id')
+        .distinct()
+    )
+    matches = []
+    for other in Project.objects.filter(pk__in=candidates).select_related('student', 'fingerprint'):
+        similarity = estimate_similarity(signature, bytes(other.fingerprint.signature))
+        if similarity >= threshold:
+            matches.append((other, similarity))
+    matches.sort(key=lambda match: (-match[1], match[0].pk))
+    return matches[:limit]
@@ -0,0 +1,125 @@
+"""
+Content-addressed, deduplicated storage for submission files.
+
+Every file is stored once, at ``blobs/<sha[:2]>/<sha256>`` under MEDIA_ROOT,
+however many projects reference it. The name saved on the FileField is
+``cas/<sha256>/<original filename>`` so downloads keep the student's file
+name. A StoredBlob row counts the references to each blob; saving content
+that is already stored only bumps the count, without writing any bytes,
+and the blob is removed once its last reference is deleted.
+
+Files saved before this storage existed keep their plain names and are
+served as before until ``manage.py dedupe_submissions`` moves them in.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+
+PREFIX = 'cas'
+
+# FileField max_length; the original file name is shortened to fit
+MAX_NAME_LENGTH = 255
+
+
+def content_hash(content):
+    """SHA-256 of a File, read in chunks; reuses a hash computed on upload."""
+    sha256 = getattr(content, 'sha256', None)
+    if sha256:
+        return sha256
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def blob_hash(name):
+    """The content hash in a content-addressed name, or None for other names."""
+    parts = (name or '').split('/')
+    if len(parts) >= 3 and parts[0] == PREFIX and len(parts[1]) == 64:
+        return parts[1]
+    return None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that keeps one reference-counted copy of each distinct file."""
+
+    def blob_path(self, sha256):
+        return os.path.join(self.location, 'blobs', sha256[:2], sha256)
+
+    def path(self, name):
+        sha256 = blob_hash(name)
+        return self.blob_path(sha256) if sha256 else super().path(name)
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save(), and sharing one is the point
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        sha256 = content_hash(content)
+        filename = os.path.basename(name)
+        stem, ext = os.path.splitext(filename)
+        room = MAX_NAME_LENGTH - len(PREFIX) - len(sha256) - 2 - len(ext)
+        filename = stem[:room] + ext
+
+        with transaction.atomic():
+            StoredBlob.objects.bulk_create([StoredBlob(sha256=sha256, size=content.size)], ignore_conflicts=True)
+            # Locks the row so a concurrent last delete cannot remove the blob under us
+            StoredBlob.objects.select_for_update().get(pk=sha256)
+            path = self.blob_path(sha256)
+            if not os.path.exists(path):
+                self._write_blob(path, content)
+            StoredBlob.objects.filter(pk=sha256).update(references=F('references') + 1)
+        return f'{PREFIX}/{sha256}/{filename}'
+
+    def _write_blob(self, path, content):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), path)
+        else:
+            # Write beside the target and rename, so a blob is never seen half-written
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    for chunk in content.chunks():
+                        tmp.write(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+    def delete(self, name):
+        """Drop one reference; the blob itself goes with the last one."""
+        from .models import StoredBlob
+
+        sha256 = blob_hash(name)
+        if not sha256:
+            return super().delete(name)
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(pk=sha256).first()
+            if blob is None:
+                return
+            if blob.references > 1:
+                StoredBlob.objects.filter(pk=sha256).update(references=F('references') - 1)
+                return
+            blob.delete()
+            path = self.blob_path(sha256)
+            transaction.on_commit(lambda: os.path.exists(path) and os.unlink(path))
+            # Cached previews of the blob (see projects.previews)
+            previews = os.path.join(self.location, 'previews', sha256)
+            transaction.on_commit(lambda: shutil.rmtree(previews, ignore_errors=True))
+
+
+def submission_storage():
+    """Storage for Project.file_upload: the 'submissions' entry of STORAGES."""
+    return storages['submissions']
@@ -0,0 +1,35 @@
+"""
+Background tasks run by ``manage.py run_jobs``; queue them with
+``projects.jobs.enqueue(name, kwargs)``. Tasks may run more than once (a
+retry, or a lost lease), so each must be safe to repeat.
+"""
+from accounts.models import User
+
+from .fragments import bump_fragment_versions
+from .jobs import task
+from .models import Grade, Project
+from .previews import build_preview
+from .similarity import index_projects, stale_projects
+
+
+@task('projects.bulk_grade', priority=10)
+def bulk_grade(project_ids, teacher_id, score, feedback=''):
+    teacher = User.objects.get(pk=teacher_id)
+    projects = Project.objects.filter(pk__in=project_ids, teacher=teacher)
+    Grade.objects.bulk_grade(projects, teacher, score, feedback)
+
+
+@task('projects.index_submissions', priority=-10, lease=15 * 60)
+def index_submissions(project_ids):
+    # Files already fingerprinted (by the detail page, say) are skipped
+    index_projects(stale_projects(Project.objects.filter(pk__in=project_ids)), workers=1)
+
+
+@task('projects.build_previews', lease=15 * 60)
+def build_previews(project_ids):
+    projects = Project.objects.filter(pk__in=project_ids).exclude(file_upload='')
+    for name in set(projects.values_list('file_upload', flat=True)):
+        if name:
+            build_preview(name)
+    # Review pages showing the preview as pending are cached until this bump
+    bump_fragment_versions(projects.values_list('teacher_id', flat=True))
@@ -1,3 +1,1345 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.fields.files import FieldFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from accounts.models import User, StudentProfile, TeacherProfile
+from accounts.views import adashboard
+from . import analytics, extraction, uploads
+from .benchmarks import async_views
+from .fragments import _user_key, bump_all_fragment_versions, fragment_version, load_fragment_data
+from .grading import CompiledScale, DEFAULT_SCALE, get_registry, scales_changed
+from .models import Project, Grade, UserStats, GradingScale, GradeBoundary, ChunkedUpload, StoredBlob, Job
+from .jobs import claim, enqueue, requeue_expired, task, work
+from .search import get_search_backend
+from .extraction import extract_text, pdf_outline
+from .similarity import estimate_similarity, signature_for_text
+from .pagination import CursorPaginator
+
+
+class TempMediaMixin:
+    """
+    Point MEDIA_ROOT, and anything media_settings() adds, at a fresh directory
+    for each test, and forget the jobs queued for its files.
+    """
+
+    def media_settings(self):
+        return {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(cache.clear)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, **self.media_settings()))
+
+
+class QueryBudgetMixin:
+    """
+    Assert that a view stays within a fixed number of queries.
+
+    Each view is rendered with a small and a large data set: the query count
+    must not grow with the number of rows, and must not exceed the budget.
+    """
+
+    def assertQueryBudget(self, url, budget, grow=None):
+        self.client.get(url)  # warm the cached session and identity
+        small = self._count_queries(url)
+        if grow is not None:
+            grow()
+            large = self._count_queries(url)
+            self.assertEqual(
+                len(small), len(large),
+                f"{url} issued {len(small)} queries for a small page but "
+                f"{len(large)} for a full page:\n{self._format(large)}"
+            )
+        self.assertLessEqual(
+            len(small), budget,
+            f"{url} issued {len(small)} queries, budget is {budget}:\n{self._format(small)}"
+        )
+
+    def _count_queries(self, url):
+        bump_all_fragment_versions()  # measure a full render, not a cached fragment
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return ctx
+
+    @staticmethod
+    def _format(ctx):
+        return '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+
+
+def make_teacher(username='teacher'):
+    teacher = User.objects.create_user(
+        username=username, user_type='teacher',
+        first_name='Tina', last_name='Teacher'
+    )
+    TeacherProfile.objects.create(
+        user=teacher, employee_id=f'E-{username}', department='Computing', designation='Lecturer'
+    )
+    return teacher
+
+
+def make_student(username='student'):
+    student = User.objects.create_user(
+        username=username, user_type='student',
+        first_name='Sam', last_name='Student'
+    )
+    StudentProfile.objects.create(user=student, student_id=f'S-{username}', course='CS')
+    return student
+
+
+def make_projects(student, teacher, count, graded=True):
+    due = timezone.now() + timedelta(days=7)
+    projects = []
+    for i in range(count):
+        project = Project.objects.create(
+            title=f'Project {i}', description='A project description',
+            student=student, teacher=teacher, due_date=due, is_submitted=True
+        )
+        if graded and i % 2 == 0:
+            Grade.objects.create(project=project, teacher=teacher, score=75)
+        projects.append(project)
+    return projects
+
+
+class ListingQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        make_projects(self.student, self.teacher, 1)
+        # Stats rows are built on first read; build them outside the budget
+        UserStats.objects.for_user(self.student)
+        UserStats.objects.for_user(self.teacher)
+
+    def test_teacher_projects(self):
+        self.client.force_login(self.teacher)
+
+        def grow():
+            for i in range(15):
+                make_projects(make_student(f'student{i}'), self.teacher, 1)
+
+        self.assertQueryBudget(reverse('teacher_projects'), 2, grow=grow)
+
+    def test_teacher_projects_search(self):
+        self.client.force_login(self.teacher)
+        make_projects(self.student, self.teacher, 1, graded=False)
+        self.assertQueryBudget(
+            reverse('teacher_projects') + '?search=Project&status=pending', 2,
+            grow=lambda: make_projects(self.student, self.teacher, 20, graded=False)
+        )
+
+    def test_my_projects(self):
+        self.client.force_login(self.student)
+        self.assertQueryBudget(
+            reverse('my_projects'), 2,
+            grow=lambda: make_projects(self.student, make_teacher('teacher2'), 10)
+        )
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.project = make_projects(self.student, self.teacher, 1, graded=False)[0]
+
+    def get(self, user, url):
+        if self.client.session.get('_auth_user_id') != str(user.pk):
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx)
+
+    def test_repeat_views_are_served_from_cache(self):
+        for user, url in [(self.teacher, reverse('teacher_projects')), (self.student, reverse('dashboard'))]:
+            self.get(user, url)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            self.assertEqual(len(ctx), 0, [q['sql'] for q in ctx.captured_queries])
+
+    def test_grading_invalidates_both_sides(self):
+        self.get(self.teacher, reverse('teacher_projects'))
+        self.get(self.student, reverse('dashboard'))
+
+        Grade.objects.create(project=self.project, teacher=self.teacher, score=95)
+
+        response, queries = self.get(self.teacher, reverse('teacher_projects'))
+        self.assertGreater(queries, 0)
+        self.assertContains(response, 'A+')
+        response, _ = self.get(self.student, reverse('dashboard'))
+        self.assertContains(response, 'A+ (95%)')
+
+    def test_other_users_fragments_are_untouched(self):
+        other = make_teacher('teacher2')
+        self.get(other, reverse('dashboard'))
+        Grade.objects.create(project=self.project, teacher=self.teacher, score=95)
+        _, queries = self.get(other, reverse('dashboard'))
+        self.assertEqual(queries, 0)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        make_projects(self.student, self.teacher, 3)
+        self.enterContext(async_views())
+
+    async def test_views_under_asgi(self):
+        self.assertIs(resolve(reverse('dashboard')).func, adashboard)
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, 'Project 2')
+        self.assertEqual(response.context['stats'].total_projects, 3)
+        response = await self.async_client.get(reverse('my_projects'))
+        self.assertEqual(response.context['projects'].count, 3)
+        # The async user type check still turns students away from teacher pages
+        response = await self.async_client.get(reverse('teacher_projects'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.get(reverse('teacher_projects'))
+        self.assertEqual(len(response.context['projects']), 3)
+
+    def test_only_uncached_fragments_are_loaded(self):
+        loaded = []
+
+        def loader(name):
+            return lambda: loaded.append(name) or name
+
+        cache.set(make_template_fragment_key("'cached'", [1]), 'html')
+        context = async_to_sync(load_fragment_data)({
+            'a': ('cached', [1], loader('a')),
+            'b': ('missing', [1], loader('b')),
+        })
+        self.assertEqual((loaded, context['b']), (['b'], 'b'))
+        # Cached fragments get a lazy value, read only if the fragment has gone
+        self.assertEqual(str(context['a']), 'a')
+        self.assertEqual(loaded, ['b', 'a'])
+
+
+class ProjectDownloadTests(TempMediaMixin, TestCase):
+    CONTENT = bytes(range(256)) * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.project = make_projects(self.student, self.teacher, 1, graded=False)[0]
+        self.project.file_upload = SimpleUploadedFile('report.pdf', self.CONTENT)
+        self.project.save()
+        self.url = reverse('project_download', args=[self.project.id])
+        self.client.force_login(self.teacher)
+
+    def test_full_download_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(self.CONTENT))
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+
+    def test_range_download(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=1000-1999'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[1000:2000])
+
+    def test_open_ended_and_suffix_ranges(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=262000-'})
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[262000:])
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[-10:])
+
+    def test_if_range_must_match_the_current_file(self):
+        first = self.client.get(self.url)
+        range_headers = {'Range': 'bytes=1000-1999'}
+        response = self.client.get(self.url, headers={**range_headers, 'If-Range': first['ETag']})
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, headers={**range_headers, 'If-Range': first['Last-Modified']})
+        self.assertEqual(response.status_code, 206)
+
+        # Resuming a download of the file that was replaced gets the new file whole
+        self.project.file_upload = SimpleUploadedFile('report.pdf', self.CONTENT[::-1])
+        self.project.save()
+        for validator in (first['ETag'], 'W/' + first['ETag'], 'Thu, 01 Jan 2015 00:00:00 GMT'):
+            response = self.client.get(self.url, headers={**range_headers, 'If-Range': validator})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), self.CONTENT[::-1])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.CONTENT)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+
+    def test_offload_headers(self):
+        with self.settings(PROJECT_DOWNLOAD_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        # The path on disk under MEDIA_ROOT, not the content-addressed name
+        sha256 = hashlib.sha256(self.CONTENT).hexdigest()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/blobs/{sha256[:2]}/{sha256}')
+        self.assertIn('report.pdf', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+        with self.settings(PROJECT_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.project.file_upload.path)
+
+    def test_other_teacher_cannot_download(self):
+        self.client.force_login(make_teacher('other'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_unchanged_file_is_not_sent_again(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.CONTENT).hexdigest()}"')
+        self.assertIn('private', response['Cache-Control'])
+
+        with mock.patch.object(FieldFile, 'open') as opened:
+            response = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        opened.assert_not_called()
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.project = make_projects(self.student, self.teacher, 1, graded=False)[0]
+
+    def test_unchanged_pages_get_304(self):
+        for user, url in [
+            (self.student, reverse('project_detail', args=[self.project.pk])),
+            (self.teacher, reverse('teacher_project_detail', args=[self.project.pk])),
+        ]:
+            self.client.force_login(user)
+            # The first page sets the CSRF cookie, which the ETag covers
+            self.client.get(url)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Last-Modified', response)
+            self.assertEqual(set(response['Cache-Control'].split(', ')), {'private', 'no-cache'})
+
+            with self.assertNumQueries(1), mock.patch('django.template.loader.render_to_string') as render:
+                cached = self.client.get(url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(cached.status_code, 304)
+            render.assert_not_called()
+            self.assertIn('private', cached['Cache-Control'])
+
+    def test_grading_changes_the_validators(self):
+        url = reverse('project_detail', args=[self.project.pk])
+        self.client.force_login(self.student)
+        etag = self.client.get(url)['ETag']
+
+        Grade.objects.create(project=self.project, teacher=self.teacher, score=95)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '95%')
+
+        # Bulk grading writes with update(), which must still move the validators
+        etag = response['ETag']
+        Grade.objects.bulk_grade(Project.objects.filter(pk=self.project.pk), self.teacher, 50)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_dates_do_not_validate_pages(self):
+        # What a page shows beside the project changes without touching its dates
+        url = reverse('project_detail', args=[self.project.pk])
+        self.client.force_login(self.student)
+        self.client.get(url)
+        bump_all_fragment_versions()
+        response = self.client.get(url, headers={'If-Modified-Since': http_date(time.time() + 3600)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_students_project_is_not_found(self):
+        self.client.force_login(make_student('other-student'))
+        url = reverse('project_detail', args=[self.project.pk])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': '*'}).status_code, 404)
+
+
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+    CONTENT = b'%PDF-1.7\n' + bytes(range(256)) * 400
+
+    def media_settings(self):
+        return {'PROJECT_UPLOAD_TEMP_DIR': Path(self.media_root) / 'parts', 'PROJECT_UPLOAD_CHUNK_SIZE': 40000}
+
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.client.force_login(self.student)
+
+    def start(self, filename='thesis.pdf', size=None):
+        return self.client.post(reverse('start_upload'), {
+            'filename': filename, 'size': len(self.CONTENT) if size is None else size,
+        })
+
+    def put(self, url, start, end, content=None):
+        return self.client.generic(
+            'PUT', url, (content or self.CONTENT)[start:end], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {start}-{end - 1}/{len(content or self.CONTENT)}'},
+        )
+
+    def test_interrupted_upload_resumes_and_is_submitted(self):
+        state = self.start().json()
+        url = state['url']
+        self.put(url, 0, 40000)
+        # The client lost the response and retries the same chunk
+        self.assertEqual(self.put(url, 0, 40000).json()['offset'], 40000)
+        self.assertEqual(self.put(url, 80000, 90000).status_code, 400)
+
+        self.assertEqual(self.client.get(url).json()['offset'], 40000)
+        state = self.put(url, 40000, 80000).json()
+        state = self.put(url, 80000, len(self.CONTENT)).json()
+        self.assertTrue(state['complete'])
+        self.assertEqual(state['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+
+        response = self.client.post(reverse('submit_project'), {
+            'title': 'Large thesis', 'description': 'A long project description',
+            'teacher': self.teacher.pk, 'due_date': (timezone.now() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M'),
+            'upload': state['id'],
+        })
+        self.assertRedirects(response, reverse('my_projects'))
+        project = Project.objects.get(title='Large thesis')
+        with project.file_upload.open('rb') as f:
+            self.assertEqual(f.read(), self.CONTENT)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(list((Path(self.media_root) / 'parts').iterdir()), [])
+
+    def test_idle_running_hashes_are_dropped(self):
+        first = self.start().json()['url']
+        self.put(first, 0, 40000)
+        with mock.patch.object(uploads, 'RUNNING_HASH_LIMIT', 1):
+            self.put(self.start().json()['url'], 0, 40000)
+        self.assertEqual(len(uploads._running_hashes), 1)
+
+        # The dropped upload rehashes its part file when it resumes
+        self.put(first, 40000, 80000)
+        state = self.put(first, 80000, len(self.CONTENT)).json()
+        self.assertEqual(state['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+
+    def test_contents_must_match_extension(self):
+        url = self.start(filename='archive.zip').json()['url']
+        response = self.put(url, 0, 40000)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).json()['offset'], 0)
+
+    def test_size_and_type_checked_up_front(self):
+        self.assertEqual(self.start(filename='virus.exe').status_code, 400)
+        with override_settings(PROJECT_CHUNKED_UPLOAD_MAX_SIZE=1000):
+            self.assertEqual(self.start().status_code, 400)
+
+    def test_uploads_are_private_to_their_student(self):
+        url = self.start().json()['url']
+        self.client.force_login(make_student('student2'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.projects = make_projects(make_student(), make_teacher(), 3, graded=False)
+
+    def attach(self, project, name, content):
+        project.file_upload = SimpleUploadedFile(name, content)
+        project.save()
+
+    def blob_files(self):
+        return sorted(p.name for p in Path(self.media_root, 'blobs').rglob('*') if p.is_file())
+
+    def test_identical_uploads_share_one_blob(self):
+        self.attach(self.projects[0], 'cv.pdf', b'%PDF-same')
+        self.attach(self.projects[1], 'cv-again.pdf', b'%PDF-same')
+        self.attach(self.projects[2], 'other.pdf', b'%PDF-different')
+
+        self.assertEqual(len(self.blob_files()), 2)
+        self.assertEqual(StoredBlob.objects.get(pk=hashlib.sha256(b'%PDF-same').hexdigest()).references, 2)
+        self.assertTrue(self.projects[1].file_upload.name.endswith('/cv-again.pdf'))
+        with self.projects[1].file_upload.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-same')
+
+    def test_last_reference_removes_blob(self):
+        self.attach(self.projects[0], 'cv.pdf', b'%PDF-same')
+        self.attach(self.projects[1], 'cv.pdf', b'%PDF-same')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.projects[0].delete()
+        self.assertEqual(len(self.blob_files()), 1)
+        # Replacing the file releases the old blob
+        with self.captureOnCommitCallbacks(execute=True):
+            self.attach(self.projects[1], 'new.pdf', b'%PDF-new')
+        self.assertEqual(self.blob_files(), [hashlib.sha256(b'%PDF-new').hexdigest()])
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_dedupe_command_moves_legacy_files(self):
+        legacy = Path(self.media_root, 'projects')
+        legacy.mkdir()
+        for name, content in [('cv.pdf', b'%PDF-same'), ('cv_vrKihTe.pdf', b'%PDF-same'), ('b.pdf', b'%PDF-b')]:
+            (legacy / name).write_bytes(content)
+        for project, name in zip(self.projects, ['cv.pdf', 'cv_vrKihTe.pdf', 'b.pdf']):
+            Project.objects.filter(pk=project.pk).update(file_upload=f'projects/{name}')
+
+        # A failed transaction leaves every legacy file where its rows point
+        with mock.patch('django.db.transaction.on_commit', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('dedupe_submissions', stdout=StringIO())
+        self.assertEqual(len(list(legacy.iterdir())), 3)
+
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_submissions', stdout=output)
+
+        self.assertIn('Moved 2 file(s) into the content-addressed store and merged 1 duplicate(s)', output.getvalue())
+        self.assertEqual(list(legacy.iterdir()), [])
+        self.assertEqual(len(self.blob_files()), 2)
+        project = Project.objects.get(pk=self.projects[1].pk)
+        self.assertTrue(project.file_upload.name.endswith('/cv_vrKihTe.pdf'))
+        with project.file_upload.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-same')
+
+
+ESSAY = (
+    'The industrial revolution transformed manufacturing across Europe as steam power replaced '
+    'water wheels and hand looms, and factories drew workers from the countryside into rapidly '
+    'growing cities where wages, housing and working hours became questions of public policy. '
+)
+
+
+def docx_bytes(text):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+def pdf_bytes(text):
+    """A one-page PDF showing ``text``, complete enough for pypdf as well as the fallback."""
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    content = zlib.compress(b'BT /F1 12 Tf (' + escaped.encode('latin-1') + b') Tj ET')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R'
+        b' /Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(content), content),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    return pdf + b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF' % (len(objects) + 1, xref)
+
+
+class SimilarityTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.projects = make_projects(make_student(), self.teacher, 3, graded=False)
+
+    def attach(self, project, name, content):
+        project.file_upload = SimpleUploadedFile(name, content)
+        project.save()
+
+    def test_extracts_pdf_docx_and_zip_text(self):
+        path = Path(self.media_root, 'file')
+        path.write_bytes(pdf_bytes('Steam power (1800s)'))
+        self.assertIn('Steam power (1800s)', extract_text(path, 'essay.pdf'))
+        path.write_bytes(docx_bytes('Hand looms'))
+        self.assertIn('Hand looms', extract_text(path, 'essay.docx'))
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('src/main.py', 'print("factories")')
+            archive.writestr('report.docx', docx_bytes('Working hours'))
+            archive.writestr('image.png', b'\x89PNG')
+        path.write_bytes(buffer.getvalue())
+        text = extract_text(path, 'project.zip')
+        self.assertIn('factories', text)
+        self.assertIn('Working hours', text)
+
+    def test_pdf_fallback_reads_in_blocks_within_limits(self):
+        path = Path(self.media_root, 'file')
+        path.write_bytes(pdf_bytes('Steam power') + b''.join(pdf_bytes(f'Page {i}') for i in range(20)))
+        with mock.patch.object(extraction, 'PdfReader', None), mock.patch.object(extraction, 'PDF_READ_SIZE', 7):
+            text = extract_text(path, 'essay.pdf')
+            self.assertIn('Steam power', text)
+            self.assertIn('Page 19', text)
+            with mock.patch.object(extraction, 'MAX_TEXT_LENGTH', 30):
+                self.assertNotIn('Page 19', extract_text(path, 'essay.pdf'))
+            with mock.patch.object(extraction, 'MAX_PDF_READ', len(pdf_bytes('Steam power'))):
+                self.assertEqual(extract_text(path, 'essay.pdf').strip(), 'Steam power')
+
+            filler = b'%' + b'x' * 3000 + b'\n'
+            path.write_bytes(
+                b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 2 >>\n' + filler
+                + b'2 0 obj << /Type /Page >>\n' + filler + b'3 0 obj << /Type /Page >>\n' + filler
+                + b'4 0 obj << /Title (Introduction) /Parent 5 0 R >>\n' + filler
+                + b'6 0 obj << /Title (Document info) >>\n' + filler
+            )
+            self.assertEqual(pdf_outline(path), (2, [(1, 'Introduction')]))
+
+    def test_signatures_estimate_overlap(self):
+        original, _ = signature_for_text(ESSAY * 3)
+        edited, _ = signature_for_text((ESSAY * 3).replace('steam', 'coal', 1))
+        unrelated, _ = signature_for_text('A completely different report about marine biology and coral reefs.')
+        self.assertGreater(estimate_similarity(original, edited), 0.7)
+        self.assertLess(estimate_similarity(original, unrelated), 0.1)
+
+    def test_detail_page_lists_similar_submissions(self):
+        self.attach(self.projects[0], 'essay.docx', docx_bytes(ESSAY))
+        self.attach(self.projects[1], 'copy.pdf', pdf_bytes(ESSAY.replace('hand looms', 'looms')))
+        self.attach(self.projects[2], 'own.docx', docx_bytes('Coral reefs are built by colonies of tiny animals.'))
+        # A copy handed to another teacher is not theirs to compare
+        elsewhere = make_projects(make_student('other-student'), make_teacher('other-teacher'), 1, graded=False)[0]
+        self.attach(elsewhere, 'essay.docx', docx_bytes(ESSAY))
+
+        call_command('index_submissions', workers=1, stdout=StringIO())
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[0].pk]))
+        similar = [other.pk for other, _ in response.context['similar_projects']]
+        self.assertEqual(similar, [self.projects[1].pk])
+        self.assertContains(response, self.projects[1].title)
+
+        # A replaced file stops matching at once and is fingerprinted again by a job
+        self.attach(self.projects[1], 'rewrite.docx', docx_bytes('Something else entirely, written from scratch.'))
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[0].pk]))
+        self.assertEqual(response.context['similar_projects'], [])
+
+        # The page never fingerprints a file itself; it queues the job once and says so
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[1].pk]))
+        self.assertIsNone(response.context['similar_projects'])
+        self.assertContains(response, 'being compared')
+        self.client.get(reverse('teacher_project_detail', args=[self.projects[1].pk]))
+        self.assertEqual(Job.objects.filter(name='projects.index_submissions').count(), 1)
+        work(burst=True)
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[1].pk]))
+        self.assertEqual(response.context['similar_projects'], [])
+
+
+@task('tests.flaky', max_attempts=2)
+def flaky_task(fail):
+    if fail:
+        raise RuntimeError('Task failed')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.projects = make_projects(make_student(), self.teacher, 3, graded=False)
+
+    def test_claims_by_priority_once(self):
+        low = enqueue('tests.flaky', {'fail': False}, priority=-1)
+        high = enqueue('tests.flaky', {'fail': False}, priority=5)
+        enqueue('tests.flaky', {'fail': False}, priority=9, delay=60)  # not due yet
+
+        self.assertEqual(claim('worker-1').pk, high.pk)
+        self.assertEqual(claim('worker-2').pk, low.pk)
+        self.assertIsNone(claim('worker-3'))
+
+        # A worker that stops renewing its lease loses the job
+        Job.objects.filter(pk=high.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_expired(), 1)
+        job = claim('worker-3')
+        self.assertEqual((job.pk, job.attempts), (high.pk, 2))
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = enqueue('tests.flaky', {'fail': True})
+        self.assertEqual(work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('Task failed', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+        enqueue('tests.flaky', {'fail': False})
+        self.assertEqual(work(burst=True), 1)
+        self.assertEqual(Job.objects.exclude(status=Job.FAILED).count(), 0)
+
+    @override_settings(PROJECT_BULK_GRADE_INLINE_LIMIT=2)
+    def test_large_bulk_grade_runs_in_background(self):
+        self.client.force_login(self.teacher)
+        response = self.client.post(reverse('bulk_grade'), {
+            'projects': [p.pk for p in self.projects],
+            'score': 55,
+        }, follow=True)
+        self.assertContains(response, 'Grading 3 project(s) in the background')
+        self.assertFalse(Grade.objects.exists())
+
+        call_command('run_jobs', burst=True, stdout=StringIO())
+        self.assertEqual(Grade.objects.filter(letter_grade='C+').count(), 3)
+        self.assertFalse(Job.objects.exists())
+
+
+    def test_job_invalidations_reach_other_processes(self):
+        # A separate connection to the configured cache stands in for a web process
+        web_cache = caches.create_connection('default')
+        fragment_version(self.teacher.pk)
+        before = web_cache.get(_user_key(self.teacher.pk))
+        enqueue('projects.bulk_grade', {
+            'project_ids': [p.pk for p in self.projects], 'teacher_id': self.teacher.pk, 'score': 55,
+        })
+        work(burst=True)
+        self.assertNotEqual(web_cache.get(_user_key(self.teacher.pk)), before)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_workers_need_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'local to each process'):
+            call_command('run_jobs', burst=True, stdout=StringIO())
+
+
+class PreviewTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.projects = make_projects(make_student(), self.teacher, 2, graded=False)
+        self.client.force_login(self.teacher)
+
+    def attach(self, project, name, content):
+        project.file_upload = SimpleUploadedFile(name, content)
+        project.save()
+
+    def test_docx_outline_and_text_shown_inline(self):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('word/document.xml', (
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+                '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Introduction</w:t></w:r></w:p>'
+                '<w:p><w:r><w:t>Steam power changed everything.</w:t></w:r></w:p>'
+                '</w:body></w:document>'
+            ))
+        self.attach(self.projects[0], 'essay.docx', buffer.getvalue())
+
+        # Built after submission by the background task
+        enqueue('projects.build_previews', {'project_ids': [self.projects[0].pk]})
+        call_command('run_jobs', burst=True, stdout=StringIO())
+
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[0].pk]))
+        self.assertEqual(response.context['preview']['outline'], [[1, 'Introduction']])
+        self.assertContains(response, 'Steam power changed everything.')
+        response = self.client.get(reverse('project_text', args=[self.projects[0].pk]))
+        self.assertEqual(b''.join(response.streaming_content).decode(), 'Introduction\nSteam power changed everything.\n')
+
+    @skipUnless(extraction.PdfReader, 'pypdf is not installed')
+    def test_malformed_pdf_gets_an_error_preview(self):
+        self.attach(self.projects[0], 'broken.pdf', b'%PDF-1.4\n1 0 obj << /Type /Catalog')
+        self.client.get(reverse('teacher_project_detail', args=[self.projects[0].pk]))
+        # The job finishes, rather than failing on pypdf's error
+        call_command('run_jobs', burst=True, stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[0].pk]))
+        self.assertTrue(response.context['preview']['error'])
+
+    def test_archive_listing_and_cache_removed_with_blob(self):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('src/main.py', 'print("hello")')
+            archive.writestr('README.md', 'Run main.py')
+        self.attach(self.projects[1], 'code.zip', buffer.getvalue())
+
+        # Not built yet: the page queues the build once rather than extracting the file itself
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[1].pk]))
+        self.assertTrue(response.context['preview']['pending'])
+        self.assertContains(response, 'The preview is being prepared')
+        response = self.client.get(reverse('project_text', args=[self.projects[1].pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Job.objects.filter(name='projects.build_previews').count(), 1)
+        self.assertFalse(Path(self.media_root, 'previews').exists())
+
+        call_command('run_jobs', burst=True, stdout=StringIO())
+        response = self.client.get(reverse('teacher_project_detail', args=[self.projects[1].pk]))
+        preview = response.context['preview']
+        self.assertEqual([name for name, _ in preview['files']], ['src/main.py', 'README.md'])
+        self.assertIn('print("hello")', preview['text'])
+
+        previews = Path(self.media_root, 'previews')
+        self.assertEqual(len(list(previews.iterdir())), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.projects[1].delete()
+        self.assertEqual(list(previews.iterdir()), [])
+
+
+class GradeAnalyticsTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        student = make_student()
+        for project, score in zip(make_projects(student, self.teacher, 4, graded=False), [40, 60, 75, 95]):
+            Grade.objects.create(project=project, teacher=self.teacher, score=score)
+        other = make_teacher('other-teacher')
+        Grade.objects.create(project=make_projects(student, other, 1, graded=False)[0], teacher=other, score=10)
+
+    def test_statistics(self):
+        result = analytics.compute_analytics(self.teacher.pk)
+        overall = result['overall']
+        self.assertEqual((overall['count'], overall['mean'], overall['min'], overall['max']), (4, 67.5, 40, 95))
+        self.assertEqual(dict(overall['percentiles'])[50], 67.5)
+        self.assertEqual(dict(overall['percentiles'])[25], 55.0)
+        self.assertEqual([b['count'] for b in overall['histogram']], [0, 0, 0, 0, 1, 0, 1, 1, 0, 1])
+        self.assertEqual([(letter, n) for letter, n, _ in result['letters']], [('A+', 1), ('B+', 1), ('B', 1), ('C', 1)])
+        self.assertEqual(result['by_course'], {'CS': (4, 67.5, 55.0, 67.5, 80.0)})
+
+    @skipUnless(analytics.np, 'numpy is not installed')
+    def test_numpy_and_python_agree(self):
+        vectorized = analytics.compute_analytics()
+        with mock.patch.object(analytics, 'np', None):
+            looped = analytics.compute_analytics()
+        self.assertEqual(vectorized, looped)
+
+    def test_page_scope_and_invalidation(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('analytics'))
+        self.assertEqual(response.context['overall']['count'], 4)
+        self.assertEqual(response.context['by_teacher'], [])
+        # Served from the cache until a grade changes
+        with self.assertNumQueries(0):
+            analytics.grade_analytics(self.teacher.pk)
+        Grade.objects.filter(score=40).first().delete()
+        self.assertEqual(analytics.grade_analytics(self.teacher.pk)['overall']['count'], 3)
+
+        staff = make_teacher('staff-teacher')
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        self.client.force_login(User.objects.get(pk=staff.pk))
+        response = self.client.get(reverse('analytics'))
+        self.assertEqual(response.context['overall']['count'], 4)
+        self.assertEqual([row[0] for row in response.context['by_teacher']], ['Tina Teacher', 'Tina Teacher'])
+
+        self.client.force_login(make_student('another-student'))
+        self.assertRedirects(self.client.get(reverse('analytics')), reverse('dashboard'), fetch_redirect_response=False)
+
+
+class RubricScoreTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.projects = make_projects(self.student, self.teacher, 3, graded=False)
+        self.client.force_login(self.teacher)
+
+    def grade(self, project, content, presentation, creativity, technical):
+        return self.client.post(reverse('grade_project', args=[project.pk]), {
+            'content_score': content, 'presentation_score': presentation,
+            'creativity_score': creativity, 'technical_score': technical, 'feedback': '',
+        })
+
+    def test_rubric_scores_are_stored_and_shown_on_edit(self):
+        self.grade(self.projects[0], 20, 15, 10, 25)
+        grade = Grade.objects.get(project=self.projects[0])
+        self.assertEqual(grade.score, 70)
+        self.assertEqual([score for _, score in grade.rubric], [20, 15, 10, 25])
+
+        response = self.client.get(reverse('grade_project', args=[self.projects[0].pk]))
+        form = response.context['form']
+        self.assertEqual(
+            [form['content_score'].value(), form['presentation_score'].value(),
+             form['creativity_score'].value(), form['technical_score'].value()],
+            [20, 15, 10, 25]
+        )
+
+    def test_summary_in_one_query(self):
+        self.grade(self.projects[0], 20, 15, 10, 25)
+        self.grade(self.projects[1], 24, 21, 4, 19)
+        # Graded without the rubric, so left out
+        Grade.objects.bulk_grade(Project.objects.filter(pk=self.projects[2].pk), self.teacher, 50)
+
+        with self.assertNumQueries(1):
+            rubric = analytics.rubric_summary(self.teacher.pk)
+        self.assertEqual(rubric['count'], 2)
+        self.assertEqual(rubric['weakest'], 'creativity')
+        creativity = next(c for c in rubric['criteria'] if c['name'] == 'creativity')
+        self.assertEqual((creativity['mean'], creativity['histogram']), (7.0, [50.0, 0.0, 50.0, 0.0, 0.0]))
+        self.assertEqual(rubric['by_course'], {'CS': (2, 22.0, 18.0, 7.0, 22.0)})
+
+        response = self.client.get(reverse('analytics'))
+        self.assertContains(response, 'Weakest')
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.projects = make_projects(self.student, self.teacher, 5)
+        make_projects(make_student('other-student'), make_teacher('other-teacher'), 2)
+
+    def test_sparse_fields_and_pagination(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_project_list'), {'fields': 'id,score', 'limit': 3})
+        page = response.json()
+        self.assertEqual(page['results'][0], {'id': self.projects[4].pk, 'score': 75})
+        listing = next(q['sql'] for q in ctx.captured_queries if 'projects_project' in q['sql'])
+        self.assertNotIn('description', listing)
+
+        rest = self.client.get(reverse('api_project_list'), {'fields': 'id', 'limit': 3, 'cursor': page['next']}).json()
+        self.assertEqual([row['id'] for row in rest['results']], [self.projects[1].pk, self.projects[0].pk])
+        self.assertIsNone(rest['next'])
+
+        response = self.client.get(reverse('api_project_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        other = Project.objects.exclude(student=self.student).first()
+        self.assertEqual(self.client.get(reverse('api_project_detail', args=[other.pk])).status_code, 404)
+
+    def test_etag_gives_304_until_data_changes(self):
+        self.client.force_login(self.student)
+        url = reverse('api_stats')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['total_projects'], 5)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Grade.objects.create(project=self.projects[1], teacher=self.teacher, score=90)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['graded_projects'], 4)
+
+    def test_grade_write(self):
+        url = reverse('api_project_grade', args=[self.projects[1].pk])
+        body = {'content_score': 20, 'presentation_score': 20, 'creativity_score': 15, 'technical_score': 25}
+        self.assertEqual(self.client.put(url, body, content_type='application/json').status_code, 401)
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.put(url, body, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.teacher)
+        response = self.client.put(url, {**body, 'technical_score': 30}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('technical_score', response.json()['errors'])
+
+        response = self.client.put(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['score'], response.json()['letter_grade']), (80, 'A'))
+        response = self.client.get(url, {'fields': 'score,creativity_score'})
+        self.assertEqual(response.json(), {'score': 80, 'creativity_score': 15})
+
+    def test_project_writes(self):
+        url = reverse('api_project_list')
+        body = {
+            'title': 'Steam engines', 'description': 'How steam changed the mills.',
+            'teacher': self.teacher.pk, 'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+        }
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.student)
+        response = self.client.post(url, {**body, 'title': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json()['errors'])
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        created = Project.objects.get(pk=response.json()['id'])
+        self.assertEqual((created.student, created.teacher, created.is_submitted), (self.student, self.teacher, True))
+
+        # PATCH keeps the fields left out; a graded project or someone else's cannot be changed
+        detail = reverse('api_project_detail', args=[self.projects[1].pk])
+        response = self.client.patch(detail, {'title': 'Renamed project'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        project = response.json()
+        self.assertEqual((project['title'], project['description']), ('Renamed project', 'A project description'))
+        graded = reverse('api_project_detail', args=[self.projects[0].pk])
+        response = self.client.patch(graded, {'title': 'Renamed project'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        other = reverse('api_project_detail', args=[Project.objects.exclude(student=self.student).first().pk])
+        self.assertEqual(self.client.put(other, body, content_type='application/json').status_code, 404)
+
+    def test_file_is_a_download_url(self):
+        Project.objects.filter(pk=self.projects[1].pk).update(file_upload='cas/' + 'a' * 64)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('api_project_detail', args=[self.projects[1].pk]), {'fields': 'file'})
+        self.assertEqual(response.json(), {'file': reverse('project_download', args=[self.projects[1].pk])})
+        response = self.client.get(reverse('api_project_detail', args=[self.projects[0].pk]), {'fields': 'file'})
+        self.assertEqual(response.json(), {'file': ''})
+
+
+class BulkGradeTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.projects = make_projects(self.student, self.teacher, 6, graded=False)
+        get_registry()  # load grading scales outside the query count
+
+    def test_upserts_in_fixed_number_of_queries(self):
+        Grade.objects.create(project=self.projects[0], teacher=self.teacher, score=10)
+        projects = Project.objects.filter(teacher=self.teacher)
+
+        with self.assertNumQueries(9):
+            created, updated = Grade.objects.bulk_grade(projects, self.teacher, 85, 'Well done')
+
+        self.assertEqual((created, updated), (5, 1))
+        self.assertEqual(
+            set(Grade.objects.values_list('score', 'letter_grade', 'feedback')),
+            {(85, 'A', 'Well done')}
+        )
+
+    def test_bulk_grade_clears_rubric_scores(self):
+        Grade.objects.create(
+            project=self.projects[0], teacher=self.teacher, score=80,
+            content_score=20, presentation_score=20, creativity_score=20, technical_score=20,
+        )
+        Grade.objects.bulk_grade(Project.objects.filter(pk=self.projects[0].pk), self.teacher, 50)
+
+        grade = Grade.objects.get(project=self.projects[0])
+        self.assertEqual(grade.score, 50)
+        self.assertEqual(grade.rubric, [])
+
+    def test_bulk_grade_view_reports_counts(self):
+        self.client.force_login(self.teacher)
+        response = self.client.post(reverse('bulk_grade'), {
+            'projects': [p.pk for p in self.projects[:3]],
+            'score': 55,
+            'feedback': '',
+        }, follow=True)
+        self.assertContains(response, 'Successfully graded 3 project(s)')
+        self.assertEqual(Grade.objects.filter(letter_grade='C+').count(), 3)
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.other_student = make_student('student2')
+        for user in (self.teacher, self.student, self.other_student):
+            UserStats.objects.for_user(user)
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual({field: getattr(stats, field) for field in expected}, expected)
+
+    def test_counters_follow_project_and_grade_writes(self):
+        first, second = make_projects(self.student, self.teacher, 2, graded=False)
+        make_projects(self.other_student, self.teacher, 1, graded=False)
+        self.assertStats(self.teacher, total_projects=3, pending_reviews=3, total_students=2)
+
+        Grade.objects.create(project=first, teacher=self.teacher, score=80)
+        Grade.objects.create(project=second, teacher=self.teacher, score=65)
+        self.assertStats(self.student, total_projects=2, graded_projects=2, pending_projects=0, average_score=72.5)
+        self.assertStats(self.teacher, graded_projects=2, pending_reviews=1)
+
+        second.grade.delete()
+        first.delete()
+        self.assertStats(self.student, total_projects=1, graded_projects=0, average_score=None)
+        self.assertStats(self.teacher, total_projects=2, graded_projects=0, total_students=2)
+
+    def test_reassigned_project_updates_previous_owner(self):
+        project = make_projects(self.student, self.teacher, 1, graded=False)[0]
+        project.student = self.other_student
+        project.save()
+        self.assertStats(self.student, total_projects=0)
+        self.assertStats(self.other_student, total_projects=1)
+
+    def test_bulk_grade_refreshes_stats(self):
+        make_projects(self.student, self.teacher, 3, graded=False)
+        Grade.objects.bulk_grade(Project.objects.all(), self.teacher, 90)
+        self.assertStats(self.student, graded_projects=3, average_score=90)
+        self.assertStats(self.teacher, pending_reviews=0, graded_projects=3)
+
+    def test_rebuild_stats_fixes_drift(self):
+        make_projects(self.student, self.teacher, 4)
+        UserStats.objects.update(total_projects=99, graded_projects=0)
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertStats(self.student, total_projects=4, graded_projects=2, average_score=75)
+        self.assertStats(self.teacher, total_projects=4, total_students=1)
+
+
+class ProjectSearchTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        due = timezone.now() + timedelta(days=7)
+        self.compiler = Project.objects.create(
+            title='Compiler construction', description='Parsing and code generation',
+            student=self.student, teacher=self.teacher, due_date=due, is_submitted=True
+        )
+        self.essay = Project.objects.create(
+            title='Essay on history', description='Mentions compilers in passing',
+            student=self.student, teacher=self.teacher, due_date=due, is_submitted=True
+        )
+        self.backend = get_search_backend()
+
+    def search(self, query):
+        return list(self.backend.search(Project.objects.order_by('-submitted_at'), query))
+
+    def test_prefix_match_ranks_title_first(self):
+        self.assertEqual(self.search('compil'), [self.compiler, self.essay])
+        self.assertEqual(self.search('pars gen'), [self.compiler])
+        self.assertEqual(self.search('%%'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.essay.title = 'Essay on databases'
+        self.essay.save()
+        self.assertEqual(self.search('databases'), [self.essay])
+
+        self.student.last_name = 'Lovelace'
+        self.student.save()
+        self.assertEqual(len(self.search('lovelace')), 2)
+
+        self.compiler.delete()
+        self.assertEqual(self.search('compil'), [self.essay])
+
+    def test_teacher_projects_search(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('teacher_projects'), {'search': 'Compil'})
+        self.assertEqual(list(response.context['projects']), [self.compiler, self.essay])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        make_projects(self.student, self.teacher, 25, graded=False)
+        # Ties on submitted_at must be broken by id
+        Project.objects.filter(pk__in=Project.objects.order_by('pk')[5:15].values('pk')).update(
+            submitted_at=timezone.now()
+        )
+        self.expected = list(Project.objects.order_by('-submitted_at', '-id'))
+
+    def walk(self, queryset, per_page):
+        paginator = CursorPaginator(queryset, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_forward_and_back(self):
+        paginator, pages = self.walk(Project.objects.order_by('-submitted_at', '-id'), 7)
+        self.assertEqual([p for page in pages for p in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+        back = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(back), list(pages[-3]))
+        self.assertTrue(back.has_next())
+
+    def test_invalid_cursor_gives_first_page(self):
+        paginator = CursorPaginator(Project.objects.order_by('-submitted_at', '-id'), 10)
+        self.assertEqual(list(paginator.get_page('not-a-cursor')), self.expected[:10])
+
+    def test_ranked_search_pages(self):
+        queryset = get_search_backend().search(Project.objects.order_by('-submitted_at', '-id'), 'project')
+        _, pages = self.walk(queryset, 10)
+        self.assertEqual(sorted(p.pk for page in pages for p in page), sorted(p.pk for p in self.expected))
+
+    def test_views_use_cursor_and_stats_count(self):
+        self.client.force_login(self.student)
+        first = self.client.get(reverse('my_projects')).context['projects']
+        self.assertEqual(first.count, 25)
+        second = self.client.get(reverse('my_projects'), {'cursor': first.next_cursor}).context['projects']
+        self.assertEqual(list(second), self.expected[10:20])
+
+
+class GradingScaleTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        self.addCleanup(scales_changed)
+
+    def make_scale(self, boundaries, **scope):
+        scale = GradingScale.objects.create(name='Scale', **scope)
+        GradeBoundary.objects.bulk_create(
+            GradeBoundary(scale=scale, min_score=m, letter=letter) for m, letter in boundaries
+        )
+        scales_changed()
+        return scale
+
+    def test_compiled_scale_lookup(self):
+        scale = CompiledScale([(70, 'Pass+'), (0, 'Fail'), (40, 'Pass')])
+        self.assertEqual([scale.letter(s) for s in (0, 39, 40, 69, 70, 100)],
+                         ['Fail', 'Fail', 'Pass', 'Pass', 'Pass+', 'Pass+'])
+        self.assertEqual(scale.letters_for([100, 39, 40]), ['Pass+', 'Fail', 'Pass'])
+        self.assertEqual(DEFAULT_SCALE.letters_for([95, 85, 75, 65, 55, 45, 35, 5]),
+                         ['A+', 'A', 'B+', 'B', 'C+', 'C', 'D', 'F'])
+
+    def test_most_specific_scale_wins(self):
+        self.make_scale([(0, 'F'), (50, 'P')])
+        self.make_scale([(0, 'NC'), (60, 'CR')], course='CS')
+        self.make_scale([(0, 'U'), (80, 'S')], teacher=self.teacher)
+        other_teacher = make_teacher('other')
+        graded = make_projects(self.student, self.teacher, 1, graded=False)[0]
+        course_only = make_projects(self.student, other_teacher, 1, graded=False)[0]
+
+        self.assertEqual(Grade.objects.create(project=graded, teacher=self.teacher, score=85).letter_grade, 'S')
+        self.assertEqual(
+            Grade.objects.create(project=course_only, teacher=other_teacher, score=65).letter_grade, 'CR'
+        )
+
+    def test_scales_are_reloaded_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_scale([(0, 'F'), (50, 'P')])
+            # A request loading the scales before the save is committed
+            loaded = get_registry()
+        self.assertIsNot(get_registry(), loaded)
+
+    def test_bulk_grade_and_recompute_follow_scales(self):
+        other_teacher = make_teacher('other')
+        mine = make_projects(self.student, self.teacher, 2, graded=False)
+        theirs = make_projects(self.student, other_teacher, 2, graded=False)
+        Grade.objects.bulk_grade(mine[:1] + theirs[:1], self.teacher, 55)
+        self.assertEqual(set(Grade.objects.values_list('letter_grade', flat=True)), {'C+'})
+
+        self.make_scale([(0, 'U'), (50, 'S')], teacher=self.teacher)
+        self.assertEqual(Grade.objects.recompute_letter_grades(), 1)
+        self.assertEqual(Grade.objects.get(project=mine[0]).letter_grade, 'S')
+
+        created, updated = Grade.objects.bulk_grade(mine + theirs, self.teacher, 45)
+        self.assertEqual((created, updated), (2, 2))
+        self.assertEqual(
+            dict(Grade.objects.values_list('project_id', 'letter_grade')),
+            {mine[0].pk: 'U', mine[1].pk: 'U', theirs[0].pk: 'C', theirs[1].pk: 'C'}
+        )
+
+    def test_admin_recomputes_old_scope_and_bulk_deletes(self):
+        other_teacher = make_teacher('other')
+        mine = make_projects(self.student, self.teacher, 1, graded=False)[0]
+        theirs = make_projects(self.student, other_teacher, 1, graded=False)[0]
+        scale = self.make_scale([(0, 'U'), (50, 'S')], teacher=self.teacher)
+        for project in (mine, theirs):
+            Grade.objects.create(project=project, teacher=project.teacher, score=55)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin-password-42'))
+
+        # Moved to the other teacher: both teachers' grades follow
+        boundaries = list(scale.boundaries.all())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:projects_gradingscale_change', args=[scale.pk]), {
+                'name': 'Scale', 'teacher': other_teacher.pk, 'course': '',
+                'boundaries-TOTAL_FORMS': len(boundaries), 'boundaries-INITIAL_FORMS': len(boundaries),
+                'boundaries-MIN_NUM_FORMS': 0, 'boundaries-MAX_NUM_FORMS': 1000,
+                **{
+                    f'boundaries-{i}-{field}': value
+                    for i, boundary in enumerate(boundaries)
+                    for field, value in [('id', boundary.pk), ('scale', scale.pk),
+                                         ('letter', boundary.letter), ('min_score', boundary.min_score)]
+                },
+            })
+        self.assertEqual(
+            dict(Grade.objects.values_list('project_id', 'letter_grade')), {mine.pk: 'C+', theirs.pk: 'S'}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:projects_gradingscale_changelist'), {
+                'action': 'delete_selected', '_selected_action': [scale.pk], 'post': 'yes',
+            })
+        self.assertFalse(GradingScale.objects.exists())
+        self.assertEqual(Grade.objects.get(project=theirs).letter_grade, 'C+')
+
+class GradebookExportTests(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_student()
+        make_projects(self.student, self.teacher, 3)
+        Project.objects.filter(title='Project 1').update(title='=HYPERLINK("x")')
+        self.client.force_login(self.teacher)
+
+    def test_csv_export_streams_rows(self):
+        response = self.client.get(reverse('export_gradebook', args=['csv']), {'status': 'graded'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['Student', 'Username', 'Student ID'])
+        self.assertEqual(len(lines), 3)  # header + two graded projects
+        self.assertIn('Sam Student,student,S-student,Project 2', lines[1])
+        self.assertIn(',75,B+,', lines[1])
+
+    def test_csv_neutralises_formulas(self):
+        response = self.client.get(reverse('export_gradebook', args=['csv']))
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn("'=HYPERLINK", content)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        response = self.client.get(reverse('export_gradebook', args=['xlsx']))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('<c><v>75</v></c>', sheet)
+        self.assertIn('<t xml:space="preserve">=HYPERLINK("x")</t>', sheet)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export_gradebook', args=['pdf'])).status_code, 404)
+
+
+class SubmissionArchiveTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_teacher()
+        self.projects = make_projects(make_student(), self.teacher, 3)  # only the second is ungraded
+        for project, content in zip(self.projects, [b'%PDF-one', b'%PDF-two', b'%PDF-three']):
+            project.file_upload = SimpleUploadedFile('report.pdf', content)
+            project.save()
+        self.client.force_login(self.teacher)
+
+    def test_streams_filtered_files_with_manifest(self):
+        response = self.client.get(reverse('download_submissions'), {'status': 'pending'})
+        self.assertTrue(response.streaming)
+        self.assertIn('submissions-teacher-pending-', response['Content-Disposition'])
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        name = f'Student_Sam-student/Project_1-{self.projects[1].pk}.pdf'
+        self.assertEqual(archive.namelist(), [name, 'manifest.csv'])
+        self.assertEqual(archive.read(name), b'%PDF-two')
+        self.assertIn(name, archive.read('manifest.csv').decode('utf-8-sig'))
+
+    def test_names_with_nothing_valid_fall_back(self):
+        Project.objects.filter(pk=self.projects[1].pk).update(title='!!!!!')
+        User.objects.filter(pk=self.projects[1].student_id).update(first_name='?', last_name='*', username='+')
+        response = self.client.get(reverse('download_submissions'), {'status': 'pending'})
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [f'student/project-{self.projects[1].pk}.pdf', 'manifest.csv'])
+
+    def test_large_files_are_copied_in_pieces(self):
+        from . import exports
+        self.addCleanup(setattr, exports, 'FILE_CHUNK_SIZE', exports.FILE_CHUNK_SIZE)
+        exports.FILE_CHUNK_SIZE = 4
+        response = self.client.get(reverse('download_submissions'))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 6)
+        archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+        self.assertEqual(len(archive.namelist()), 4)
+        self.assertEqual(
+            sorted(archive.read(name) for name in archive.namelist() if name.endswith('.pdf')),
+            [b'%PDF-one', b'%PDF-three', b'%PDF-two'],
+        )
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_are_set_up_by_the_production_profile(self):
+        # A connection of its own, to a database in memory, so its journal stays 'memory'
+        production = connections['default'].__class__(
+            {**connection.settings_dict, **settings.SQLITE_PROFILES['production'], 'NAME': ':memory:'}
+        )
+        self.addCleanup(production.close)
+        with production.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+        self.assertEqual(production.transaction_mode, 'IMMEDIATE')
@@ -0,0 +1,198 @@
+"""
+Chunked, resumable submission uploads.
+
+A client opens a ChunkedUpload with the file name and size, then sends the
+bytes in order as ``Content-Range: bytes start-end/size`` requests. Each
+chunk is streamed from the request straight onto the end of a part file on
+disk, feeding a running SHA-256 as it goes, so neither a chunk nor the
+whole file is ever held in memory. A dropped connection loses at most the
+chunk in flight: the client asks for the current offset and carries on.
+
+When the last byte arrives the part file is checked and, once the project
+is submitted, moved into storage as it is.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+PIECE_SIZE = 64 * 1024
+
+ALLOWED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.zip', '.rar']
+
+# Leading bytes of each accepted format, checked on the first chunk
+MAGIC_NUMBERS = {
+    '.pdf': [b'%PDF-'],
+    '.doc': [b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'],
+    '.docx': [b'PK\x03\x04'],
+    '.zip': [b'PK\x03\x04', b'PK\x05\x06'],
+    '.rar': [b'Rar!\x1a\x07'],
+}
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(ValueError):
+    pass
+
+
+def extension(filename):
+    return os.path.splitext(filename)[1].lower()
+
+
+def validate_new_upload(filename, size):
+    """Check what can be checked before any bytes arrive."""
+    if extension(filename) not in ALLOWED_EXTENSIONS:
+        raise UploadError('File type not supported. Please upload PDF, DOC, DOCX, ZIP, or RAR files only.')
+    if size <= 0:
+        raise UploadError('The file is empty.')
+    if size > settings.PROJECT_CHUNKED_UPLOAD_MAX_SIZE:
+        limit = settings.PROJECT_CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)
+        raise UploadError(f'File size cannot exceed {limit}MB.')
+
+
+def parse_content_range(header, upload):
+    """Return ``(start, length)`` of the chunk described by a Content-Range header."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Expected a "Content-Range: bytes start-end/size" header.')
+    start, end, size = map(int, match.groups())
+    if size != upload.size or end < start or end >= size:
+        raise UploadError('Content-Range does not match the upload.')
+    if end - start + 1 > settings.PROJECT_UPLOAD_CHUNK_SIZE:
+        raise UploadError('Chunk is larger than PROJECT_UPLOAD_CHUNK_SIZE.')
+    return start, end - start + 1
+
+
+# Running hashes kept per process: at most RUNNING_HASH_LIMIT, each dropped
+# once its upload has been idle for RUNNING_HASH_IDLE seconds. A resumed
+# upload whose hash is not here (another worker, a restart, a long pause)
+# rehashes its part file, so an abandoned upload costs nothing for long.
+RUNNING_HASH_LIMIT = 1000
+RUNNING_HASH_IDLE = 60 * 60
+
+# upload id -> (offset, sha256 of the bytes before it, last used), least
+# recently used first
+_running_hashes = OrderedDict()
+_running_hashes_lock = threading.Lock()
+
+
+def _remember_hash(upload, hasher):
+    now = time.monotonic()
+    with _running_hashes_lock:
+        _running_hashes[upload.pk] = (upload.received, hasher, now)
+        _running_hashes.move_to_end(upload.pk)
+        while _running_hashes:
+            oldest, (_, _, used) = next(iter(_running_hashes.items()))
+            if len(_running_hashes) <= RUNNING_HASH_LIMIT and now - used < RUNNING_HASH_IDLE:
+                break
+            del _running_hashes[oldest]
+
+
+def _forget_hash(upload):
+    with _running_hashes_lock:
+        _running_hashes.pop(upload.pk, None)
+
+
+def _running_hash(upload):
+    with _running_hashes_lock:
+        state = _running_hashes.get(upload.pk)
+    if state is not None and state[0] == upload.received:
+        return state[1].copy()
+    hasher = hashlib.sha256()
+    with open(upload.part_path, 'rb') as part:
+        remaining = upload.received
+        while remaining:
+            piece = part.read(min(PIECE_SIZE, remaining))
+            if not piece:
+                raise UploadError('The partial upload is missing bytes; please start again.')
+            hasher.update(piece)
+            remaining -= len(piece)
+    return hasher
+
+
+def append_chunk(upload, stream, start, length):
+    """
+    Write ``length`` bytes from ``stream`` at ``start`` and advance the upload.
+
+    ``start`` must equal the bytes received so far; a chunk that was already
+    stored (a retry after a lost response) is acknowledged without writing.
+    The caller saves ``upload``; see the ``upload_chunk`` view.
+    """
+    if upload.is_complete or start + length <= upload.received:
+        return
+    if start != upload.received:
+        raise UploadError(f'Expected a chunk starting at byte {upload.received}.')
+
+    upload.part_path.parent.mkdir(parents=True, exist_ok=True)
+    hasher = _running_hash(upload) if upload.received else hashlib.sha256()
+    magic = MAGIC_NUMBERS[extension(upload.filename)] if start == 0 else None
+
+    written = 0
+    with open(upload.part_path, 'r+b' if upload.received else 'wb') as part:
+        # Drop anything a failed earlier attempt left past the offset
+        part.seek(start)
+        part.truncate()
+        while written < length:
+            piece = stream.read(min(PIECE_SIZE, length - written))
+            if not piece:
+                break
+            if magic is not None:
+                if not any(piece.startswith(prefix) for prefix in magic):
+                    raise UploadError("The file's contents do not match its extension.")
+                magic = None
+            part.write(piece)
+            hasher.update(piece)
+            written += len(piece)
+    if written != length:
+        raise UploadError(f'Chunk ended after {written} of {length} bytes.')
+
+    upload.received += length
+    if upload.received == upload.size:
+        _forget_hash(upload)
+        _finish(upload, hasher.hexdigest())
+    else:
+        _remember_hash(upload, hasher)
+
+
+def _finish(upload, sha256):
+    # Word documents are ZIP containers too; check the central directory
+    if extension(upload.filename) in ('.zip', '.docx') and not zipfile.is_zipfile(upload.part_path):
+        raise UploadError('The archive is damaged or incomplete.')
+    upload.sha256 = sha256
+    upload.completed_at = timezone.now()
+
+
+class PartFile(File):
+    """
+    A completed part file handed to storage.
+
+    Exposing ``temporary_file_path()`` lets FileSystemStorage move the file
+    into place instead of copying it.
+    """
+
+    def __init__(self, upload):
+        super().__init__(open(upload.part_path, 'rb'), name=upload.filename)
+        # Known up front; the part file is gone once storage has moved it
+        self.size = upload.size
+        self.sha256 = upload.sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def attach_upload(upload, field_file):
+    """Move a completed upload into ``field_file`` (without saving the model) and delete it."""
+    part = PartFile(upload)
+    try:
+        field_file.save(upload.filename, part, save=False)
+    finally:
+        part.close()
+    upload.delete()
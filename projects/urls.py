@@ -1,16 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Student URLs
     path('submit/', views.submit_project, name='submit_project'),
-    path('my-projects/', views.my_projects, name='my_projects'),
+    path('my-projects/', views.amy_projects if settings.PROJECT_ASYNC_VIEWS else views.my_projects, name='my_projects'),
     path('project/<int:project_id>/', views.project_detail, name='project_detail'),
     path('project/<int:project_id>/download/', views.project_download, name='project_download'),
+    path('uploads/', views.start_upload, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
     
     # Teacher URLs
-    path('teacher/projects/', views.teacher_projects, name='teacher_projects'),
+    path('teacher/projects/', views.ateacher_projects if settings.PROJECT_ASYNC_VIEWS else views.teacher_projects, name='teacher_projects'),
     path('teacher/project/<int:project_id>/', views.teacher_project_detail, name='teacher_project_detail'),
+    path('teacher/project/<int:project_id>/text/', views.project_text, name='project_text'),
     path('teacher/grade/<int:project_id>/', views.grade_project, name='grade_project'),
     path('teacher/bulk-grade/', views.bulk_grade, name='bulk_grade'),
+    path('teacher/gradebook.<str:file_format>', views.export_gradebook, name='export_gradebook'),
+    path('teacher/submissions.zip', views.download_submissions, name='download_submissions'),
+    path('analytics/', views.analytics, name='analytics'),
+    
+    # JSON API
+    path('api/projects/', api.project_list, name='api_project_list'),
+    path('api/projects/<int:project_id>/', api.project_detail, name='api_project_detail'),
+    path('api/projects/<int:project_id>/grade/', api.project_grade, name='api_project_grade'),
+    path('api/stats/', api.stats, name='api_stats'),
 ]
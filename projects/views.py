@@ -1,61 +1,169 @@
+import os
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.http import Http404
-from django.db.models import Q
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST, require_http_methods
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import content_disposition_header
 from accounts.decorators import student_required, teacher_required
-from .models import Project, Grade
+from accounts.directory import get_teacher_directory
+from .models import Project, Grade, UserStats, ChunkedUpload
 from .forms import ProjectSubmissionForm, GradeForm, BulkGradeForm
+from .downloads import serve_file
+from .uploads import UploadError, append_chunk, parse_content_range, validate_new_upload
+from .search import get_search_backend
+from .pagination import CursorPaginator
+from .fragments import FRAGMENT_TIMEOUT, afragment_version, fragment_version, load_fragment_data
+from .exports import (
+    GRADEBOOK_HEADER, XLSX_CONTENT_TYPE, gradebook_rows, stream_csv, stream_submissions_zip, stream_xlsx,
+)
+from .similarity import SIMILARITY_THRESHOLD, similar_projects
+from .analytics import grade_analytics
+from .jobs import enqueue
+from .previews import get_preview, text_cache_path
+from .storage import submission_storage
+from .conditional import conditional_download, conditional_page, download_validators
 
 @login_required
 @student_required
 def submit_project(request):
     if request.method == 'POST':
-        form = ProjectSubmissionForm(request.POST, request.FILES)
+        form = ProjectSubmissionForm(request.POST, request.FILES, student=request.user)
         if form.is_valid():
-            project = form.save(commit=False)
-            project.student = request.user
-            project.is_submitted = True
-            project.save()
+            form.save_submission()
             messages.success(request, 'Project submitted successfully!')
             return redirect('my_projects')
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
-        form = ProjectSubmissionForm()
+        form = ProjectSubmissionForm(student=request.user)
     
-    return render(request, 'projects/submit_project.html', {'form': form})
+    context = {
+        'form': form,
+        'direct_upload_limit': settings.PROJECT_UPLOAD_MAX_SIZE,
+        'chunk_size': settings.PROJECT_UPLOAD_CHUNK_SIZE,
+    }
+    
+    return render(request, 'projects/submit_project.html', context)
+
+def _upload_state(upload):
+    return {
+        'id': str(upload.pk),
+        'url': reverse('upload_chunk', args=[upload.pk]),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.is_complete,
+        'sha256': upload.sha256,
+    }
+
+@login_required
+@student_required
+@require_POST
+def start_upload(request):
+    """Open a chunked upload for ``filename`` of ``size`` bytes."""
+    filename = os.path.basename(request.POST.get('filename', ''))
+    try:
+        size = int(request.POST.get('size', ''))
+        validate_new_upload(filename, size)
+    except ValueError as e:
+        message = str(e) if isinstance(e, UploadError) else 'A numeric size is required.'
+        return JsonResponse({'error': message}, status=400)
+    
+    upload = ChunkedUpload.objects.create(student=request.user, filename=filename, size=size)
+    return JsonResponse(_upload_state(upload), status=201)
+
+@login_required
+@student_required
+@require_http_methods(['GET', 'PUT'])
+def upload_chunk(request, upload_id):
+    """GET reports how far an upload got; PUT appends the next chunk."""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, student=request.user)
+    if request.method == 'GET':
+        return JsonResponse(_upload_state(upload))
+    
+    offset = upload.received
+    try:
+        start, length = parse_content_range(request.headers.get('Content-Range'), upload)
+        append_chunk(upload, request, start, length)
+    except UploadError as e:
+        if upload.received == upload.size and not upload.is_complete:
+            # Every byte arrived but the file failed its final checks
+            upload.delete()
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # No transaction is held while the chunk streams in; instead the offset
+    # only moves if no concurrent request for the same chunk got there first
+    advanced = ChunkedUpload.objects.filter(pk=upload.pk, received=offset).update(
+        received=upload.received, sha256=upload.sha256,
+        completed_at=upload.completed_at, updated_at=timezone.now(),
+    )
+    if not advanced and upload.received != offset:
+        upload.refresh_from_db()
+        return JsonResponse({'error': 'Another request for this upload is in progress.', **_upload_state(upload)}, status=409)
+    return JsonResponse(_upload_state(upload))
 
 @login_required
 @student_required
 def my_projects(request):
-    projects_list = Project.objects.filter(student=request.user).order_by('-submitted_at')
+    projects_list = (
+        Project.objects.filter(student=request.user)
+        .select_related('teacher__teacher_profile', 'grade')
+        .order_by('-submitted_at', '-id')
+    )
     
-    # Pagination
-    paginator = Paginator(projects_list, 10)  # Show 10 projects per page
-    page_number = request.GET.get('page')
-    projects = paginator.get_page(page_number)
+    # Keyset pagination; the total comes from the stats row instead of COUNT(*)
+    stats = UserStats.objects.for_user(request.user)
+    paginator = CursorPaginator(projects_list, 10, count=stats.total_projects)  # Show 10 projects per page
+    projects = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'projects/my_projects.html', {'projects': projects})
 
 @login_required
 @student_required
+async def amy_projects(request):
+    """my_projects() as an async view, served when PROJECT_ASYNC_VIEWS is set."""
+    user = await request.auser()
+    projects_list = (
+        Project.objects.filter(student=user)
+        .select_related('teacher__teacher_profile', 'grade')
+        .order_by('-submitted_at', '-id')
+    )
+    
+    # The stats row and the page are read in one hop to the sync thread,
+    # where sync_to_async runs them one after the other anyway
+    paginator = CursorPaginator(projects_list, 10)
+    
+    def read():
+        return UserStats.objects.for_user(user), paginator.get_page(request.GET.get('cursor'))
+    
+    stats, projects = await sync_to_async(read)()
+    paginator.count = stats.total_projects
+    
+    return await sync_to_async(render)(request, 'projects/my_projects.html', {'projects': projects})
+
+@login_required
+@student_required
+@conditional_page(owner='student')
 def project_detail(request, project_id):
     project = get_object_or_404(Project, id=project_id, student=request.user)
     
     # Get student statistics
-    total_projects = Project.objects.filter(student=request.user).count()
-    graded_projects = Project.objects.filter(student=request.user, grade__isnull=False).count()
+    stats = UserStats.objects.for_user(request.user)
     
     context = {
         'project': project,
-        'total_projects': total_projects,
-        'graded_projects': graded_projects,
+        'total_projects': stats.total_projects,
+        'graded_projects': stats.graded_projects,
     }
     return render(request, 'projects/project_detail.html', context)
 
 @login_required
+@conditional_download()
 def project_download(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     
@@ -70,32 +178,23 @@ def project_download(request, project_id):
         messages.error(request, 'No file attached to this project.')
         return redirect('project_detail', project_id=project.id)
     
-    from django.http import HttpResponse
-    import os
-    
-    response = HttpResponse(project.file_upload.read(), content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(project.file_upload.name)}"'
-    return response
+    # The same validators as the response's, for If-Range
+    etag, last_modified = download_validators(request, project.id)
+    return serve_file(request, project.file_upload, etag=etag, last_modified=last_modified)
 
 # Teacher Views
-@login_required
-@teacher_required
-def teacher_projects(request):
+def _teacher_projects_queryset(request):
+    """The teacher's projects narrowed by the list page's search and status filters."""
     # Get search and filter parameters
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', 'all')
     
     # Base queryset for teacher's assigned projects
-    projects_list = Project.objects.filter(teacher=request.user).order_by('-submitted_at')
+    projects_list = Project.objects.filter(teacher=request.user).order_by('-submitted_at', '-id')
     
-    # Apply search filter
+    # Apply search filter (ranked full-text match, see projects.search)
     if search_query:
-        projects_list = projects_list.filter(
-            Q(title__icontains=search_query) |
-            Q(student__first_name__icontains=search_query) |
-            Q(student__last_name__icontains=search_query) |
-            Q(student__username__icontains=search_query)
-        )
+        projects_list = get_search_backend().search(projects_list, search_query)
     
     # Apply status filter
     if status_filter == 'pending':
@@ -103,36 +202,176 @@ def teacher_projects(request):
     elif status_filter == 'graded':
         projects_list = projects_list.filter(grade__isnull=False)
     elif status_filter == 'overdue':
-        from django.utils import timezone
         projects_list = projects_list.filter(
             due_date__lt=timezone.now(),
             grade__isnull=True,
             is_submitted=True
         )
     
-    # Pagination
-    paginator = Paginator(projects_list, 15)  # Show 15 projects per page
-    page_number = request.GET.get('page')
-    projects = paginator.get_page(page_number)
+    return projects_list, search_query, status_filter
+
+def _teacher_projects_page(user, projects_list, search_query, status_filter, cursor):
+    # Keyset pagination. The stats row has exact totals for the unsearched
+    # list, pending and graded views; the others skip counting.
+    total = None
+    if not search_query:
+        stats = UserStats.objects.for_user(user)
+        total = {
+            'all': stats.total_projects,
+            'pending': stats.pending_reviews,
+            'graded': stats.graded_projects,
+        }.get(status_filter)
+    paginator = CursorPaginator(projects_list, 15, count=total)  # Show 15 projects per page
+    return paginator.get_page(cursor)
+
+@login_required
+@teacher_required
+def teacher_projects(request):
+    projects_list, search_query, status_filter = _teacher_projects_queryset(request)
+    
+    # The table renders the student, their profile and the grade, so join
+    # them in up front
+    projects_list = projects_list.select_related('student__student_profile', 'grade')
+    cursor = request.GET.get('cursor', '')
     
     context = {
-        'projects': projects,
+        # Only evaluated when the table fragment is not already cached
+        'projects': SimpleLazyObject(lambda: _teacher_projects_page(
+            request.user, projects_list, search_query, status_filter, cursor
+        )),
+        'cursor': cursor,
         'search_query': search_query,
         'status_filter': status_filter,
+        'fragment_version': fragment_version(request.user.pk),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     }
     
     return render(request, 'projects/teacher_projects.html', context)
 
 @login_required
 @teacher_required
+async def ateacher_projects(request):
+    """teacher_projects() as an async view, served when PROJECT_ASYNC_VIEWS is set."""
+    user = await request.auser()
+    projects_list, search_query, status_filter = await sync_to_async(_teacher_projects_queryset)(request)
+    projects_list = projects_list.select_related('student__student_profile', 'grade')
+    cursor = request.GET.get('cursor', '')
+    
+    version = await afragment_version(user.pk)
+    context = {
+        'cursor': cursor,
+        'search_query': search_query,
+        'status_filter': status_filter,
+        'fragment_version': version,
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+    }
+    # Only read when the table fragment is not already cached
+    context.update(await load_fragment_data({
+        'projects': (
+            'teacher-projects-table', [user.pk, version, status_filter, search_query, cursor],
+            lambda: _teacher_projects_page(user, projects_list, search_query, status_filter, cursor),
+        ),
+    }))
+    
+    return await sync_to_async(render)(request, 'projects/teacher_projects.html', context)
+
+@login_required
+@teacher_required
+def export_gradebook(request, file_format):
+    """Stream the current teacher_projects selection as CSV or XLSX."""
+    if file_format not in ('csv', 'xlsx'):
+        raise Http404("Unsupported export format.")
+    
+    projects_list, _, _ = _teacher_projects_queryset(request)
+    rows = gradebook_rows(projects_list)
+    filename = f"gradebook-{request.user.username}-{timezone.now():%Y%m%d}.{file_format}"
+    
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(stream_xlsx(rows, GRADEBOOK_HEADER), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(
+            stream_csv(rows, GRADEBOOK_HEADER), content_type='text/csv; charset=utf-8'
+        )
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+@login_required
+@teacher_required
+def download_submissions(request):
+    """Stream the files of the current teacher_projects selection as one ZIP."""
+    projects_list, _, status_filter = _teacher_projects_queryset(request)
+    suffix = '' if status_filter == 'all' else f'-{status_filter}'
+    filename = f"submissions-{request.user.username}{suffix}-{timezone.now():%Y%m%d}.zip"
+    
+    response = StreamingHttpResponse(stream_submissions_zip(projects_list, submission_storage()), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+@login_required
+def analytics(request):
+    """Grade analytics: a teacher's own grades, or every grade for staff."""
+    user = request.user
+    if not (user.is_staff or user.user_type == 'teacher'):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('dashboard')
+    
+    result = grade_analytics(None if user.is_staff else user.pk)
+    teachers = {pk: (name, department) for pk, name, department, _ in get_teacher_directory()}
+    by_teacher = sorted(
+        ((*teachers.get(pk, (f'Teacher #{pk}', 'N/A')), *stats) for pk, stats in result['by_teacher'].items()),
+        key=lambda row: row[0].casefold()
+    )
+    by_course = sorted(
+        ((course or 'No course', *stats) for course, stats in result['by_course'].items()),
+        key=lambda row: row[0].casefold()
+    )
+    rubric = result['rubric']
+    rubric_by_course = sorted(
+        ((course or 'No course', *stats) for course, stats in rubric.get('by_course', {}).items()),
+        key=lambda row: row[0].casefold()
+    )
+    
+    context = {
+        'overall': result['overall'],
+        'letters': result['letters'],
+        'by_teacher': by_teacher,
+        'by_course': by_course,
+        'rubric': rubric,
+        'rubric_by_course': rubric_by_course,
+        'all_grades': user.is_staff,
+    }
+    return render(request, 'projects/analytics.html', context)
+
+@login_required
+@teacher_required
+@conditional_page(owner='teacher')
 def teacher_project_detail(request, project_id):
     project = get_object_or_404(Project, id=project_id, teacher=request.user)
     
     context = {
         'project': project,
+        'similar_projects': similar_projects(project),
+        'similarity_threshold': SIMILARITY_THRESHOLD,
+        'preview': get_preview(project),
     }
     return render(request, 'projects/teacher_project_detail.html', context)
 
+@login_required
+@teacher_required
+def project_text(request, project_id):
+    """The full extracted text of a submission, from the preview cache."""
+    project = get_object_or_404(Project, id=project_id, teacher=request.user)
+    if not project.file_upload:
+        raise Http404("No file attached to this project.")
+    
+    path = text_cache_path(project.file_upload.name)
+    if not os.path.exists(path):
+        # Queues the preview if it has not been built yet
+        if get_preview(project)['pending']:
+            raise Http404("The text of this file is still being extracted.")
+        raise Http404("No text could be extracted from this file.")
+    return FileResponse(open(path, 'rb'), content_type='text/plain; charset=utf-8')
+
 @login_required
 @teacher_required
 def grade_project(request, project_id):
@@ -179,24 +418,28 @@ def bulk_grade(request):
             score = form.cleaned_data['score']
             feedback = form.cleaned_data['feedback']
             
-            graded_count = 0
-            for project in projects:
-                grade, created = Grade.objects.get_or_create(
-                    project=project,
-                    defaults={
-                        'teacher': request.user,
-                        'score': score,
-                        'feedback': feedback
-                    }
+            if len(projects) > settings.PROJECT_BULK_GRADE_INLINE_LIMIT:
+                enqueue('projects.bulk_grade', {
+                    'project_ids': [project.pk for project in projects],
+                    'teacher_id': request.user.pk,
+                    'score': score,
+                    'feedback': feedback,
+                })
+                messages.success(
+                    request,
+                    f'Grading {len(projects)} project(s) in the background; '
+                    f'the grades will appear shortly.'
                 )
-                if not created:
-                    grade.score = score
-                    grade.feedback = feedback
-                    grade.save()
-                
-                graded_count += 1
+                return redirect('teacher_projects')
+            
+            created, updated = Grade.objects.bulk_grade(projects, request.user, score, feedback)
+            graded_count = created + updated
             
-            messages.success(request, f'Successfully graded {graded_count} project(s)!')
+            messages.success(
+                request,
+                f'Successfully graded {graded_count} project(s)! '
+                f'({created} new, {updated} updated)'
+            )
             return redirect('teacher_projects')
         else:
             messages.error(request, 'Please correct the errors below.')